@@ -0,0 +1,81 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Cold start of the http function: time to import the package and
+# time until main returns its first response, each run in a fresh
+# interpreter like a new function host worker.  The request uses a
+# datatype with no processor by default, so nothing touches azure.
+# --repo points at another checkout (e.g. a git worktree of an
+# older commit) to compare before and after.
+#
+# usage: python benchmarks/bench_cold_start.py [--runs 5] [--datatype nothing] [--repo PATH]
+# Changes:
+# ---------------------------------------------------------------
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['pandas', 'azure.storage.blob', 'lxml']
+
+# runs in the child interpreter, prints one json line
+_CHILD = '''
+import sys, json, time, asyncio
+started = time.perf_counter()
+
+import azure.functions as func
+import sap_batchjobs_http
+imported = time.perf_counter()
+
+req = func.HttpRequest('GET', 'http://localhost/api/sap_batchjobs_http', body=b'',
+                       params={'source_path': 'cold/start', 'datatype': sys.argv[1]})
+response = asyncio.run(sap_batchjobs_http.main(req))
+responded = time.perf_counter()
+
+print(json.dumps({'import': imported - started,
+                  'first_response': responded - started,
+                  'status_code': response.status_code,
+                  'loaded': [name for name in sys.argv[2:] if name in sys.modules]}))
+'''
+
+
+def cold_start(repo: str, datatype: str) -> dict:
+    """imports the function package and answers one request in a new interpreter
+
+    :param repo: checkout to import sap_batchjobs_http from
+    :param datatype: datatype parameter of the request
+    :return: dict of seconds to import and to first response, and which heavy modules got loaded
+    """
+    env = dict(os.environ, PYTHONPATH=repo, PYTHONDONTWRITEBYTECODE='1')
+    output = subprocess.run([sys.executable, '-c', _CHILD, datatype] + HEAVY_MODULES, cwd=repo, env=env,
+                            capture_output=True, text=True, check=True).stdout
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='http function cold start benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per checkout')
+    parser.add_argument('--datatype', default='nothing', help='datatype of the request')
+    parser.add_argument('--repo', action='append', default=[], help='other checkout to compare, repeatable')
+    args = parser.parse_args()
+
+    print(f'{"checkout":<40} {"import s":>9} {"response s":>11}  heavy modules loaded')
+
+    for repo in [ROOT] + args.repo:
+        runs = [cold_start(os.path.abspath(repo), args.datatype) for _ in range(args.runs)]
+
+        print(f'{os.path.abspath(repo)[-40:]:<40} '
+              f'{statistics.median(run["import"] for run in runs):>9.3f} '
+              f'{statistics.median(run["first_response"] for run in runs):>11.3f}  '
+              f'{", ".join(runs[-1]["loaded"]) or "none"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Compares the csv parser engines used by read_blob_csv_to_df on
+# synthetic IW38 extracts.  Parses straight from in-memory chunks
+# so only decode + parse time is measured, no network.
+#
+# usage: python benchmarks/bench_parser_engines.py [--rows 10000,1000000,5000000]
+# Changes:
+# ---------------------------------------------------------------
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import iw38_tsv, chunked
+from sap_batchjobs_http.http_helper_files.manager_blobs import read_tab_delimited, PARSER_ENGINES
+
+
+def main():
+    parser = argparse.ArgumentParser(description='csv parser engine benchmark')
+    parser.add_argument('--rows', default='10000,1000000,5000000',
+                        help='comma separated row counts to generate')
+    parser.add_argument('--engines', default=','.join(PARSER_ENGINES),
+                        help='comma separated engines to time')
+    args = parser.parse_args()
+
+    # python engine first, it is the reference the others are compared against
+    engines = sorted(args.engines.split(','), key=lambda engine: engine != 'python')
+    print(f'{"rows":>10} {"MB":>8} {"engine":>8} {"seconds":>9} {"rows/s":>12}  same as python')
+
+    for rows in [int(r) for r in args.rows.split(',')]:
+        data = iw38_tsv(rows)
+        frames = {}
+
+        for engine in engines:
+            try:
+                start = time.perf_counter()
+                frames[engine] = read_tab_delimited(chunked(data), engine)
+                elapsed = time.perf_counter() - start
+            except ImportError as e:
+                print(f'{rows:>10} {len(data) / 1e6:>8.1f} {engine:>8}  skipped: {e}')
+                continue
+
+            same = frames[engine].equals(frames['python']) if 'python' in frames else 'n/a'
+            print(f'{rows:>10} {len(data) / 1e6:>8.1f} {engine:>8} {elapsed:>9.2f} {rows / elapsed:>12,.0f}  {same}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# End to end throughput of process_data per datatype, with no
+# storage account: the primary storage connection string is set to
+# the in-memory backend, synthetic drops are put in the raw
+# container and process_data lists, parses, transforms, writes and
+# deletes them exactly as it does in azure.  Reports rows and MB
+# per second of source data, plus the busiest stages.
+# --save keeps the results as json, --baseline compares against a
+# saved file and exits 1 if any run got slower than --tolerance.
+#
+# usage: python benchmarks/bench_process_data.py [--rows 1000,100000] [--files 4] [--workers 1]
+#                                                [--save FILE] [--baseline FILE] [--tolerance 0.2]
+#                                                [--schema-cache]
+# Changes:
+# ---------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# config is read from the environment on import
+os.environ['PRIMARYSTORAGE_CONNECTIONSTRING'] = 'memory://bench'
+
+from benchmarks.synthetic import iw38_tsv, drop_name
+from sap_batchjobs_http.azure_config import DefaultConfig
+from sap_batchjobs_http.http_helper_files.run_options import RunOptions
+from sap_batchjobs_http.http_helper_files.start_processing import process_data
+from sap_batchjobs_http.http_helper_files.storage_backends import get_backend
+from sap_batchjobs_http.http_helper_files.schema_cache import SchemaCache, set_schema_cache
+
+RAW_CONTAINER = 'raw'
+IN_PROGRESS_CONTAINER = 'inprogress'
+
+# datatype: source path, event and transaction of the drops
+DATATYPES = {'sap_batch': ('SAPBatchReports/', 'Redwater TAR 2020', 'IW38'),
+             'obiee_agent': ('OBIEEAgentReports/', 'Lima TAR 2020', 'Commitment Details')}
+
+
+def drop_files(datatype: str, rows: int, files: int) -> int:
+    """Puts synthetic extracts in the raw container, one date per file
+
+    :param datatype: key of DATATYPES
+    :param rows: data rows per file
+    :param files: number of files
+    :return: total bytes dropped
+    """
+    backend = get_backend(DefaultConfig.PS_CONNECTION)
+    source_path, event, transaction = DATATYPES[datatype]
+    total = 0
+
+    for idx in range(files):
+        data = iw38_tsv(rows, seed=idx)
+        backend.write_bytes(RAW_CONTAINER, source_path + drop_name(event, transaction, f'202006{idx + 1:02d}'), data)
+        total += len(data)
+
+    return total
+
+
+def run(datatype: str, rows: int, files: int, workers: int, schema_cache: bool = False) -> dict:
+    """Times one process_data call over freshly dropped files
+
+    :return: dict of seconds, rows and bytes per second and the stage totals
+    """
+    backend = get_backend(DefaultConfig.PS_CONNECTION)
+    backend.clear()
+    source_bytes = drop_files(datatype, rows, files)
+
+    options = RunOptions(workers=workers, metrics=True, schema_cache=schema_cache)
+    start = time.perf_counter()
+    response = process_data(RAW_CONTAINER, DATATYPES[datatype][0], IN_PROGRESS_CONTAINER, datatype,
+                            'bench', 'bench', '', options)
+    seconds = time.perf_counter() - start
+
+    if response['failed']:
+        raise RuntimeError(f'{datatype} failed: {response}')
+
+    return {'datatype': datatype,
+            'rows': rows,
+            'files': files,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(rows * files / seconds),
+            'mb_per_second': round(source_bytes / 1e6 / seconds, 2),
+            'stages': {name: totals['seconds'] for name, totals in response['stages'].items()}}
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """:return: messages for each run whose rows per second dropped by more than tolerance"""
+    previous = {(result['datatype'], result['rows'], result['files']): result for result in baseline}
+    regressions = []
+
+    for result in results:
+        before = previous.get((result['datatype'], result['rows'], result['files']))
+
+        if before and result['rows_per_second'] < before['rows_per_second'] * (1 - tolerance):
+            regressions.append(f'{result["datatype"]} {result["rows"]:,} rows: {result["rows_per_second"]:,} rows/s, '
+                               f'baseline {before["rows_per_second"]:,}')
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='process_data end to end benchmark, in memory')
+    parser.add_argument('--rows', default='1000,100000', help='comma separated rows per file')
+    parser.add_argument('--files', type=int, default=4, help='files per run')
+    parser.add_argument('--workers', type=int, default=1, help='files processed in parallel')
+    parser.add_argument('--datatypes', default=','.join(DATATYPES), help='comma separated datatypes')
+    parser.add_argument('--save', help='write the results to this json file')
+    parser.add_argument('--baseline', help='json file from --save to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed drop in rows/s before failing')
+    parser.add_argument('--schema-cache', action='store_true', help='parse with dtypes cached per transaction')
+    args = parser.parse_args()
+
+    results = []
+    print(f'{"datatype":<12} {"rows":>9} {"files":>5} {"seconds":>8} {"rows/s":>10} {"MB/s":>7}  slowest stages')
+
+    for datatype in args.datatypes.split(','):
+        run(datatype, 10, 1, 1)     # warm up, the processor and its libraries are imported on first use
+
+        for rows in (int(value) for value in args.rows.split(',')):
+            set_schema_cache(SchemaCache())     # every run learns the dtypes from its first file
+            result = run(datatype, rows, args.files, args.workers, args.schema_cache)
+            results.append(result)
+
+            slowest = sorted(result['stages'].items(), key=lambda item: -item[1])[:3]
+            print(f'{datatype:<12} {rows:>9,} {args.files:>5} {result["seconds"]:>8.2f} '
+                  f'{result["rows_per_second"]:>10,} {result["mb_per_second"]:>7.2f}  '
+                  f'{", ".join(f"{name} {seconds:.2f}s" for name, seconds in slowest)}')
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        for message in regressions:
+            print(f'REGRESSION {message}')
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
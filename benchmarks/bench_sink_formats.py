@@ -0,0 +1,73 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Size and speed of the in progress output formats.  A synthetic
+# IW38 extract goes through the sap_batch dataframe transform and
+# is then encoded the way the sink writes it (tab delimited csv or
+# parquet per compression), and read back the way a downstream
+# reader would.
+#
+# usage: python benchmarks/bench_sink_formats.py [--rows 100000]
+# Changes:
+# ---------------------------------------------------------------
+
+import io
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from benchmarks.synthetic import iw38_tsv, chunked
+from sap_batchjobs_http.http_helper_files import manager_blobs, sap_batch
+
+
+def encode(df: pd.DataFrame, sink_format: str, compression: str) -> bytes:
+    if sink_format == 'csv':
+        chunks = manager_blobs.csv_batches(df, manager_blobs.CSV_BATCH_ROWS)
+    else:
+        chunks = manager_blobs.parquet_batches(df, manager_blobs.CSV_BATCH_ROWS, compression)
+
+    return b''.join(chunks)
+
+
+def decode(data: bytes, sink_format: str) -> pd.DataFrame:
+    if sink_format == 'csv':
+        return pd.read_csv(io.BytesIO(data), sep='\t', low_memory=False)
+
+    return pd.read_parquet(io.BytesIO(data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='in progress output format benchmark')
+    parser.add_argument('--rows', type=int, default=100000, help='rows in the synthetic extract')
+    args = parser.parse_args()
+
+    source = iw38_tsv(args.rows)
+    df = manager_blobs.read_tab_delimited(chunked(source))
+    df = sap_batch._transform_dataframe(df, 'SAPBatchReports/PBI-Redwater TAR 2020/IW38/20200624.csv')
+
+    print(f'{args.rows:,} rows, source {len(source) / 1e6:.1f} MB (UTF-16)\n')
+    print(f'{"format":>16} {"MB":>7} {"write s":>8} {"read s":>7}')
+
+    for sink_format, compression in [('csv', None)] + [('parquet', name) for name in manager_blobs.PARQUET_COMPRESSION]:
+        start = time.perf_counter()
+        data = encode(df, sink_format, compression)
+        written = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = decode(data, sink_format)
+        read = time.perf_counter() - start
+
+        assert len(result) == len(df)
+        label = sink_format + (f' {compression}' if compression else '')
+        print(f'{label:>16} {len(data) / 1e6:>7.1f} {written:>8.2f} {read:>7.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Rows/sec of the SAP html transaction parser before and after the
+# move to tx_html.  'legacy' is the original BeautifulSoup tree walk
+# that appended one row at a time (pd.concat, DataFrame.append is
+# gone from pandas), so it is only run up to --legacy-max-rows.
+#
+# --memory also reports the peak RSS of the whole-tree parse and the
+# incremental iter_batch_file parse, each in a fresh process.
+# --pool N parses N exports one after the other and then with
+# tx_pool across --workers processes.
+#
+# usage: python benchmarks/bench_tx_parsers.py [--rows 1000,5000,50000] [--memory] [--pool 16]
+# Changes:
+# ---------------------------------------------------------------
+
+import os
+import sys
+import time
+import tempfile
+import resource
+import argparse
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'test'))
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+import tx_html
+import tx_pool
+from benchmarks.synthetic import sap_html
+
+
+def legacy_parse(contents, start_table: int = 0) -> pd.DataFrame:
+    """original html.parser walk with one dataframe per row, kept for comparison only"""
+    soup = BeautifulSoup(contents, 'html.parser')
+    df = None
+
+    for idx_lst, lst in enumerate(soup('table', {'class': 'list'})):
+        if idx_lst < start_table:
+            continue
+
+        for idx_body, body in enumerate(lst('tbody')):
+            if idx_lst == start_table and idx_body == 0:
+                keys = [column('nobr')[0].text.strip().replace('\xa0', ' ') for column in body('tr')[0]('td')]
+                df = pd.DataFrame(columns=keys)
+
+            elif idx_body > 0:
+                for row in body('tr'):
+                    current_row = {}
+                    for column_idx, column in enumerate(row('td')):
+                        value = column('nobr')[2 if column_idx == 0 else 0]
+                        current_row[keys[column_idx]] = value.text.strip().replace('\xa0', ' ')
+                    df = pd.concat([df, pd.DataFrame([current_row], columns=keys)], ignore_index=True)
+
+    return df
+
+
+def peak_rss_mb(mode: str, file_name: str, rows: int, function: str) -> float:
+    """parses an export file in a fresh process and returns how much that raised the peak RSS"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    worker = context.Process(target=_measure, args=(mode, file_name, rows, function, results))
+    worker.start()
+    peak = results.get()
+    worker.join()
+
+    return peak
+
+
+def _high_water_kb() -> int:
+    """peak RSS of this process. ru_maxrss survives exec, so a spawned child would report
+    its parent's peak, VmHWM starts fresh with the new process image"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(mode: str, file_name: str, rows: int, function: str, results):
+    baseline = _high_water_kb()
+
+    with open(file_name, 'rb') as f:
+        if mode == 'tree':
+            row_count = len(tx_html.parse_batch_file(f.read(), function))
+        else:
+            # streamed from the file, only the current batch is kept
+            row_count = sum(len(batch) for batch in tx_html.iter_batch_file(f, function, batch_rows=10000))
+
+    assert row_count == rows
+    results.put((_high_water_kb() - baseline) / 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SAP html transaction parser benchmark')
+    parser.add_argument('--rows', default='1000,5000,50000', help='comma separated row counts')
+    parser.add_argument('--function', default='zi73_01', help='transaction version, e.g. iw38_01')
+    parser.add_argument('--legacy-max-rows', type=int, default=5000,
+                        help='largest size to run the quadratic legacy parser on')
+    parser.add_argument('--memory', action='store_true', help='also report peak memory per parse mode')
+    parser.add_argument('--pool', type=int, default=0, help='number of exports for the process pool comparison')
+    parser.add_argument('--workers', type=int, default=None, help='pool processes, defaults to the available cores')
+    args = parser.parse_args()
+
+    start_table = tx_html.get_version(args.function)['start_table']
+    print(f'{"rows":>8} {"MB":>7} {"parser":>8} {"seconds":>9} {"rows/s":>10}  same as legacy')
+
+    for rows in [int(r) for r in args.rows.split(',')]:
+        contents = sap_html(rows, start_table)
+        legacy = None
+
+        if rows <= args.legacy_max_rows:
+            start = time.perf_counter()
+            legacy = legacy_parse(contents, start_table)
+            elapsed = time.perf_counter() - start
+            print(f'{rows:>8} {len(contents) / 1e6:>7.1f} {"legacy":>8} {elapsed:>9.2f} {rows / elapsed:>10,.0f}')
+
+        start = time.perf_counter()
+        df = tx_html.parse_batch_file(contents, args.function)
+        elapsed = time.perf_counter() - start
+
+        same = df.astype(object).equals(legacy.astype(object)) if legacy is not None else 'n/a'
+        print(f'{rows:>8} {len(contents) / 1e6:>7.1f} {"tx_html":>8} {elapsed:>9.2f} {rows / elapsed:>10,.0f}  {same}')
+
+        start = time.perf_counter()
+        batches = sum(1 for _ in tx_html.iter_batch_file(contents, args.function))
+        elapsed = time.perf_counter() - start
+        print(f'{rows:>8} {len(contents) / 1e6:>7.1f} {"iter":>8} {elapsed:>9.2f} {rows / elapsed:>10,.0f}  '
+              f'{batches} batches')
+
+    if args.memory:
+        print(f'\n{"rows":>8} {"MB":>7} {"tree MB":>9} {"iter MB":>9}  peak RSS growth while parsing')
+        for rows in [int(r) for r in args.rows.split(',')]:
+            contents = sap_html(rows, start_table)
+            with tempfile.NamedTemporaryFile(suffix='.htm', delete=False) as f:
+                f.write(contents)
+
+            try:
+                tree = peak_rss_mb('tree', f.name, rows, args.function)
+                incremental = peak_rss_mb('iter', f.name, rows, args.function)
+            finally:
+                os.remove(f.name)
+
+            print(f'{rows:>8} {len(contents) / 1e6:>7.1f} {tree:>9.1f} {incremental:>9.1f}')
+
+    if args.pool:
+        workers = args.workers or tx_pool.default_workers()
+        print(f'\n{"files":>8} {"rows":>8} {"mode":>12} {"seconds":>9} {"rows/s":>10}')
+
+        for rows in [int(r) for r in args.rows.split(',')]:
+            contents = sap_html(rows, start_table)
+
+            start = time.perf_counter()
+            for _ in range(args.pool):
+                tx_html.parse_batch_file(contents, args.function)
+            elapsed = time.perf_counter() - start
+            print(f'{args.pool:>8} {rows:>8} {"sequential":>12} {elapsed:>9.2f} {args.pool * rows / elapsed:>10,.0f}')
+
+            start = time.perf_counter()
+            jobs = ((idx, contents, args.function) for idx in range(args.pool))
+            for key, df, error in tx_pool.parse_files(jobs, workers):
+                if error:
+                    raise error
+                assert len(df) == rows
+            elapsed = time.perf_counter() - start
+            print(f'{args.pool:>8} {rows:>8} {f"pool x{workers}":>12} {elapsed:>9.2f} '
+                  f'{args.pool * rows / elapsed:>10,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Synthetic SAP extracts for benchmarking.  Files look like the
+# IW38 batch job output: UTF-16 with BOM, tab delimited, CRLF,
+# unquoted, with order numbers, dates, codes and free text.
+# sap_html builds the same rows as a SAP GUI list export (.htm).
+# drop_name names a file the way it lands in the raw container.
+# Changes:
+# ---------------------------------------------------------------
+
+import random
+
+IW38_COLUMNS = ['Order', 'Order Type', 'Description', 'Functional Loc.', 'Equipment',
+                'Bas. start date', 'Basic fin. date', 'System status', 'User status',
+                'Plant', 'Main WorkCtr', 'PM Act. Type', 'Priority', 'Total act.costs',
+                'Total plan costs', 'Revision']
+
+_SYSTEM_STATUS = ['CRTD', 'REL', 'REL  PRC', 'TECO', 'CLSD', 'REL  NMAT PRC']
+_USER_STATUS = ['APPR', 'PLAN', 'SCHD', 'WAPP', '']
+_WORDS = ['pump', 'valve', 'replace', 'inspect', 'seal', 'motor', 'heat exchanger', 'clean',
+          'calibrate', 'PSV', 'tower', 'line', 'repair', 'leak', 'bearing', 'scaffold']
+
+
+def iw38_rows(rows: int, seed: int = 0):
+    """Generates IW38-style data rows
+
+    :param rows: number of rows
+    :param seed: random seed so runs are repeatable
+    :return: generator of lists of field strings
+    """
+    rnd = random.Random(seed)
+
+    for row in range(rows):
+        day = rnd.randint(1, 28)
+        yield [f'{4000000 + row:012d}',
+               rnd.choice(['PM01', 'PM02', 'PM03']),
+               ' '.join(rnd.choice(_WORDS) for _ in range(rnd.randint(2, 6))),
+               f'RW-{rnd.randint(100, 999)}-{rnd.choice("ABCDEFG")}{rnd.randint(1, 99):02d}',
+               str(rnd.randint(10000000, 19999999)) if rnd.random() > 0.3 else '',
+               f'2020-06-{day:02d}',
+               f'2020-07-{day:02d}',
+               rnd.choice(_SYSTEM_STATUS),
+               rnd.choice(_USER_STATUS),
+               'RW01',
+               f'MECH{rnd.randint(1, 9)}',
+               f'{rnd.randint(1, 20):03d}',
+               str(rnd.randint(1, 4)),
+               f'{rnd.uniform(0, 50000):.2f}',
+               f'{rnd.uniform(0, 50000):.2f}',
+               'TAR2020']
+
+
+def iw38_tsv(rows: int, seed: int = 0) -> bytes:
+    """Builds a complete IW38-style extract the way the SAP batch job writes it
+
+    :param rows: number of data rows
+    :param seed: random seed so runs are repeatable
+    :return: UTF-16 encoded file contents, with BOM
+    """
+    lines = ['\t'.join(IW38_COLUMNS)]
+    lines.extend('\t'.join(fields) for fields in iw38_rows(rows, seed))
+
+    return ('\r\n'.join(lines) + '\r\n').encode('UTF-16')
+
+
+def sap_html(rows: int, start_table: int = 0, rows_per_table: int = 500, seed: int = 0) -> bytes:
+    """Builds a SAP list export: 'list' tables, each with a header tbody then a rows tbody
+
+    :param rows: number of data rows
+    :param start_table: number of selection screen 'list' tables before the data (ZI53/ZI73)
+    :param rows_per_table: SAP splits long lists into tables of this many rows
+    :param seed: random seed so runs are repeatable
+    :return: utf-8 encoded html
+    """
+    def cell(value, icons=False):
+        prefix = '<nobr><img src="s_b_chck.gif"></nobr><nobr>&nbsp;</nobr>' if icons else ''
+        return f'<td>{prefix}<nobr>{value.replace("&", "&amp;").replace("<", "&lt;")}&nbsp;</nobr></td>'
+
+    header = '<tbody><tr>' + ''.join(cell(name) for name in IW38_COLUMNS) + '</tr></tbody>'
+    parts = ['<html><head><meta charset="utf-8"><title>IW38</title></head><body>']
+
+    for idx in range(start_table):
+        parts.append(f'<table class="list"><tbody><tr><td><nobr>Selection {idx}</nobr></td></tr></tbody></table>')
+
+    data = list(iw38_rows(rows, seed))
+
+    for offset in range(0, max(rows, 1), rows_per_table):
+        body = ''.join('<tr>' + ''.join(cell(value, icons=idx == 0) for idx, value in enumerate(fields)) + '</tr>'
+                       for fields in data[offset:offset + rows_per_table])
+        parts.append(f'<table class="list">{header}<tbody>{body}</tbody></table>')
+
+    parts.append('</body></html>')
+
+    return '\n'.join(parts).encode('utf-8')
+
+
+def drop_name(event: str, transaction: str, date: str, extension: str = '.csv') -> str:
+    """Name of a file as dropped in the raw container, e.g. PBI-Redwater TAR 2020-IW38_20200624.csv
+
+    :param event: event name, e.g. 'Redwater TAR 2020'
+    :param transaction: transaction or report, e.g. 'IW38'
+    :param date: extract date as it appears in the name
+    :param extension: e.g. '.csv' or '.csv.gz'
+    :return: file name without path
+    """
+    return f'PBI-{event}-{transaction}_{date}{extension}'
+
+
+def chunked(data: bytes, chunk_size: int = 4 * 1024 * 1024):
+    """Splits file contents the way download_blob().chunks() would
+
+    :param data: file contents
+    :param chunk_size: bytes per chunk, 4MB is the sdk default
+    :return: generator of byte chunks
+    """
+    view = memoryview(data)
+
+    for offset in range(0, len(data), chunk_size):
+        yield view[offset:offset + chunk_size]
@@ -7,53 +7,100 @@
 # has all of the required information to route the data in this
 # function to be processed the correct way.
 # Changes:
+# Oct 18, 2026 - mode job is refused with 503 unless PRIMARYSTORAGE_JOBS_CONTAINER is set
 # ---------------------------------------------------------------
 
 import logging
 import json
+import asyncio
+import functools
+import threading
 import azure.functions as func
 
 try:     # if azure
     from . import azure_config
-    from .http_helper_files import start_processing
+    from .http_helper_files import start_processing, manager_jobs
+    from .http_helper_files.run_options import RunOptions
 except ModuleNotFoundError:  # if local
     from sap_batchjobs_http import azure_config
-    from sap_batchjobs_http.http_helper_files import start_processing
+    from sap_batchjobs_http.http_helper_files import start_processing, manager_jobs
+    from sap_batchjobs_http.http_helper_files.run_options import RunOptions
 
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+async def main(req: func.HttpRequest) -> func.HttpResponse:
 
-    # get parameters from HTTP trigger
-    source_container = req.params.get('source_container')
-    sink_container = req.params.get('sink_container')
-    source_path = req.params.get('source_path')
-    datatype = req.params.get('datatype')
-    factory_info = req.params.get('factoryinfo')
-    pipeline_run_id = req.params.get('pipelinerunid')
-    pipeline_start_time = req.params.get('starttime')
+    # get parameters from HTTP trigger, query string first then json body
+    get_param = _request_getter(req)
 
-    if not source_path:
-        try:
-            req_body = req.get_json()
-        except ValueError:
-            pass
-        else:
-            source_container = req_body.get('source_container')
-            sink_container = req_body.get('sink_container')
-            source_path = req_body.get('source_path')
-            datatype = req_body.get('datatype')
-            factory_info = req_body.get('factoryinfo')
-            pipeline_run_id = req_body.get('pipelinerunid')
-            pipeline_start_time = req_body.get('starttime')
+    # status poll for a job started in job mode
+    job_id = get_param('job_id')
+    if job_id:
+        return _job_status_response(job_id)
+
+    source_container = get_param('source_container')
+    sink_container = get_param('sink_container')
+    source_path = get_param('source_path')
+    datatype = get_param('datatype')
+    factory_info = get_param('factoryinfo')
+    pipeline_run_id = get_param('pipelinerunid')
+    pipeline_start_time = get_param('starttime')
+
+    try:
+        options = RunOptions.from_request(get_param)
+    except ValueError as e:     # a bad option or combination of options
+        logging.warning(f'Rejected request options: {e}')
+        return func.HttpResponse(body=json.dumps({'error': str(e)}), status_code=400, mimetype='application/json')
+
+    if source_path and get_param('mode') == 'job':
+        # the job's status has to outlive this worker, a job kept in memory can't be polled
+        # from another instance or after a restart
+        if not azure_config.DefaultConfig().PS_JOBS_CONTAINER:
+            logging.warning('Rejected job mode request, PRIMARYSTORAGE_JOBS_CONTAINER is not set')
+            return func.HttpResponse(body=json.dumps({'error': 'mode job needs PRIMARYSTORAGE_JOBS_CONTAINER'}),
+                                     status_code=503, mimetype='application/json')
+
+        logging.info(f'Starting background job for {source_path} and {datatype}.')
+
+        tracker = manager_jobs.JobTracker(manager_jobs.get_job_store(),
+                                          request={'source_container': source_container,
+                                                   'sink_container': sink_container,
+                                                   'source_path': source_path,
+                                                   'datatype': datatype,
+                                                   'factoryinfo': factory_info,
+                                                   'pipelinerunid': pipeline_run_id,
+                                                   'starttime': pipeline_start_time,
+                                                   'options': options.to_dict()})
 
+        threading.Thread(target=start_processing.run_job, name=f'job-{tracker.job_id}',
+                         args=(tracker, source_container, source_path, sink_container, datatype,
+                               factory_info, pipeline_run_id, pipeline_start_time, options)).start()
+
+        # ADF web activities poll the Location header until they get something other than 202
+        status_url = req.url.split('?')[0] + '?job_id=' + tracker.job_id
+        response = {'job_id': tracker.job_id, 'status': 'queued', 'statusQueryGetUri': status_url}
+
+        return func.HttpResponse(body=json.dumps(response), status_code=202, mimetype='application/json',
+                                 headers={'Location': status_url, 'Retry-After': '10'})
 
     if source_path:
         logging.info(f'Python HTTP trigger function processed a request with {source_path} and {datatype}.')
 
         # try and process file, and return the resuting message
-        response = {'results': start_processing.process_data(source_container, source_path,
-                                                             sink_container, datatype,
-                                                             factory_info, pipeline_run_id, pipeline_start_time)}
+        if options.io_mode == 'async':
+            results = await start_processing.process_data_async(source_container, source_path,
+                                                                sink_container, datatype,
+                                                                factory_info, pipeline_run_id, pipeline_start_time,
+                                                                options)
+        else:
+            # blocking sdk calls, keep them off the function host's event loop
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(None, functools.partial(start_processing.process_data,
+                                                                         source_container, source_path,
+                                                                         sink_container, datatype,
+                                                                         factory_info, pipeline_run_id,
+                                                                         pipeline_start_time, options))
+
+        response = {'results': results}
         
         func.HttpResponse.mimetype = 'application/json'
         func.HttpResponse.charset = 'utf-8'
@@ -68,3 +115,44 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         response = {"inprogress_blob_name": "error somewhere"}
         return func.HttpResponse(body=response,
                                  status_code=200)
+
+
+def _job_status_response(job_id: str) -> func.HttpResponse:
+    """Builds the response for a job status poll
+
+    :param job_id: id returned when the job was started
+    :return: 202 while the job is queued or running, 200 once it has finished, 404 if unknown
+    """
+    job = manager_jobs.get_job_store().load(job_id)
+
+    if job is None:
+        return func.HttpResponse(body=json.dumps({'job_id': job_id, 'status': 'not found'}),
+                                 status_code=404, mimetype='application/json')
+
+    status_code = 202 if job['status'] in ('queued', 'running') else 200
+
+    return func.HttpResponse(body=json.dumps(job), status_code=status_code, mimetype='application/json',
+                             headers={'Retry-After': '10'} if status_code == 202 else None)
+
+
+def _request_getter(req: func.HttpRequest):
+    """Returns a lookup for request parameters, checking the query string then the json body
+
+    :param req: http request from the trigger
+    :return: callable taking a parameter name, returns None if not passed
+    """
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        req_body = None
+
+    if not isinstance(req_body, dict):
+        req_body = {}
+
+    def get_param(name: str):
+        value = req.params.get(name)
+        if value is None:
+            value = req_body.get(name)
+        return value
+
+    return get_param
@@ -14,6 +14,9 @@ import os
 class DefaultConfig:
 
     PS_CONNECTION = os.getenv('PRIMARYSTORAGE_CONNECTIONSTRING')
+    PS_JOBS_CONTAINER = os.getenv('PRIMARYSTORAGE_JOBS_CONTAINER')   # job mode status, memory if not set
+    PS_LEDGER_CONTAINER = os.getenv('PRIMARYSTORAGE_LEDGER_CONTAINER')   # processed file ledger, memory if not set
+    PS_RUNS_TABLE = os.getenv('PRIMARYSTORAGE_RUNS_TABLE')   # per file run records, not kept if not set
     # PS_RAW = os.getenv('PRIMARYSTORAGE_RAW')
     # PS_INPROCESS = os.getenv('PRIMARYSTORAGE_INPROCESS')
     # PS_FINAL = os.getenv('PRIMARYSTORAGE_FINAL')
@@ -0,0 +1,363 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Runs the per-file work of a pipeline (sap_batch, obiee_agent)
+# over a blob listing.  Files are independent of each other, so
+# they can be processed by a bounded pool of threads.  One failed
+# file is reported and never stops the rest of the batch.
+# Changes:
+# Oct 18, 2026 - run_listing works through a paged listing, a page at a time
+# Oct 18, 2026 - files in the run's ledger are skipped, not processed again
+# Oct 18, 2026 - with a memory budget, files are admitted by estimated memory, largest first
+# Oct 18, 2026 - a run's deferred source cleanup is committed after each page
+# Oct 18, 2026 - a coalesced group gives one result per file, so its files succeed or fail on their own
+# Oct 18, 2026 - a memory budget applies whatever the number of workers
+# ---------------------------------------------------------------
+
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# import our own modules.
+try:  # if on azure
+    from .stage_metrics import NULL_TIMER
+    from .memory_budget import estimate_memory, RSS_SAMPLE_SECONDS
+    from .source_cleanup import delete_source
+except ModuleNotFoundError:  # if local
+    from sap_batchjobs_http.http_helper_files.stage_metrics import NULL_TIMER
+    from sap_batchjobs_http.http_helper_files.memory_budget import estimate_memory, RSS_SAMPLE_SECONDS
+    from sap_batchjobs_http.http_helper_files.source_cleanup import delete_source
+
+
+def run_files(files, process_file, workers: int = 1, on_file_done=None, budget=None) -> list:
+    """Runs process_file once for every file, at most workers at a time
+
+    :param files: blob list generator or list of blob properties
+    :param process_file: callable taking one blob properties item, may return a dict of extra details
+    :param workers: max number of files processed at the same time, 1 runs inline
+    :param on_file_done: optional callable given each result as soon as its file finishes
+    :param budget: optional memory_budget.MemoryBudget, files then also start only while their
+                   estimated memory fits, see run_files_in_budget
+    :return: list of per-file result dicts, in listing order, one for each file of a coalesced group
+    """
+
+    files = list(files)
+
+    if budget:
+        return run_files_in_budget(files, process_file, workers, budget, on_file_done)
+
+    if workers <= 1 or len(files) <= 1:
+        return [result for file in files for result in _run_one(file, process_file, on_file_done)]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_run_one, file, process_file, on_file_done) for file in files]
+
+        return [result for future in futures for result in future.result()]
+
+
+def run_files_in_budget(files: list, process_file, workers: int, budget, on_file_done=None) -> list:
+    """Runs process_file over files largest first, starting each one when its estimated memory fits the budget
+    Whenever a file finishes, the largest waiting files that fit in what is left of the budget
+    start, so small files fill the gaps around the big ones.  A file bigger than the whole
+    budget runs on its own.  The budget samples resident memory while files run.
+
+    :param files: list of blob properties items, or coalesced groups
+    :param process_file: callable taking one item, may return a dict of extra details
+    :param workers: max number of files processed at the same time
+    :param budget: memory_budget.MemoryBudget
+    :param on_file_done: optional callable given each result as soon as its file finishes
+    :return: list of per-file result dicts, in listing order, one for each file of a coalesced group
+    """
+    estimates = [estimate_memory(file) for file in files]
+    waiting = sorted(range(len(files)), key=lambda idx: -estimates[idx])
+    results = [None] * len(files)
+    running = {}    # future: index of its file
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while waiting or running:
+            for idx in list(waiting):
+                if len(running) >= workers:
+                    break
+
+                if budget.admit(estimates[idx], alone=not running):
+                    waiting.remove(idx)
+                    running[executor.submit(_run_one, files[idx], process_file, on_file_done)] = idx
+
+            done, _ = wait(running, timeout=RSS_SAMPLE_SECONDS, return_when=FIRST_COMPLETED)
+            budget.sample_rss()
+
+            for future in done:
+                idx = running.pop(future)
+                budget.release(estimates[idx])
+                results[idx] = future.result()
+
+    return [result for item_results in results for result in item_results]
+
+
+async def run_files_async(files, process_file, workers: int = 1, on_file_done=None) -> list:
+    """Async version of run_files, at most workers files are in flight at a time
+
+    :param files: async iterator or iterable of blob properties
+    :param process_file: coroutine function taking one blob properties item
+    :param workers: max number of files processed at the same time
+    :param on_file_done: optional callable given each result as soon as its file finishes
+    :return: list of per-file result dicts, in listing order
+    """
+    if hasattr(files, '__aiter__'):
+        files = [file async for file in files]
+
+    semaphore = asyncio.Semaphore(max(1, workers))
+
+    async def run_one(file):
+        async with semaphore:
+            return await _run_one_async(file, process_file, on_file_done)
+
+    return list(await asyncio.gather(*(run_one(file) for file in files)))
+
+
+def run_listing(source_blob, pattern: str, process_file, options, group=None) -> list:
+    """Lists the source a page at a time and runs process_file over this shard's files of each page
+    The next page is only listed once the files of the page before have finished, then the
+    options' listing checkpoint, if any, records how far the run got.  With a ledger, files
+    processed before with the same content are skipped and deleted, and new ones are recorded.
+    A deferred source cleanup is committed before the checkpoint, so a resumed listing never
+    passes over files that were processed but not yet cleaned up.
+
+    :param source_blob: BlobHandler for the source container and path
+    :param pattern: fnmatch pattern of the datatype's file names
+    :param process_file: callable taking one blob properties item, may return a dict of extra details
+    :param options: RunOptions, for the page size, shard, workers, checkpoint, ledger, memory budget, cleanup
+                    and timer
+    :param group: optional callable turning the files of a page into work items for process_file,
+                  e.g. coalesce.group_files
+    :return: list of per-file result dicts, in listing order
+    """
+    checkpoint = options.listing_checkpoint
+    run_timer = options.run_timer or NULL_TIMER
+    pages = source_blob.walk_blob_pages(pattern, options.page_size,
+                                        checkpoint.continuation_token if checkpoint else None)
+    results = []
+
+    for files, next_token in run_timer.meter(pages, 'list', size=None):
+        files = [file for file in files if options.owns_file(file['name'])]
+        run_timer.count('list', rows=len(files))
+
+        if options.ledger:
+            files, seen = options.ledger.partition(files)
+
+            for file, entry in seen:
+                _delete_seen(source_blob, file, options.cleanup)
+            results.extend(_skipped(file, entry, options.on_file_done) for file, entry in seen)
+
+        items = group(files) if group else files
+        page_results = run_files(items, process_file, options.workers, options.on_file_done, options.memory_budget)
+        results.extend(page_results)
+
+        if options.ledger:
+            _record(options.ledger, items, page_results)
+
+        if options.cleanup:
+            with run_timer.stage('delete'):
+                options.cleanup.commit()
+
+        if checkpoint:
+            checkpoint.page_done(next_token)
+
+    if checkpoint:
+        checkpoint.finish()
+
+    return results
+
+
+async def run_listing_async(source_blob, pattern: str, process_file, options) -> list:
+    """Async version of run_listing
+
+    :param source_blob: AsyncBlobHandler for the source container and path
+    :param pattern: fnmatch pattern of the datatype's file names
+    :param process_file: coroutine function taking one blob properties item, may return a dict of extra details
+    :param options: RunOptions, for the page size, shard, workers, checkpoint, ledger and timer
+    :return: list of per-file result dicts, in listing order
+    """
+    checkpoint = options.listing_checkpoint
+    run_timer = options.run_timer or NULL_TIMER
+    pages = source_blob.walk_blob_pages(pattern, options.page_size,
+                                        checkpoint.continuation_token if checkpoint else None)
+    results = []
+
+    async for files, next_token in run_timer.meter_async(pages, 'list', size=None):
+        files = [file for file in files if options.owns_file(file['name'])]
+        run_timer.count('list', rows=len(files))
+
+        if options.ledger:
+            # the ledger store is blocking, keep it off the event loop
+            files, seen = await asyncio.get_running_loop().run_in_executor(None, options.ledger.partition, files)
+
+            for file, entry in seen:
+                try:
+                    await source_blob.delete_blob_file(file['name'].rpartition('/')[2])
+                except Exception:
+                    logging.exception(f'Could not delete already processed {file["name"]}')
+            results.extend(_skipped(file, entry, options.on_file_done) for file, entry in seen)
+
+        page_results = await run_files_async(files, process_file, options.workers, options.on_file_done)
+        results.extend(page_results)
+
+        if options.ledger:
+            await asyncio.get_running_loop().run_in_executor(None, _record, options.ledger, files, page_results)
+
+        if checkpoint:
+            checkpoint.page_done(next_token)
+
+    if checkpoint:
+        checkpoint.finish()
+
+    return results
+
+
+def summarise(status: str, results: list) -> dict:
+    """Builds the json results for a pipeline run
+
+    :param status: overall message, e.g. 'SAP_Batch Done'
+    :param results: per-file results returned by run_files
+    :return: dict for the http response
+    """
+    failed = sum(1 for result in results if result['status'] == 'failed')
+    skipped = [result for result in results if result['status'] == 'skipped']
+
+    return {'status': status,
+            'processed': len(results) - failed - len(skipped),
+            'failed': failed,
+            'skipped': len(skipped),
+            'bytes_saved': sum(result['bytes'] for result in skipped),
+            'files': results}
+
+
+def _skipped(file, entry: dict, on_file_done=None) -> dict:
+    """result for a file the ledger has already seen
+
+    :param file: blob properties item from the listing
+    :param entry: ledger entry of the earlier processing
+    :param on_file_done: optional callable given the result
+    :return: result dict, bytes is what was not downloaded
+    """
+    result = {'file': file['name'], 'status': 'skipped', 'bytes': file['size'],
+              'processed_by': entry.get('pipeline_run_id'), 'seconds': 0.0}
+
+    if on_file_done:
+        on_file_done(result)
+
+    return result
+
+
+def _delete_seen(source_blob, file, cleanup=None):
+    """cleans up a file that was processed before, as processing it would have.
+    The listing only has files directly in the source path, so the name after the last '/' is the file"""
+    try:
+        delete_source(source_blob, file['name'].rpartition('/')[2], cleanup)
+    except Exception:  # left for the next run, which skips it again
+        logging.exception(f'Could not delete already processed {file["name"]}')
+
+
+def _record(ledger, items: list, results: list):
+    """adds the files of successful results to the ledger, each file of a coalesced group on its own
+
+    :param ledger: manager_ledger.Ledger
+    :param items: work items given to run_files, files or groups of files
+    :param results: per-file results from run_files
+    :return: None
+    """
+    succeeded = {result['file'] for result in results if result['status'] == 'success'}
+
+    for item in items:
+        for file in item.get('group', [item]):
+            if file['name'] in succeeded:
+                ledger.record(file)
+
+
+def _run_one(file, process_file, on_file_done=None) -> list:
+    """Processes one file and converts the outcome to result dicts, one per file of a coalesced group
+
+    :param file: blob properties item from the listing, or a coalesced group
+    :param process_file: callable doing the work
+    :param on_file_done: optional callable given each result
+    :return: list of result dicts with file name, status, seconds taken and error if there was one
+    """
+    result = {'file': file['name'], 'status': 'success'}
+    started = time.perf_counter()
+
+    try:
+        details = process_file(file)
+
+    except Exception as e:  # report and carry on with the next file
+        logging.exception(f'Failed processing {file["name"]}')
+        result.update({'status': 'failed', 'error': f'{type(e).__name__}: {e}'})
+
+    else:
+        if details:
+            result.update(details)
+
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    results = _split_group(file, result)
+
+    if on_file_done:
+        for file_result in results:
+            on_file_done(file_result)
+
+    return results
+
+
+def _split_group(item, result: dict) -> list:
+    """Turns the result of a coalesced group into one result per file of the group
+    The group's outputs, stages and time stay with its first file, so they are counted once.
+
+    :param item: work item, a file or a coalesced group
+    :param result: result of the item, process_group gives the outcome of each file under 'group_results'
+    :return: list of per-file results
+    """
+    members = item.get('group')
+
+    if not members or len(members) == 1:    # a group of one is processed as a plain file
+        return [result]
+
+    outcomes = result.pop('group_results', None)
+
+    if outcomes is None:    # the group failed as a whole, e.g. its outputs could not be committed
+        outcomes = [{'file': file['name'], 'status': result['status'], 'error': result.get('error')}
+                    for file in members]
+
+    results = [dict(outcome, group=item['name']) for outcome in outcomes]
+    results[0].update({key: value for key, value in result.items() if key not in ('file', 'status', 'error')})
+
+    return results
+
+
+async def _run_one_async(file, process_file, on_file_done=None) -> dict:
+    """Async version of _run_one
+
+    :param file: blob properties item from the listing
+    :param process_file: coroutine function doing the work
+    :param on_file_done: optional callable given the result
+    :return: result dict with file name, status, seconds taken and error if there was one
+    """
+    result = {'file': file['name'], 'status': 'success'}
+    started = time.perf_counter()
+
+    try:
+        details = await process_file(file)
+
+    except Exception as e:  # report and carry on with the next file
+        logging.exception(f'Failed processing {file["name"]}')
+        result.update({'status': 'failed', 'error': f'{type(e).__name__}: {e}'})
+
+    else:
+        if details:
+            result.update(details)
+
+    result['seconds'] = round(time.perf_counter() - started, 3)
+
+    if on_file_done:
+        on_file_done(result)
+
+    return result
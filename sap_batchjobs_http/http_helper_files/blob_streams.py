@@ -0,0 +1,326 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# File-like wrappers around blob downloads so that the parsers can
+# read straight from the network chunks without writing the blob
+# to local disk first.  ChunkSink does the same for writers that
+# need a file object, e.g. parquet, handing the bytes on as blocks.
+# Compressed drops (.gz, .zip) are recognised by extension or magic
+# bytes, gzip is inflated as the chunks arrive, zip archives need
+# random access and are spooled first.
+# Changes:
+# ---------------------------------------------------------------
+
+import io
+import zlib
+import codecs
+import tempfile
+from itertools import chain
+
+READ_BUFFER_SIZE = 1024 * 1024
+WRITE_CHUNK_SIZE = 4 * 1024 * 1024
+SPOOL_MEMORY_SIZE = 64 * 1024 * 1024     # zip archives bigger than this are spooled to local disk
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZIP_MAGIC = b'PK\x03\x04'
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.gzip': 'gzip', '.zip': 'zip'}
+
+
+class ChunkStream(io.RawIOBase):
+
+    def __init__(self, chunks):
+        """Read-only binary file object over an iterator of byte chunks,
+           e.g. download_blob().chunks()
+
+        :param chunks: iterable of bytes-like objects
+        """
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        """fills buffer from the current chunk, pulling the next chunk when it runs out
+
+        :param buffer: writable buffer supplied by io.BufferedReader
+        :return: number of bytes copied, 0 at the end of the stream
+        """
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._chunks)).cast('B')
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+
+        return size
+
+
+class ChunkSink(io.RawIOBase):
+
+    def __init__(self):
+        """Write-only binary file object that collects bytes until take() hands them on"""
+        self._parts = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)      # writers may reuse their buffer after the call
+        self._parts.append(data)
+        self._position += len(data)
+
+        return len(data)
+
+    def tell(self) -> int:
+        """total bytes written, writers use it for file offsets"""
+        return self._position
+
+    def take(self) -> bytes:
+        """returns everything written since the last take and forgets it"""
+        data = b''.join(self._parts)
+        self._parts = []
+
+        return data
+
+
+def sniff_encoding(prefix: bytes, default: str = 'UTF-16') -> str:
+    """Works out the text encoding from the first bytes of a file
+
+    :param prefix: first few bytes of the file, 4 is enough
+    :param default: encoding to use when the prefix is too short to tell
+    :return: python codec name
+    """
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'UTF-16'     # the codec reads the byte order from the BOM
+    if len(prefix) < 2:
+        return default
+
+    # no BOM, ascii text in UTF-16 has a zero in every other byte
+    if prefix[1] == 0 and prefix[0] != 0:
+        return 'utf-16-le'
+    if prefix[0] == 0 and prefix[1] != 0:
+        return 'utf-16-be'
+
+    return 'utf-8'
+
+
+def open_byte_stream(chunks) -> io.BufferedReader:
+    """Wraps byte chunks in a buffered binary stream
+
+    :param chunks: iterable of bytes-like objects
+    :return: buffered reader, supports peek() for sniffing
+    """
+    return io.BufferedReader(ChunkStream(chunks), buffer_size=READ_BUFFER_SIZE)
+
+
+def open_text_stream(chunks, encoding: str = None) -> io.TextIOWrapper:
+    """Wraps byte chunks in an incrementally decoding text stream
+
+    :param chunks: iterable of bytes-like objects
+    :param encoding: encoding of the source data, None sniffs it from the BOM
+    :return: text file object, newline='' to match how pandas opens files
+    """
+    raw = open_byte_stream(chunks)
+
+    if encoding is None:
+        encoding = sniff_encoding(raw.peek(4)[:4])
+
+    return io.TextIOWrapper(raw, encoding=encoding, newline='')
+
+
+def encode_lines(lines, encoding: str = 'utf-8', chunk_size: int = WRITE_CHUNK_SIZE):
+    """Encodes text lines and groups them into upload sized byte chunks
+
+    :param lines: iterable of text lines, including their line endings
+    :param encoding: output encoding, upload_blob writes strings as utf-8
+    :param chunk_size: approximate bytes per chunk
+    :return: generator of bytes
+    """
+    pending = []
+    pending_size = 0
+
+    for line in lines:
+        encoded = line.encode(encoding)
+        pending.append(encoded)
+        pending_size += len(encoded)
+
+        if pending_size >= chunk_size:
+            yield b''.join(pending)
+            pending = []
+            pending_size = 0
+
+    if pending:
+        yield b''.join(pending)
+
+
+def peek_chunks(chunks, size: int = 4):
+    """Reads the first bytes of a chunk stream without losing them
+
+    :param chunks: iterable of bytes-like objects
+    :param size: number of bytes wanted
+    :return: first size bytes (fewer if the stream is shorter), iterator over all of the chunks
+    """
+    chunks = iter(chunks)
+    taken = []
+    prefix = b''
+
+    while len(prefix) < size:
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+
+        taken.append(chunk)
+        prefix += bytes(chunk[:size - len(prefix)])
+
+    return prefix, chain(taken, chunks)
+
+
+def detect_compression(filename: str, prefix: bytes = b''):
+    """Works out whether a file is compressed, from its extension or else its first bytes
+
+    :param filename: file name, only the extension is looked at
+    :param prefix: first few bytes of the file, 4 is enough
+    :return: 'gzip', 'zip' or None
+    """
+    for extension, compression in COMPRESSION_EXTENSIONS.items():
+        if filename.lower().endswith(extension):
+            return compression
+
+    if prefix.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if prefix.startswith(ZIP_MAGIC):
+        return 'zip'
+
+    return None
+
+
+def strip_compression_extension(filename: str) -> str:
+    """'IW38_20200624.csv.gz' -> 'IW38_20200624.csv', other names are returned as they are"""
+    for extension in COMPRESSION_EXTENSIONS:
+        if filename.lower().endswith(extension):
+            return filename[:-len(extension)]
+
+    return filename
+
+
+def gunzip_chunks(chunks, chunk_size: int = WRITE_CHUNK_SIZE):
+    """Inflates a gzip stream as the chunks arrive, concatenated gzip members are read in turn
+
+    :param chunks: iterable of bytes-like objects of the compressed file
+    :param chunk_size: max bytes per decompressed chunk, keeps highly compressed data bounded
+    :return: generator of decompressed bytes
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    started = False
+
+    for chunk in chunks:
+        data = bytes(chunk)
+
+        while data:
+            started = True
+            out = decompressor.decompress(data, chunk_size)
+            if out:
+                yield out
+
+            if decompressor.eof:
+                # another member may follow, trailing zero padding is ignored like gzip does
+                data = decompressor.unused_data.lstrip(b'\x00')
+                if data:
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                data = decompressor.unconsumed_tail
+
+    if started and not decompressor.eof:
+        raise EOFError('gzip stream ended before the end of the compressed data')
+
+
+def decompress_chunks(chunks, filename: str):
+    """Passes a chunk stream through, inflating it on the way if the file is gzipped
+
+    :param chunks: iterable of bytes-like objects
+    :param filename: file name, the extension is checked before the magic bytes
+    :return: iterable of bytes of the uncompressed file
+    """
+    prefix, chunks = peek_chunks(chunks)
+    compression = detect_compression(filename, prefix)
+
+    if compression == 'gzip':
+        return gunzip_chunks(chunks)
+    if compression == 'zip':
+        raise ValueError(f'{filename} is a zip archive, its members have to be read one at a time')
+
+    return chunks
+
+
+def spool_chunks(chunks, max_memory: int = SPOOL_MEMORY_SIZE):
+    """Copies a chunk stream into a seekable temporary file, kept in memory while it is small
+
+    :param chunks: iterable of bytes-like objects
+    :param max_memory: bytes held in memory before moving to local disk
+    :return: SpooledTemporaryFile positioned at the start, close it when done
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+
+    for chunk in chunks:
+        spool.write(chunk)
+
+    spool.seek(0)
+
+    return spool
+
+
+def buffer_chunks(chunks, max_bytes: int):
+    """Copies a chunk stream into memory, giving up as soon as it is bigger than max_bytes
+
+    :param chunks: iterable of bytes-like objects
+    :param max_bytes: most bytes to hold
+    :return: BytesIO positioned at the start, or None if the stream is bigger than max_bytes
+    """
+    buffer = io.BytesIO()
+
+    for chunk in chunks:
+        if buffer.tell() + len(chunk) > max_bytes:
+            return None
+        buffer.write(chunk)
+
+    buffer.seek(0)
+
+    return buffer
+
+
+def file_chunks(f, chunk_size: int = READ_BUFFER_SIZE):
+    """Reads an open binary file from where it is as a chunk stream
+
+    :param f: binary file object, e.g. from spool_chunks or buffer_chunks
+    :param chunk_size: bytes per chunk
+    :return: generator of bytes
+    """
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def zip_member_chunks(archive, member, chunk_size: int = READ_BUFFER_SIZE):
+    """Reads one member of an open zip archive as a chunk stream
+
+    :param archive: zipfile.ZipFile
+    :param member: ZipInfo or name of the member
+    :param chunk_size: bytes per chunk
+    :return: generator of bytes, decompressed
+    """
+    with archive.open(member) as source:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
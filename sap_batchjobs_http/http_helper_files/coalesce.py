@@ -0,0 +1,161 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Opt in coalescing of small drops.  Files of one listing page that
+# route to the same ADF path (event, transaction and date) are
+# written as one in progress file instead of one each, so ADF picks
+# up a handful of files rather than hundreds.  Every row keeps its
+# filename column.  The rows of each file are staged as blocks of
+# the shared output and committed together, a file whose columns
+# differ from the output's goes to an output of its own.
+# Changes:
+# Oct 18, 2026 - a file that can't be read fails on its own, the rest of its group succeeds
+# ---------------------------------------------------------------
+
+import uuid
+import logging
+
+# import our own modules.
+try:  # if on azure
+    from .manager_blobs import BlobHandler, csv_batches, CSV_BATCH_ROWS
+    from .stage_metrics import new_timer, log_stages
+    from .source_cleanup import delete_source
+except ModuleNotFoundError:  # if local
+    from sap_batchjobs_http.http_helper_files.manager_blobs import BlobHandler, csv_batches, CSV_BATCH_ROWS
+    from sap_batchjobs_http.http_helper_files.stage_metrics import new_timer, log_stages
+    from sap_batchjobs_http.http_helper_files.source_cleanup import delete_source
+
+
+def group_files(files: list, key) -> list:
+    """Groups a page of listed files by key, in listing order
+
+    :param files: blob properties items
+    :param key: callable giving the group of a file, e.g. its ADF path
+    :return: list of dicts with the name of the first file and the group's files under 'group'
+    """
+    groups = {}
+
+    for file in files:
+        groups.setdefault(key(file), []).append(file)
+
+    return [{'name': members[0]['name'], 'group': members} for members in groups.values()]
+
+
+class CoalescedWriter:
+
+    def __init__(self, connection_string: str, sink_container: str, timer):
+        """Appends dataframes to shared csv outputs, one per in progress path and column set
+        Nothing is visible in the sink until commit.
+
+        :param connection_string: connection string of the sink
+        :param sink_container: container for in progress files
+        :param timer: stage_metrics timer, serialisation is recorded as 'serialise'
+        """
+        self._connection_string = connection_string
+        self._sink_container = sink_container
+        self._timer = timer
+        self._outputs = {}
+
+    def append(self, df, in_progress_path: str, in_progress_file: str, source_file: str):
+        """stages the rows of one file, the first file with a new column set names the output
+
+        :param df: transformed dataframe, with the filename column
+        :param in_progress_path: sink path of the file
+        :param in_progress_file: sink name the file would have on its own
+        :param source_file: source name, reported with the output
+        :return: None
+        """
+        key = (in_progress_path, tuple(df.columns))
+        output = self._outputs.get(key)
+
+        if output is None:
+            output = self._outputs[key] = {'blob': BlobHandler(self._connection_string, self._sink_container,
+                                                               in_progress_path),
+                                           'file': in_progress_file,
+                                           'block_prefix': uuid.uuid4().hex,
+                                           'block_ids': [],
+                                           'sources': []}
+
+        # only the output's first file brings the header, empty blocks can't be staged
+        batches = csv_batches(df, CSV_BATCH_ROWS, header=not output['block_ids'])
+        chunks = (chunk for chunk in self._timer.meter(batches, 'serialise') if chunk)
+
+        with self._timer.stage('upload'):
+            output['block_ids'] += output['blob'].stage_blocks(output['file'], chunks, output['block_prefix'],
+                                                               len(output['block_ids']))
+        self._timer.count('upload', rows=len(df))
+
+        output['sources'].append(source_file)
+
+    def commit(self) -> list:
+        """writes every output
+
+        :return: list of dicts with each output's path and name and the files in it
+        """
+        outputs = []
+
+        for output in self._outputs.values():
+            with self._timer.stage('upload'):
+                output['blob'].commit_blocks(output['file'], output['block_ids'])
+
+            outputs.append({'output': output['blob'].path + output['file'], 'sources': output['sources']})
+
+        return outputs
+
+
+def process_group(members: list, source_blob: BlobHandler, source_path: str, connection_string: str,
+                  sink_container: str, options, route, read_dataframe) -> dict:
+    """Processes files of one group into shared outputs, then deletes the files that made it in
+    A file that can't be read is left in the source for a retry and reported as failed, the
+    rest of the group is still written.
+
+    :param members: blob properties items of the group
+    :param source_blob: BlobHandler for the source container and path
+    :param source_path: path passed by ADF to use for source
+    :param connection_string: connection string for the sink
+    :param sink_container: container for in progress files
+    :param options: run options
+    :param route: the processor's _get_new_path_file
+    :param read_dataframe: callable (open_chunks, source_file, adf_path, options, timer) giving the transformed dataframe
+    :return: dict of the outputs written, the stage metrics and the outcome of each file under 'group_results'
+    """
+    timer = new_timer(options.metrics)
+    writer = CoalescedWriter(connection_string, sink_container, timer)
+    written = []
+    outcomes = []   # per file of the group, batch_runner turns them into the files' results
+
+    for file in members:
+        source_file = route(file, source_path)[0]
+        folder = file['name'][:-len(source_file)]
+
+        try:
+            # every file of an archive is read before any of it is staged, so a file is all in or all out
+            frames = []
+            for name, open_chunks in timer.meter(source_blob.read_blob_files(source_file), 'download', size=None):
+                _, adf_path, in_progress_path, in_progress_file = route({'name': folder + name}, source_path)
+                frames.append((read_dataframe(timer.meter_open(open_chunks, 'download'), name, adf_path, options,
+                                              timer), in_progress_path, in_progress_file, name))
+
+        except Exception as e:  # the other files still go out
+            logging.exception(f'Could not coalesce {file["name"]}')
+            outcomes.append({'file': file['name'], 'status': 'failed', 'error': f'{type(e).__name__}: {e}'})
+            continue
+
+        for df, in_progress_path, in_progress_file, name in frames:
+            writer.append(df, in_progress_path, in_progress_file, name)
+        written.append(source_file)
+        outcomes.append({'file': file['name'], 'status': 'success'})
+
+    details = {'coalesced': writer.commit(), 'group_results': outcomes}
+
+    # cleanup, once the outputs are committed
+    with timer.stage('delete'):
+        for source_file in written:
+            delete_source(source_blob, source_file, options.cleanup)
+
+    if timer.enabled:
+        details['stages'] = timer.to_dict()
+        log_stages('file_stages', details['stages'], file=members[0]['name'], files=len(members))
+
+    return details
@@ -5,12 +5,53 @@
 # Manages all blob read, writes, and deletes.
 # Changes:
 # ---------------------------------------------------------------
-import os
+import time
+import uuid
+import base64
 import logging
-import tempfile
 import csv
+import zipfile
+import posixpath
+import fnmatch
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
 import pandas as pd
-from azure.storage.blob import BlobClient, BlobServiceClient
+from azure.core.exceptions import ResourceNotFoundError
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobClient, BlobServiceClient, BlobBlock, BlobPrefix
+
+try:  # if on azure
+    from .blob_streams import open_byte_stream, open_text_stream, sniff_encoding, ChunkSink, peek_chunks, \
+        detect_compression, decompress_chunks, strip_compression_extension, spool_chunks, zip_member_chunks
+    from .storage_backends import StorageBackend, BlobNotFoundError, get_backend, DELETE_BATCH_SIZE
+    from .schema_cache import get_schema_cache, SchemaMismatchError
+    from .run_options import PARSER_ENGINES, OUTPUT_FORMATS, PARQUET_COMPRESSION
+except ModuleNotFoundError:  # if local
+    from sap_batchjobs_http.http_helper_files.blob_streams import open_byte_stream, open_text_stream, \
+        sniff_encoding, ChunkSink, peek_chunks, detect_compression, decompress_chunks, \
+        strip_compression_extension, spool_chunks, zip_member_chunks
+    from sap_batchjobs_http.http_helper_files.storage_backends import StorageBackend, BlobNotFoundError, \
+        get_backend, DELETE_BATCH_SIZE
+    from sap_batchjobs_http.http_helper_files.schema_cache import get_schema_cache, SchemaMismatchError
+    from sap_batchjobs_http.http_helper_files.run_options import PARSER_ENGINES, OUTPUT_FORMATS, \
+        PARQUET_COMPRESSION
+
+CSV_BATCH_ROWS = 100000
+HTTP_POOL_SIZE = 32
+COPY_POLL_INTERVAL = 1.0    # seconds between checks on server side copies still pending
+COPY_TIMEOUT = 300          # seconds to wait for them, a copy not done by then keeps its source
+
+# pd.read_csv arguments per engine, round_trip floats and a single inference pass over each
+# column make the c engine match the python engine
+READ_OPTIONS = {'c': {'engine': 'c', 'float_precision': 'round_trip', 'low_memory': False},
+                'python': {'engine': 'python'}}
+
+# one service client (and http session) per connection string, see get_service_client
+_service_pool = {}
+_service_pool_lock = threading.Lock()
+_service_pool_stats = {'hits': 0, 'misses': 0}
 
 
 class BlobHandler:
@@ -19,7 +60,7 @@ class BlobHandler:
         """Sets up connection to container,and specific path in container
            Each BlobHandler object is for one container/path combination
 
-        :param connection_string: azure connection string
+        :param connection_string: azure connection string, or e.g. 'memory://name', see storage_backends
         :param container: container to connect to
         :param path: path within container, can be null and set dynamically, no filename in path
         """
@@ -27,54 +68,159 @@ class BlobHandler:
         self._container = container
         self.path = path    # can be set dynamically after object creation
 
-    def read_blob_csv_to_df(self, filename: str):
+    def read_blob_csv_to_df(self, filename: str, engine: str = 'c', schema_key: str = None):
         """ Connects to blob and returns contents
+        The download is decoded as it streams in, nothing is written to local disk.
+        Gzipped files are inflated on the way, zip archives go through read_blob_files.
 
         :param filename: full file name without path or container
+        :param engine: parser engine, one of PARSER_ENGINES. 'c' and 'pyarrow' fall back to
+                       'python' for files they can't parse
+        :param schema_key: transaction of the file to use the schema cache for, None to infer dtypes
         :return: contents of file
         """
 
         # TODO wrap in try, return error, or contents
-        blob_client = self._create_client(filename)
+        df = read_csv_chunks(lambda: decompress_chunks(self._download(filename), filename), filename, engine,
+                             schema_key)
 
-        # get local tempfile path and create a tempfile name
-        temp_file_path = tempfile.gettempdir()
-        temp_file = os.path.join(temp_file_path, "tempfile")
+        return df
 
-        # download blob to temp file
-        with open(temp_file, 'wb') as f:
-            f.write(blob_client.download_blob().readall())
+    def read_blob_files(self, filename: str):
+        """ Splits a blob into the logical files it holds
+        A plain or gzipped blob is one file, a zip archive is one file per member.
+        The archive is spooled (memory, then local disk) because zip needs random access.
 
-        df = pd.read_csv(temp_file,  delimiter='\t', encoding='UTF-16', engine='python', quoting=csv.QUOTE_NONE)
+        :param filename: full file name without path or container
+        :return: generator of (name, open_chunks), name has any compression extension removed and
+                 open_chunks() returns the uncompressed contents as byte chunks, every time it is called
+        """
+        prefix, chunks = peek_chunks(self._download(filename))
+        compression = detect_compression(filename, prefix)
 
-        logging.info(f'Read file {filename} of size {len(df)}')
+        if compression != 'zip':
+            first_download = [decompress_chunks(chunks, filename)]
 
-        blob_client = None
+            def open_chunks():
+                # the listing download is used first, any reread downloads again
+                if first_download:
+                    return first_download.pop()
+                return decompress_chunks(self._download(filename), filename)
 
-        return df
+            yield strip_compression_extension(filename), open_chunks
+            return
+
+        with spool_chunks(chunks) as spool, zipfile.ZipFile(spool) as archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+
+                yield posixpath.basename(member.filename), functools.partial(zip_member_chunks, archive, member)
+
+    def read_blob_lines(self, filename: str):
+        """ Streams a text blob line by line, decoding as it downloads
+
+        :param filename: full file name without path or container
+        :return: generator of text lines, line endings included
+        """
+        with open_text_stream(decompress_chunks(self._download(filename), filename)) as text:
+            for line in text:
+                yield line
+
+    def read_blob_bytes(self, filename: str) -> bytes:
+        """ Downloads a small blob whole, e.g. json state files
+
+        :param filename: full file name without path or container
+        :return: blob contents
+        """
+        return self._backend().read_bytes(self._container, self._blob_name(filename))
+
+    def write_bytes_to_blob(self, data: bytes, filename: str):
+        """writes a small blob in one request, replacing any existing blob
+
+        :param data: contents
+        :param filename:
+        :return:
+        """
+        self._backend().write_bytes(self._container, self._blob_name(filename), data)
 
-    def write_csv_to_blob(self, df, filename: str):
+    def write_csv_to_blob(self, df, filename: str, batch_rows: int = CSV_BATCH_ROWS, timer=None):
         """writes a tab-delimited file to container and path
+        Rows are serialised in batches and staged as blocks, the next batch is serialised
+        while the current one uploads. An existing blob is replaced when the block list
+        is committed, until then readers still see the old version.
 
         :param df: pandas dataframe to write to file
         :param filename:
+        :param batch_rows: rows per staged block
+        :param timer: optional stage_metrics timer, serialisation is recorded as 'serialise'
         :return:
         """
         # TODO warp in try, return status
+        self._upload(filename, _serialised(csv_batches(df, batch_rows), timer))
+
+    def write_parquet_to_blob(self, df, filename: str, compression: str = 'snappy',
+                              batch_rows: int = CSV_BATCH_ROWS, timer=None):
+        """writes a parquet file to container and path
+        Each row group is staged as a block as soon as it is encoded, the footer goes in
+        the last block. Replaces any existing blob on commit, like write_csv_to_blob.
 
+        :param df: pandas dataframe to write to file
+        :param filename:
+        :param compression: one of PARQUET_COMPRESSION
+        :param batch_rows: rows per row group
+        :param timer: optional stage_metrics timer, encoding is recorded as 'serialise'
+        :return:
+        """
+        self._upload(filename, _serialised(parquet_batches(df, batch_rows, compression), timer))
 
+    def write_df_to_blob(self, df, filename: str, output_format: str = 'csv', compression: str = 'snappy',
+                         timer=None):
+        """writes a dataframe in the chosen output format
 
-        try:  # will throw if file exists already
-            blob_client = self._create_client(filename)
-            output = df.to_csv(index=False, sep='\t')
-            blob_client.upload_blob(output)
+        :param df: pandas dataframe to write to file
+        :param filename: full file name, see output_file_name for the extension
+        :param output_format: one of OUTPUT_FORMATS
+        :param compression: parquet compression, ignored for csv
+        :param timer: optional stage_metrics timer, serialisation is recorded as 'serialise'
+        :return:
+        """
+        if output_format == 'csv':
+            self.write_csv_to_blob(df, filename, timer=timer)
+        elif output_format == 'parquet':
+            self.write_parquet_to_blob(df, filename, compression, timer=timer)
+        else:
+            raise ValueError(f'Unknown output format {output_format}, expected one of {OUTPUT_FORMATS}')
 
-        except Exception as e:  # delete blob then try again
-            self.delete_blob_file(filename)
-            output = df.to_csv(index=False, sep='\t')
-            blob_client.upload_blob(output)
+    def write_stream_to_blob(self, chunks, filename: str):
+        """writes byte chunks to a blob as they are produced, replacing any existing blob
 
-        blob_client = None
+        :param chunks: iterable of bytes, e.g. from blob_streams.encode_lines
+        :param filename:
+        :return:
+        """
+        self._upload(filename, chunks)
+
+    def stage_blocks(self, filename: str, chunks, block_prefix: str, first_idx: int = 0) -> list:
+        """stages chunks as blocks of a blob without changing it, see commit_blocks
+
+        :param filename:
+        :param chunks: iterable of bytes, one block each
+        :param block_prefix: unique prefix, the same for every block of the blob
+        :param first_idx: position of the first block, to carry on from blocks staged earlier
+        :return: list of staged block ids
+        """
+        return _stage_blocks(self._backend(), self._container, self._blob_name(filename), chunks,
+                             block_prefix, first_idx)
+
+    def commit_blocks(self, filename: str, block_ids: list):
+        """replaces the blob with staged blocks, in the order given
+
+        :param filename:
+        :param block_ids: ids returned by stage_blocks
+        :return: None
+        """
+        self._backend().commit_blocks(self._container, self._blob_name(filename), block_ids)
 
     def delete_blob_file(self, filename: str):
         """Deletes a blob
@@ -84,41 +230,429 @@ class BlobHandler:
         """
 
         # TODO wrap in try, return status
-        blob_client = self._create_client(filename)
-        blob_client.delete_blob(delete_snapshots=False)
-        blob_client = None
+        self._backend().delete(self._container, self._blob_name(filename))
+
+    def delete_blob_files(self, filenames: list) -> list:
+        """Deletes blobs in batches, ones already gone count as deleted
+
+        :param filenames: names under the handler's path
+        :return: filenames that could not be deleted
+        """
+        return self._for_blobs(filenames, lambda blobs: self._backend().delete_many(self._container, blobs))
+
+    def archive_blob_files(self, filenames: list, archive_container: str) -> list:
+        """Copies blobs to the same path and names in another container of the same account, server side in azure
+
+        :param filenames: names under the handler's path
+        :param archive_container: container to copy them to
+        :return: filenames that could not be copied
+        """
+        return self._for_blobs(filenames,
+                               lambda blobs: self._backend().copy_many(self._container, blobs, archive_container))
 
     def get_blob_list(self):
         """Returns blobs in object's container
 
-        :return: generator with list of blobs
+        :return: generator with list of blobs, each with at least name, size and etag
         """
 
-        service = self._create_service()
-        client = service.get_container_client(self._container)
+        return self._backend().list_blobs(self._container, self.path)
 
-        generator = client.list_blobs(name_starts_with=self.path)
+    def walk_blob_pages(self, pattern: str = '*', page_size: int = None, continuation_token: str = None):
+        """Lists the blobs directly in the path whose names match pattern, one page at a time
+        Folders below the path are not listed, and the part of pattern before any wildcard
+        is filtered by the service.
 
-        service = None
-        client = None
+        :param pattern: fnmatch pattern of the file name, e.g. 'PBI-*-*_*'
+        :param page_size: max blobs per page, defaults to the service's 5000
+        :param continuation_token: next page token saved from an earlier walk, to resume at that page
+        :return: generator of (list of matching blobs, token of the next page or None after the last page)
+        """
+        prefix, name_start = listing_prefix(self.path, pattern)
+        pages = self._backend().walk_pages(self._container, prefix, page_size, continuation_token)
 
-        return generator
+        for blobs, next_token in pages:
+            yield [blob for blob in blobs if fnmatch.fnmatchcase(blob['name'][name_start:], pattern)], next_token
 
-    def _create_service(self) -> BlobServiceClient:
-        return BlobServiceClient.from_connection_string(conn_str=self._connection_string)
+    def _backend(self) -> StorageBackend:
+        return get_backend(self._connection_string)
 
-    def _create_client(self, filename: str) -> BlobClient:
-        """Creates blob client object
+    def _blob_name(self, filename: str) -> str:
+        """full blob name of a file under the handler's path
 
         :param filename: name of file to open
-        :return: blob client object
+        :return: path and filename
         """
         # ensure last character on path is '/' to allow for filename appending
-        if self.path[-1] != '/':
+        if self.path and self.path[-1] != '/':
             self.path = self.path + '/'
 
-        file_to_open = self.path + filename
+        return self.path + filename
+
+    def _download(self, filename: str):
+        return self._backend().download_chunks(self._container, self._blob_name(filename))
+
+    def _for_blobs(self, filenames: list, action) -> list:
+        """runs action on the full blob names of filenames, mapping the blob names it returns back to filenames"""
+        blob_names = {self._blob_name(filename): filename for filename in filenames}
+
+        return [blob_names[blob] for blob in action(list(blob_names))]
+
+    def _upload(self, filename: str, chunks):
+        _upload_blocks(self._backend(), self._container, self._blob_name(filename), chunks)
+
+
+class AzureBackend(StorageBackend):
+
+    def __init__(self, connection_string: str):
+        """Azure blob storage through the pooled BlobServiceClient for the connection string
+
+        :param connection_string: azure connection string
+        """
+        self._connection_string = connection_string
+
+    def download_chunks(self, container: str, blob: str):
+        try:
+            return self._client(container, blob).download_blob().chunks()
+        except ResourceNotFoundError:
+            raise BlobNotFoundError(f'{container}/{blob}') from None
+
+    def read_bytes(self, container: str, blob: str) -> bytes:
+        try:
+            return self._client(container, blob).download_blob().readall()
+        except ResourceNotFoundError:
+            raise BlobNotFoundError(f'{container}/{blob}') from None
+
+    def write_bytes(self, container: str, blob: str, data: bytes):
+        self._client(container, blob).upload_blob(data, overwrite=True)
+
+    def stage_block(self, container: str, blob: str, block_id: str, data: bytes):
+        self._client(container, blob).stage_block(block_id, data)
+
+    def commit_blocks(self, container: str, blob: str, block_ids: list):
+        self._client(container, blob).commit_block_list([BlobBlock(block_id=block_id) for block_id in block_ids])
+
+    def delete(self, container: str, blob: str):
+        try:
+            self._client(container, blob).delete_blob(delete_snapshots=False)
+        except ResourceNotFoundError:
+            raise BlobNotFoundError(f'{container}/{blob}') from None
+
+    def delete_many(self, container: str, blobs: list) -> list:
+        """one blob batch request per DELETE_BATCH_SIZE blobs"""
+        container_client = get_service_client(self._connection_string).get_container_client(container)
+        failed = []
+
+        for start in range(0, len(blobs), DELETE_BATCH_SIZE):
+            batch = blobs[start:start + DELETE_BATCH_SIZE]
+
+            try:
+                responses = list(container_client.delete_blobs(*batch, raise_on_any_failure=False))
+            except Exception:
+                logging.exception(f'Could not delete a batch of {len(batch)} blobs from {container}')
+                failed.extend(batch)
+                continue
+
+            failed.extend(blob for blob, response in zip(batch, responses) if response.status_code not in (202, 404))
+
+        return failed
+
+    def copy_many(self, container: str, blobs: list, to_container: str) -> list:
+        """starts every copy server side, then waits for any the service has not finished at once"""
+        service_client = get_service_client(self._connection_string)
+        pending = {}
+        failed = []
+
+        for blob in blobs:
+            target = service_client.get_blob_client(to_container, blob)
+
+            try:
+                # same account, so the source is authorised by the connection string's key
+                status = target.start_copy_from_url(service_client.get_blob_client(container, blob).url)['copy_status']
+            except Exception:
+                logging.exception(f'Could not copy {container}/{blob} to {to_container}')
+                failed.append(blob)
+                continue
+
+            if status == 'pending':
+                pending[blob] = target
+            elif status != 'success':
+                failed.append(blob)
+
+        deadline = time.monotonic() + COPY_TIMEOUT
+
+        while pending and time.monotonic() < deadline:
+            time.sleep(COPY_POLL_INTERVAL)
+
+            for blob, target in list(pending.items()):
+                status = target.get_blob_properties().copy.status
+
+                if status != 'pending':
+                    del pending[blob]
+
+                    if status != 'success':
+                        failed.append(blob)
+
+        return failed + list(pending)
+
+    def list_blobs(self, container: str, prefix: str = ''):
+        container_client = get_service_client(self._connection_string).get_container_client(container)
+
+        return container_client.list_blobs(name_starts_with=prefix)
+
+    def walk_pages(self, container: str, prefix: str = '', page_size: int = None, continuation_token: str = None):
+        container_client = get_service_client(self._connection_string).get_container_client(container)
+        pages = container_client.walk_blobs(name_starts_with=prefix, delimiter='/', results_per_page=page_size) \
+            .by_page(continuation_token=continuation_token)
+
+        for page in pages:
+            # folders come back as BlobPrefix items, their contents are not listed
+            blobs = [blob for blob in page if not isinstance(blob, BlobPrefix)]
+
+            yield blobs, pages.continuation_token or None     # an empty marker after the last page
+
+    def _client(self, container: str, blob: str) -> BlobClient:
+        """blob client sharing the pooled service's http session"""
+        return get_service_client(self._connection_string).get_blob_client(container=container, blob=blob)
+
+
+def listing_prefix(path: str, pattern: str):
+    """prefix the service can filter a listing by, the path plus pattern up to its first wildcard
+
+    :param path: folder within the container, '' for the top
+    :param pattern: fnmatch pattern of the file name
+    :return: prefix, and where the file name starts in a listed blob name
+    """
+    folder = path if not path or path.endswith('/') else path + '/'
+    literal = pattern[:min([pattern.index(char) for char in '*?[' if char in pattern] or [len(pattern)])]
+
+    return folder + literal, len(folder)
+
+
+def get_service_client(connection_string: str) -> BlobServiceClient:
+    """Returns the shared BlobServiceClient for a connection string, creating it on first use
+    Clients live at module level so warm function invocations reuse open connections.
+
+    :param connection_string: azure connection string
+    :return: BlobServiceClient
+    """
+    with _service_pool_lock:
+        service = _service_pool.get(connection_string)
+
+        if service is None:
+            _service_pool_stats['misses'] += 1
+
+            # size the connection pool for parallel workers, requests defaults to 10
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+
+            service = BlobServiceClient.from_connection_string(conn_str=connection_string,
+                                                               transport=RequestsTransport(session=session))
+            _service_pool[connection_string] = service
+
+        else:
+            _service_pool_stats['hits'] += 1
+
+    return service
+
+
+def pool_stats() -> dict:
+    """hit and miss counters for the shared service clients, since the worker started
+
+    :return: dict with hits, misses and number of pooled clients
+    """
+    with _service_pool_lock:
+        return dict(_service_pool_stats, clients=len(_service_pool))
+
+
+def read_csv_chunks(open_chunks, filename: str, engine: str = 'c', schema_key: str = None) -> pd.DataFrame:
+    """Parses a file with read_tab_delimited, retrying with the python engine if the faster one fails
+
+    :param open_chunks: callable returning the file contents as byte chunks, called again for a retry
+    :param filename: name for logging
+    :param engine: one of PARSER_ENGINES
+    :param schema_key: transaction of the file to use the schema cache for, None to infer dtypes
+    :return: dataframe of the file contents
+    """
+    try:
+        df = read_tab_delimited(open_chunks(), engine, schema_key)
+
+    except SchemaMismatchError as e:
+        # the entry is dropped, read again to learn new dtypes from this file
+        logging.warning(f'{filename}: {e}')
+        df = read_csv_chunks(open_chunks, filename, engine, schema_key)
+
+    except (pd.errors.ParserError, UnicodeError) as e:
+        if engine == 'python':
+            raise
+
+        # stream is used up, read again for the slow but forgiving engine
+        logging.warning(f'{engine} engine could not parse {filename}, using python engine: {e}')
+        df = read_tab_delimited(open_chunks(), 'python', schema_key)
+
+    logging.info(f'Read file {filename} of size {len(df)}')
+
+    return df
+
+
+def read_tab_delimited(chunks, engine: str = 'c', schema_key: str = None) -> pd.DataFrame:
+    """Parses a tab delimited SAP/OBIEE extract without quoting
+
+    'c' and 'python' give identical frames, 'c' is many times faster. 'pyarrow' is the
+    fastest but infers its own types (e.g. ISO dates become timestamps), so it is opt in.
+
+    :param chunks: iterable of byte chunks of the file, encoding is sniffed from the BOM
+    :param engine: one of PARSER_ENGINES
+    :param schema_key: transaction of the file, its dtypes come from the schema cache rather than
+                       inference, see schema_cache.py. Not used by 'pyarrow', which has its own types
+    :return: dataframe of the file contents
+    """
+    if engine not in PARSER_ENGINES:
+        raise ValueError(f'Unknown parser engine {engine}, expected one of {PARSER_ENGINES}')
+
+    if engine == 'pyarrow':
+        from pyarrow import csv as pa_csv   # optional dependency, only needed for this engine
+
+        raw = open_byte_stream(chunks)
+        read_options = pa_csv.ReadOptions(encoding=sniff_encoding(raw.peek(4)[:4]))
+        parse_options = pa_csv.ParseOptions(delimiter='\t', quote_char=False)
+
+        return pa_csv.read_csv(raw, read_options=read_options, parse_options=parse_options).to_pandas()
+
+    with open_text_stream(chunks) as text:
+        if schema_key is not None:
+            return get_schema_cache().read(text, schema_key, READ_OPTIONS[engine])
+
+        return pd.read_csv(text, delimiter='\t', quoting=csv.QUOTE_NONE, **READ_OPTIONS[engine])
+
+
+def csv_batches(df: pd.DataFrame, batch_rows: int, header: bool = True):
+    """Serialises a dataframe as tab delimited utf-8 text, batch_rows at a time
+    The batches joined together are identical to df.to_csv(index=False, sep='\\t')
+
+    :param df: dataframe to serialise
+    :param batch_rows: rows per batch
+    :param header: False to leave out the header, e.g. when appending to another file's rows
+    :return: generator of bytes, the first batch includes the header
+    """
+    for start in range(0, max(len(df), 1), batch_rows):
+        batch = df.iloc[start:start + batch_rows]
+        yield batch.to_csv(index=False, sep='\t', header=header and start == 0).encode('utf-8')
+
+
+def parquet_batches(df: pd.DataFrame, batch_rows: int, compression: str = 'snappy'):
+    """Encodes a dataframe as parquet, one row group of batch_rows at a time
+    Strings are dictionary encoded, so the filename column costs next to nothing.
+
+    :param df: dataframe to encode, column names are written as strings
+    :param batch_rows: rows per row group
+    :param compression: one of PARQUET_COMPRESSION
+    :return: generator of bytes, the last one holds the footer
+    """
+    import pyarrow as pa                # optional dependency, only needed for parquet output
+    import pyarrow.parquet as pq
+
+    if compression not in PARQUET_COMPRESSION:
+        raise ValueError(f'Unknown parquet compression {compression}, expected one of {PARQUET_COMPRESSION}')
+
+    # parquet needs string column names, the transforms number the columns
+    df = df.set_axis([str(column) for column in df.columns], axis=1)
+
+    # one schema from the whole frame, a batch on its own could infer different types
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    sink = ChunkSink()
+
+    with pq.ParquetWriter(sink, schema, compression=compression, use_dictionary=True) as writer:
+        for start in range(0, max(len(df), 1), batch_rows):
+            batch = pa.Table.from_pandas(df.iloc[start:start + batch_rows], schema=schema, preserve_index=False)
+            writer.write_table(batch, row_group_size=batch_rows)
+
+            chunk = sink.take()
+            if chunk:
+                yield chunk
+
+    yield sink.take()
+
+
+def output_file_name(filename: str, output_format: str) -> str:
+    """swaps the extension for parquet output, csv names are left as they are
+
+    :param filename: source file name, e.g. 'PBI-Redwater TAR 2020-IW38_20200624.csv'
+    :param output_format: one of OUTPUT_FORMATS
+    :return: sink file name
+    """
+    if output_format == 'csv':
+        return filename
+
+    stem, dot, extension = filename.rpartition('.')
+
+    return (stem if dot and '/' not in extension else filename) + '.' + output_format
+
+
+def make_block_id(block_prefix: str, idx: int) -> str:
+    """block ids must be base64 and the same length for every block in a blob
+
+    :param block_prefix: unique prefix for one upload
+    :param idx: position of the block
+    :return: block id
+    """
+    return base64.b64encode(f'{block_prefix}-{idx:08d}'.encode()).decode()
+
+
+def _serialised(batches, timer):
+    """meters the time spent producing each block when a stage timer is given"""
+    return timer.meter(batches, 'serialise') if timer else batches
+
+
+def _upload_blocks(backend: StorageBackend, container: str, blob: str, chunks):
+    """Stages each chunk as a block then commits them all as the blob contents
+
+    One block uploads in the background while the caller produces the next chunk,
+    so at most two chunks are held in memory.
+
+    :param backend: storage backend of the destination
+    :param container: destination container
+    :param blob: full destination blob name
+    :param chunks: iterable of bytes, one block each
+    :return: number of blocks committed
+    """
+    block_prefix = uuid.uuid4().hex     # uncommitted blocks from another writer can't clash
+    block_ids = _stage_blocks(backend, container, blob, chunks, block_prefix)
+
+    # replaces any existing blob in one request
+    backend.commit_blocks(container, blob, block_ids)
+
+    return len(block_ids)
+
+
+def _stage_blocks(backend: StorageBackend, container: str, blob: str, chunks, block_prefix: str,
+                  first_idx: int = 0) -> list:
+    """Stages each chunk as a block, one uploading while the caller produces the next
+
+    :param backend: storage backend of the destination
+    :param container: destination container
+    :param blob: full destination blob name
+    :param chunks: iterable of bytes, one block each
+    :param block_prefix: unique prefix of the blob's block ids
+    :param first_idx: position of the first block, to append to blocks staged earlier
+    :return: list of the staged block ids, in order
+    """
+    block_ids = []
+    in_flight = None
+
+    with ThreadPoolExecutor(max_workers=1) as uploader:
+        for idx, chunk in enumerate(chunks, start=first_idx):
+            block_id = make_block_id(block_prefix, idx)
+
+            if in_flight:
+                in_flight.result()
+
+            in_flight = uploader.submit(backend.stage_block, container, blob, block_id, chunk)
+            block_ids.append(block_id)
+
+        if in_flight:
+            in_flight.result()
 
-        return BlobClient.from_connection_string(conn_str=self._connection_string,
-                                                 container_name=self._container,
-                                                 blob_name=file_to_open)
+    return block_ids
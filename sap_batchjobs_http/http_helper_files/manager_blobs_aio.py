@@ -0,0 +1,336 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Async version of manager_blobs, built on azure.storage.blob.aio.
+# Network calls run on the event loop so one function instance can
+# keep many downloads and uploads in flight.  Parsing and csv
+# serialisation are CPU work, they run in the default executor and
+# are fed from / overlap with the network transfers.
+# Changes:
+# Oct 18, 2026 - pooled service clients are closed at the end of an async run
+# Oct 18, 2026 - zip archives are read one member at a time, as in the sync handler
+# Oct 18, 2026 - an empty path is the container root, as in the sync handler
+# ---------------------------------------------------------------
+
+import uuid
+import queue
+import zipfile
+import posixpath
+import functools
+import asyncio
+import logging
+import fnmatch
+import weakref
+import pandas as pd
+from azure.storage.blob import BlobBlock
+from azure.storage.blob.aio import BlobPrefix
+from azure.storage.blob.aio import BlobClient, BlobServiceClient
+
+try:  # if on azure
+    from .manager_blobs import read_tab_delimited, read_csv_chunks, csv_batches, parquet_batches, make_block_id, \
+        listing_prefix, CSV_BATCH_ROWS, OUTPUT_FORMATS
+    from .blob_streams import decompress_chunks, detect_compression, strip_compression_extension, spool_chunks, \
+        zip_member_chunks
+    from .schema_cache import SchemaMismatchError
+except ModuleNotFoundError:  # if local
+    from sap_batchjobs_http.http_helper_files.manager_blobs import read_tab_delimited, read_csv_chunks, \
+        csv_batches, parquet_batches, make_block_id, listing_prefix, CSV_BATCH_ROWS, OUTPUT_FORMATS
+    from sap_batchjobs_http.http_helper_files.blob_streams import decompress_chunks, detect_compression, \
+        strip_compression_extension, spool_chunks, zip_member_chunks
+    from sap_batchjobs_http.http_helper_files.schema_cache import SchemaMismatchError
+
+# chunks buffered between the download and the parser thread
+QUEUE_CHUNKS = 4
+
+# aio clients belong to the event loop that created them, so pool per loop
+_service_pool = weakref.WeakKeyDictionary()
+
+
+class AsyncBlobHandler:
+
+    def __init__(self, connection_string: str, container: str, path: str = ''):
+        """Sets up connection to container,and specific path in container
+           Each AsyncBlobHandler object is for one container/path combination
+
+        :param connection_string: azure connection string
+        :param container: container to connect to
+        :param path: path within container, can be null and set dynamically, no filename in path
+        """
+        self._connection_string = connection_string
+        self._container = container
+        self.path = path    # can be set dynamically after object creation
+
+    async def read_blob_csv_to_df(self, filename: str, engine: str = 'c', schema_key: str = None,
+                                  first_download=None):
+        """ Downloads a blob and parses it, the parser runs in a thread fed by the download
+        Gzipped files are inflated in the same thread, zip archives go through read_blob_files_to_df.
+
+        :param filename: full file name without path or container
+        :param engine: parser engine, see manager_blobs.PARSER_ENGINES
+        :param schema_key: transaction of the file to use the schema cache for, None to infer dtypes
+        :param first_download: optional list holding an async iterator of the blob's chunks already downloading,
+                               used for the first read, a retry downloads again
+        :return: contents of file
+        """
+        blob_client = self._create_client(filename)
+
+        async def download():
+            if first_download:
+                return first_download.pop()
+            return (await blob_client.download_blob()).chunks()
+
+        def parse(chunks, parse_engine, parse_schema_key=schema_key):
+            return read_tab_delimited(decompress_chunks(chunks, filename), parse_engine, parse_schema_key)
+
+        try:
+            df = await _consume_in_thread(await download(), lambda chunks: parse(chunks, engine))
+
+        except SchemaMismatchError as e:
+            # the entry is dropped, read again to learn new dtypes from this file
+            logging.warning(f'{filename}: {e}')
+            df = await _consume_in_thread(await download(), lambda chunks: parse(chunks, engine))
+
+        except (pd.errors.ParserError, UnicodeError) as e:
+            if engine == 'python':
+                raise
+
+            logging.warning(f'{engine} engine could not parse {filename}, using python engine: {e}')
+            df = await _consume_in_thread(await download(), lambda chunks: parse(chunks, 'python'))
+
+        logging.info(f'Read file {filename} of size {len(df)}')
+
+        return df
+
+    async def read_blob_files_to_df(self, filename: str, engine: str = 'c', schema_key=None):
+        """ Async version of BlobHandler.read_blob_files, with each logical file parsed
+        A plain or gzipped blob is one file, parsed as it downloads.  A zip archive is spooled
+        (memory, then local disk) as zip needs random access, then each member is parsed in a thread.
+
+        :param filename: full file name without path or container
+        :param engine: parser engine, see manager_blobs.PARSER_ENGINES
+        :param schema_key: optional callable giving the schema cache key of a logical file from its name
+        :return: async generator of (name, dataframe), name has any compression extension removed
+        """
+        chunks = (await self._create_client(filename).download_blob()).chunks()
+        prefix = await _first_chunk(chunks)
+        compression = detect_compression(filename, prefix)
+
+        if compression != 'zip':
+            name = strip_compression_extension(filename)
+            df = await self.read_blob_csv_to_df(filename, engine, schema_key(name) if schema_key else None,
+                                                [_prepend(prefix, chunks)])
+            yield name, df
+            return
+
+        loop = asyncio.get_running_loop()
+        spool = await _consume_in_thread(_prepend(prefix, chunks), spool_chunks)
+
+        with spool, zipfile.ZipFile(spool) as archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+
+                name = posixpath.basename(member.filename)
+                df = await loop.run_in_executor(None, read_csv_chunks,
+                                                functools.partial(zip_member_chunks, archive, member), name, engine,
+                                                schema_key(name) if schema_key else None)
+                yield name, df
+
+    async def write_csv_to_blob(self, df, filename: str, batch_rows: int = CSV_BATCH_ROWS):
+        """writes a tab-delimited file to container and path as staged blocks
+        The next batch is serialised in a thread while the current block uploads.
+
+        :param df: pandas dataframe to write to file
+        :param filename:
+        :param batch_rows: rows per staged block
+        :return:
+        """
+        await self._upload_batches(filename, csv_batches(df, batch_rows))
+
+    async def write_parquet_to_blob(self, df, filename: str, compression: str = 'snappy',
+                                    batch_rows: int = CSV_BATCH_ROWS):
+        """writes a parquet file to container and path, one staged block per row group
+
+        :param df: pandas dataframe to write to file
+        :param filename:
+        :param compression: parquet compression, see manager_blobs.PARQUET_COMPRESSION
+        :param batch_rows: rows per row group
+        :return:
+        """
+        await self._upload_batches(filename, parquet_batches(df, batch_rows, compression))
+
+    async def write_df_to_blob(self, df, filename: str, output_format: str = 'csv', compression: str = 'snappy'):
+        """writes a dataframe in the chosen output format
+
+        :param df: pandas dataframe to write to file
+        :param filename: full file name, see manager_blobs.output_file_name for the extension
+        :param output_format: one of OUTPUT_FORMATS
+        :param compression: parquet compression, ignored for csv
+        :return:
+        """
+        if output_format == 'csv':
+            await self.write_csv_to_blob(df, filename)
+        elif output_format == 'parquet':
+            await self.write_parquet_to_blob(df, filename, compression)
+        else:
+            raise ValueError(f'Unknown output format {output_format}, expected one of {OUTPUT_FORMATS}')
+
+    async def _upload_batches(self, filename: str, batches):
+        """stages each batch as a block, producing the next one in a thread while the current uploads
+
+        :param filename:
+        :param batches: generator of bytes, one block each
+        :return:
+        """
+        blob_client = self._create_client(filename)
+        loop = asyncio.get_running_loop()
+
+        block_prefix = uuid.uuid4().hex
+        block_list = []
+        in_flight = None
+
+        while True:
+            chunk = await loop.run_in_executor(None, next, batches, None)
+
+            if in_flight:
+                await in_flight
+
+            if chunk is None:
+                break
+
+            block_id = make_block_id(block_prefix, len(block_list))
+            in_flight = asyncio.ensure_future(blob_client.stage_block(block_id, chunk))
+            block_list.append(BlobBlock(block_id=block_id))
+
+        # replaces any existing blob in one request
+        await blob_client.commit_block_list(block_list)
+
+    async def delete_blob_file(self, filename: str):
+        """Deletes a blob
+
+        :param filename:
+        :return: None
+        """
+        blob_client = self._create_client(filename)
+        await blob_client.delete_blob(delete_snapshots=False)
+
+    def get_blob_list(self):
+        """Returns blobs in object's container
+
+        :return: async iterator of blobs, use with async for
+        """
+        client = self._create_service().get_container_client(self._container)
+
+        return client.list_blobs(name_starts_with=self.path)
+
+    async def walk_blob_pages(self, pattern: str = '*', page_size: int = None, continuation_token: str = None):
+        """Async version of BlobHandler.walk_blob_pages
+
+        :return: async generator of (list of matching blobs, token of the next page or None after the last page)
+        """
+        prefix, name_start = listing_prefix(self.path, pattern)
+        client = self._create_service().get_container_client(self._container)
+        pages = client.walk_blobs(name_starts_with=prefix, delimiter='/', results_per_page=page_size) \
+            .by_page(continuation_token=continuation_token)
+
+        async for page in pages:
+            blobs = [blob async for blob in page
+                     if not isinstance(blob, BlobPrefix) and fnmatch.fnmatchcase(blob['name'][name_start:], pattern)]
+
+            yield blobs, pages.continuation_token or None     # an empty marker after the last page
+
+    def _create_service(self) -> BlobServiceClient:
+        """Returns the shared aio service client for this connection string and event loop
+
+        :return: BlobServiceClient
+        """
+        clients = _service_pool.setdefault(asyncio.get_running_loop(), {})
+
+        if self._connection_string not in clients:
+            clients[self._connection_string] = BlobServiceClient.from_connection_string(
+                conn_str=self._connection_string)
+
+        return clients[self._connection_string]
+
+    def _create_client(self, filename: str) -> BlobClient:
+        """Creates blob client object
+
+        :param filename: name of file to open
+        :return: blob client object
+        """
+        # ensure last character on path is '/' to allow for filename appending
+        if self.path and self.path[-1] != '/':
+            self.path = self.path + '/'
+
+        return self._create_service().get_blob_client(container=self._container,
+                                                      blob=self.path + filename)
+
+
+async def close_service_clients():
+    """Closes the pooled service clients of the running event loop
+    Call at the end of an async run, before its loop is closed, or their aiohttp sessions are left open.
+
+    :return: None
+    """
+    clients = _service_pool.pop(asyncio.get_running_loop(), {})
+
+    for client in clients.values():
+        await client.close()
+
+
+async def _first_chunk(chunks) -> bytes:
+    """:return: the first chunk of an async chunk iterator, empty for an empty blob"""
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return b''
+
+
+async def _prepend(prefix: bytes, chunks):
+    """async chunk iterator with a chunk already taken from it put back in front"""
+    if prefix:
+        yield prefix
+
+    async for chunk in chunks:
+        yield chunk
+
+
+async def _consume_in_thread(chunks, consume):
+    """Runs a blocking consumer of byte chunks in a thread while the download streams in
+    At most QUEUE_CHUNKS chunks wait between the two, so memory stays bounded.
+
+    :param chunks: async iterator of the download's byte chunks, e.g. StorageStreamDownloader.chunks()
+    :param consume: callable taking an iterator of byte chunks, e.g. read_tab_delimited
+    :return: whatever consume returns
+    """
+    loop = asyncio.get_running_loop()
+    chunk_queue = queue.Queue()
+    free_slots = asyncio.Semaphore(QUEUE_CHUNKS)
+    finished = object()
+
+    def queued_chunks():
+        while True:
+            chunk = chunk_queue.get()
+            loop.call_soon_threadsafe(free_slots.release)
+            if chunk is finished:
+                return
+            yield chunk
+
+    consumer = loop.run_in_executor(None, consume, queued_chunks())
+
+    try:
+        async for chunk in chunks:
+            # wait for room in the queue, or stop if the consumer already failed
+            slot = asyncio.ensure_future(free_slots.acquire())
+            await asyncio.wait({slot, consumer}, return_when=asyncio.FIRST_COMPLETED)
+
+            if consumer.done():
+                slot.cancel()
+                break
+
+            chunk_queue.put(chunk)
+    finally:
+        chunk_queue.put(finished)
+
+    return await consumer
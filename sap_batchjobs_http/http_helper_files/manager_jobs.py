@@ -0,0 +1,304 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Manages background jobs started by the http trigger in job mode.
+# The trigger returns 202 with a job id straight away, the batch
+# runs in a background thread and ADF polls the status until the
+# job finishes.  The thread is best effort, nothing restarts a job
+# whose worker is recycled.  Job state lives in a JobStore: a json
+# blob per job in azure, or a dict in memory locally and in tests.
+# Changes:
+# Oct 18, 2026 - listing checkpoints kept in the job store, so a retried run
+#                continues the source listing at the page where it stopped
+# Oct 18, 2026 - listing checkpoints have a store of their own, under listings/, so
+#                the status endpoint can't return one as a job
+# ---------------------------------------------------------------
+
+import json
+import uuid
+import hashlib
+import time
+import logging
+import datetime
+import threading
+
+# import our own modules.
+try:  # if on azure
+    from .. import azure_config
+    from .storage_backends import BlobNotFoundError
+except ModuleNotFoundError:  # if local
+    from sap_batchjobs_http import azure_config
+    from sap_batchjobs_http.http_helper_files.storage_backends import BlobNotFoundError
+
+JOBS_PATH = 'jobs/'
+CHECKPOINTS_PATH = 'listings/'
+
+_job_store = None
+_checkpoint_store = None
+_job_store_lock = threading.Lock()
+
+
+class JobStore:
+    """Where job state is kept, subclasses implement save and load"""
+
+    def save(self, job: dict):
+        raise NotImplementedError
+
+    def load(self, job_id: str):
+        """:return: job dict, or None if there is no such job"""
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    """Keeps jobs in a dict, only visible to this worker process"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: dict):
+        with self._lock:
+            self._jobs[job['job_id']] = json.dumps(job)   # stored as json so callers can't share state
+
+    def load(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+        return json.loads(job) if job else None
+
+
+class BlobJobStore(JobStore):
+    """Keeps each job as a json blob, visible to every instance of the function app"""
+
+    def __init__(self, connection_string: str, container: str, path: str = JOBS_PATH):
+        """
+        :param connection_string: azure connection string
+        :param container: container for the job files
+        :param path: folder of the files in the container, JOBS_PATH or CHECKPOINTS_PATH
+        """
+        try:  # blob sdk is only loaded when jobs are stored in azure
+            from .manager_blobs import BlobHandler
+        except ModuleNotFoundError:
+            from sap_batchjobs_http.http_helper_files.manager_blobs import BlobHandler
+
+        self._blob = BlobHandler(connection_string, container, path)
+
+    def save(self, job: dict):
+        self._blob.write_bytes_to_blob(json.dumps(job).encode('utf-8'), job['job_id'] + '.json')
+
+    def load(self, job_id: str):
+        try:
+            return json.loads(self._blob.read_blob_bytes(job_id + '.json'))
+        except BlobNotFoundError:
+            return None
+
+
+class JobTracker:
+
+    def __init__(self, store: JobStore, request: dict, save_interval: float = 5.0):
+        """Tracks one background job and saves its progress to the store
+
+        :param store: JobStore to save to
+        :param request: request parameters, kept with the job for reference
+        :param save_interval: min seconds between progress saves, the final state is always saved
+        """
+        self._store = store
+        self._save_interval = save_interval
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+
+        self.job = {'job_id': uuid.uuid4().hex,
+                    'status': 'queued',
+                    'created': _now(),
+                    'started': None,
+                    'finished': None,
+                    'request': request,
+                    'files_done': 0,
+                    'files_failed': 0,
+                    'files': [],
+                    'results': None,
+                    'error': None}
+
+        self._save(force=True)
+
+    @property
+    def job_id(self) -> str:
+        return self.job['job_id']
+
+    def start(self):
+        with self._lock:
+            self.job.update(status='running', started=_now())
+            self._save(force=True)
+
+    def file_done(self, result: dict):
+        """per file progress, passed as options.on_file_done so it is called from worker threads
+
+        :param result: per-file result from batch_runner
+        :return: None
+        """
+        with self._lock:
+            self.job['files'].append(result)
+            self.job['files_done'] += 1
+            if result['status'] == 'failed':
+                self.job['files_failed'] += 1
+            self._save()
+
+    def finish(self, results: dict):
+        with self._lock:
+            self.job.update(status='succeeded', finished=_now(), results=results)
+            self._save(force=True)
+
+    def fail(self, error: Exception):
+        with self._lock:
+            self.job.update(status='failed', finished=_now(), error=f'{type(error).__name__}: {error}')
+            self._save(force=True)
+
+    def _save(self, force: bool = False):
+        """saves the job, at most every save_interval seconds unless forced. Caller holds the lock"""
+        if not force and time.monotonic() - self._last_save < self._save_interval:
+            return
+
+        try:
+            self._store.save(self.job)
+            self._last_save = time.monotonic()
+        except Exception:  # progress is best effort, the batch carries on
+            logging.exception(f'Could not save job {self.job_id}')
+
+
+class ListingCheckpoint:
+
+    def __init__(self, store: JobStore, pipeline_run_id: str, *scope):
+        """Continuation token of a paged source listing, saved after each page so a retry of
+        the same pipeline run resumes at the first page that did not finish
+
+        :param store: JobStore to keep the checkpoint in, see get_checkpoint_store
+        :param pipeline_run_id: ADF run id, a retry passes the same one
+        :param scope: what else identifies the listing, e.g. datatype, container, path and shard
+        """
+        key = '|'.join(str(part) for part in (pipeline_run_id,) + scope)
+
+        self._store = store
+        self.checkpoint_id = 'listing-' + hashlib.md5(key.encode('utf-8')).hexdigest()
+        self.pipeline_run_id = pipeline_run_id
+
+        try:
+            saved = store.load(self.checkpoint_id) or {}
+        except Exception:  # a missing checkpoint only costs a full listing
+            logging.exception(f'Could not load listing checkpoint {self.checkpoint_id}')
+            saved = {}
+
+        # a finished listing has no token, a retry after it starts from the top to pick up failed files
+        self.continuation_token = saved.get('continuation_token')
+        self.resumed_pages = saved.get('pages_done', 0) if self.continuation_token else 0
+        self.pages_done = self.resumed_pages
+
+    def page_done(self, next_token: str):
+        """records that every file of a page has been processed
+
+        :param next_token: token of the next page, None when the listing is complete
+        :return: None
+        """
+        self.continuation_token = next_token
+        self.pages_done += 1
+        self._save()
+
+    def finish(self):
+        """records that the listing is complete, needed when a resumed walk finds no pages left
+
+        :return: None
+        """
+        if self.continuation_token is not None:
+            self.continuation_token = None
+            self._save()
+
+    def to_dict(self) -> dict:
+        """for the json response"""
+        return {'resumed_pages': self.resumed_pages,
+                'pages_done': self.pages_done,
+                'complete': self.continuation_token is None}
+
+    def _save(self):
+        try:
+            self._store.save({'job_id': self.checkpoint_id,
+                              'pipeline_run_id': self.pipeline_run_id,
+                              'continuation_token': self.continuation_token,
+                              'pages_done': self.pages_done,
+                              'updated': _now()})
+        except Exception:  # the run carries on, a retry would just list more
+            logging.exception(f'Could not save listing checkpoint {self.checkpoint_id}')
+
+
+def get_job_store() -> JobStore:
+    """Returns the job store for this worker, created on first use
+    Jobs go to blob storage when PRIMARYSTORAGE_JOBS_CONTAINER is set, otherwise memory.
+
+    :return: JobStore
+    """
+    global _job_store
+
+    with _job_store_lock:
+        if _job_store is None:
+            _job_store = _new_store(JOBS_PATH, 'job status is')
+
+    return _job_store
+
+
+def get_checkpoint_store() -> JobStore:
+    """Returns the store of listing checkpoints for this worker, created on first use
+    Kept apart from the jobs, in the same container under CHECKPOINTS_PATH, so a checkpoint
+    is never answered as a job status.
+
+    :return: JobStore
+    """
+    global _checkpoint_store
+
+    with _job_store_lock:
+        if _checkpoint_store is None:
+            _checkpoint_store = _new_store(CHECKPOINTS_PATH, 'listing checkpoints are')
+
+    return _checkpoint_store
+
+
+def set_job_store(store: JobStore):
+    """Replaces the job store, e.g. with a MemoryJobStore for local runs and tests
+
+    :param store: JobStore to use from now on
+    :return: None
+    """
+    global _job_store
+
+    with _job_store_lock:
+        _job_store = store
+
+
+def set_checkpoint_store(store: JobStore):
+    """Replaces the listing checkpoint store, e.g. with a MemoryJobStore for local runs and tests
+
+    :param store: JobStore to use from now on
+    :return: None
+    """
+    global _checkpoint_store
+
+    with _job_store_lock:
+        _checkpoint_store = store
+
+
+def _new_store(path: str, kept: str) -> JobStore:
+    """blob store under path when PRIMARYSTORAGE_JOBS_CONTAINER is set, otherwise memory
+
+    :param path: folder in the jobs container
+    :param kept: what the store holds, for the warning
+    :return: JobStore
+    """
+    config = azure_config.DefaultConfig()
+
+    if config.PS_JOBS_CONTAINER:
+        return BlobJobStore(config.PS_CONNECTION, config.PS_JOBS_CONTAINER, path)
+
+    logging.warning(f'PRIMARYSTORAGE_JOBS_CONTAINER not set, {kept} only kept in memory')
+    return MemoryJobStore()
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
@@ -0,0 +1,206 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Ledger of files already processed, so a re-run SAP job or an ADF
+# retry that drops the same extract again is skipped without being
+# downloaded.  A file is known by its name plus its content: the
+# MD5 from the listing when the blob has one, otherwise the etag.
+# Both come with the listing, so checking costs no download.  Like
+# the job store, the ledger is a json blob per entry in azure, or a
+# dict in memory locally and in tests.
+# Changes:
+# Oct 18, 2026 - the cost of a blob read per listed file is documented on Ledger.partition
+# ---------------------------------------------------------------
+
+import json
+import hashlib
+import logging
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# import our own modules.
+try:  # if on azure
+    from .. import azure_config
+    from .storage_backends import BlobNotFoundError
+except ModuleNotFoundError:  # if local
+    from sap_batchjobs_http import azure_config
+    from sap_batchjobs_http.http_helper_files.storage_backends import BlobNotFoundError
+
+LEDGER_PATH = 'ledger/'
+LOOKUP_WORKERS = 16     # ledger reads of a page in parallel, each is a small blob read in azure
+
+_ledger_store = None
+_ledger_store_lock = threading.Lock()
+
+
+class LedgerStore:
+    """Where ledger entries are kept, subclasses implement save and load"""
+
+    def save(self, entry_id: str, entry: dict):
+        raise NotImplementedError
+
+    def load(self, entry_id: str):
+        """:return: entry dict, or None if there is no such entry"""
+        raise NotImplementedError
+
+
+class MemoryLedgerStore(LedgerStore):
+    """Keeps entries in a dict, only visible to this worker process"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def save(self, entry_id: str, entry: dict):
+        with self._lock:
+            self._entries[entry_id] = json.dumps(entry)
+
+    def load(self, entry_id: str):
+        with self._lock:
+            entry = self._entries.get(entry_id)
+
+        return json.loads(entry) if entry else None
+
+
+class BlobLedgerStore(LedgerStore):
+    """Keeps each entry as a json blob, shared by every instance of the function app"""
+
+    def __init__(self, connection_string: str, container: str):
+        """
+        :param connection_string: azure connection string
+        :param container: container for the ledger, under LEDGER_PATH
+        """
+        try:  # blob sdk is only loaded when the ledger is stored in azure
+            from .manager_blobs import BlobHandler
+        except ModuleNotFoundError:
+            from sap_batchjobs_http.http_helper_files.manager_blobs import BlobHandler
+
+        self._blob = BlobHandler(connection_string, container, LEDGER_PATH)
+
+    def save(self, entry_id: str, entry: dict):
+        self._blob.write_bytes_to_blob(json.dumps(entry).encode('utf-8'), entry_id + '.json')
+
+    def load(self, entry_id: str):
+        try:
+            return json.loads(self._blob.read_blob_bytes(entry_id + '.json'))
+        except BlobNotFoundError:
+            return None
+
+
+class Ledger:
+
+    def __init__(self, store: LedgerStore, pipeline_run_id: str, *scope):
+        """Files processed for one source, looked up by name and content
+
+        :param store: LedgerStore for the entries
+        :param pipeline_run_id: ADF run doing the processing, kept with new entries for reference
+        :param scope: what else identifies the source, e.g. datatype and container
+        """
+        self._store = store
+        self.pipeline_run_id = pipeline_run_id
+        self._scope = '|'.join(str(part) for part in scope)
+
+    def partition(self, files: list):
+        """Splits listed files into those to process and those already processed with the same content
+        Costs one store read per file: with BlobLedgerStore a small blob GET, most of them 404s for
+        new files, LOOKUP_WORKERS at a time.  A page of 5000 files (the service default) is 5000
+        requests, about 313 rounds of 16, so the ledger adds seconds per page and a storage
+        transaction per file.  Entries are kept one per blob so that concurrent runs and instances
+        record files without a read-modify-write race on a shared blob; a single blob per scope
+        would need etag-conditioned writes and retries to be safe.  Use dedup only where re-drops
+        are common enough to be worth it.
+
+        :param files: blob properties items from the listing
+        :return: list of files to process, list of (file, ledger entry) already processed
+        """
+        if not files:
+            return [], []
+
+        with ThreadPoolExecutor(max_workers=min(LOOKUP_WORKERS, len(files))) as executor:
+            entries = list(executor.map(self._lookup, files))
+
+        todo = [file for file, entry in zip(files, entries) if entry is None]
+        done = [(file, entry) for file, entry in zip(files, entries) if entry is not None]
+
+        return todo, done
+
+    def record(self, file):
+        """adds a processed file to the ledger
+
+        :param file: blob properties item from the listing
+        :return: None
+        """
+        try:
+            self._store.save(self._entry_id(file), {'name': file['name'],
+                                                    'content': content_key(file),
+                                                    'size': file['size'],
+                                                    'pipeline_run_id': self.pipeline_run_id,
+                                                    'processed': _now()})
+        except Exception:  # the file is done, at worst it is processed again next time
+            logging.exception(f'Could not add {file["name"]} to the ledger')
+
+    def _lookup(self, file):
+        try:
+            return self._store.load(self._entry_id(file))
+        except Exception:  # when in doubt, process the file
+            logging.exception(f'Could not check the ledger for {file["name"]}')
+            return None
+
+    def _entry_id(self, file) -> str:
+        key = f'{self._scope}|{file["name"]}|{content_key(file)}'
+
+        return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+
+def content_key(file) -> str:
+    """what identifies the content of a listed blob
+
+    :param file: blob properties item from the listing
+    :return: 'md5:<hex>' if the service has the content MD5, otherwise 'etag:<etag>'
+    """
+    content_settings = file.get('content_settings')
+    md5 = content_settings.get('content_md5') if content_settings else None
+
+    if md5:
+        return 'md5:' + bytes(md5).hex()
+
+    return 'etag:' + str(file['etag']).strip('"')
+
+
+def get_ledger_store() -> LedgerStore:
+    """Returns the ledger store for this worker, created on first use
+    Entries go to blob storage when PRIMARYSTORAGE_LEDGER_CONTAINER is set, otherwise memory.
+
+    :return: LedgerStore
+    """
+    global _ledger_store
+
+    with _ledger_store_lock:
+        if _ledger_store is None:
+            config = azure_config.DefaultConfig()
+
+            if config.PS_LEDGER_CONTAINER:
+                _ledger_store = BlobLedgerStore(config.PS_CONNECTION, config.PS_LEDGER_CONTAINER)
+            else:
+                logging.warning('PRIMARYSTORAGE_LEDGER_CONTAINER not set, the ledger is only kept in memory')
+                _ledger_store = MemoryLedgerStore()
+
+    return _ledger_store
+
+
+def set_ledger_store(store: LedgerStore):
+    """Replaces the ledger store, e.g. with a MemoryLedgerStore for local runs and tests
+
+    :param store: LedgerStore to use from now on
+    :return: None
+    """
+    global _ledger_store
+
+    with _ledger_store_lock:
+        _ledger_store = store
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
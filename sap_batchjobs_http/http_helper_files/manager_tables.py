@@ -4,32 +4,169 @@
 # date: June 4, 2020
 # Manages all table read, writes, and deletes.
 # Changes:
+# Oct 18, 2026 - writes and deletes are queued and sent as TableBatch commits of
+#                up to 100 entities per partition by a background thread
 # ---------------------------------------------------------------
-import uuid
 import logging
+import threading
 from azure.cosmosdb.table.tableservice import TableService, TableBatch
 from azure.cosmosdb.table.models import EntityProperty, EdmType
 
+BATCH_SIZE = 100        # max operations in one TableBatch, all in the same partition
+FLUSH_INTERVAL = 5.0    # seconds between background flushes of partly filled batches
+
 
 class TableHandler:
 
-    def __init__(self, connection_string, table):
+    def __init__(self, connection_string, table, flush_interval: float = FLUSH_INTERVAL):
+        """Reads and batched writes for one table
+        write_data and delete_data only queue the operation, a background thread commits a
+        partition's operations as soon as there are BATCH_SIZE of them, and everything else
+        every flush_interval seconds.  Call flush before relying on the writes, e.g. at the
+        end of a run.
+
+        :param connection_string: azure storage connection string
+        :param table: table name
+        :param flush_interval: max seconds an operation waits in the queue
+        """
         self.connection_string = connection_string
         self.table = table
+        self.failed = 0     # operations in batches the service rejected
+
+        self._service = TableService(connection_string=connection_string)
+        self._flush_interval = flush_interval
+        self._pending = {}                      # PartitionKey: {RowKey: (operation, entity)}
+        self._pending_lock = threading.Condition()
+        self._commit_lock = threading.Lock()    # one commit at a time keeps the operations of a row in order
+        self._flusher = None
+        self._closed = False
+
+    def create_table(self):
+        """creates the table if it does not exist yet"""
+        self._service.create_table(self.table, fail_on_exist=False)
+
+    def get_data(self, query=None, select: list = None) -> list:
+        """Returns the entities matching a query, after sending any queued writes
+
+        :param query: dict of property to value that must all match, or an OData filter string
+        :param select: property names to return, all if None
+        :return: list of entities
+        """
+        self.flush()
+
+        return list(self._service.query_entities(self.table, filter=_odata_filter(query),
+                                                 select=','.join(select) if select else None))
+
+    def write_data(self, entity: dict):
+        """queues an insert or replace of an entity
+
+        :param entity: dict with PartitionKey, RowKey and properties, None values are left out
+        :return: None
+        """
+        self._queue('upsert', {name: _property(value) for name, value in entity.items() if value is not None})
+
+    def delete_data(self, entity: dict):
+        """queues a delete, the entity must exist or its whole batch is rejected
+
+        :param entity: dict with at least PartitionKey and RowKey
+        :return: None
+        """
+        self._queue('delete', {'PartitionKey': entity['PartitionKey'], 'RowKey': entity['RowKey']})
+
+    def flush(self):
+        """commits every queued operation now, on the calling thread
+
+        :return: None
+        """
+        with self._commit_lock:
+            self._commit(self._take())
+
+    def close(self):
+        """stops the background thread and commits what is left
+
+        :return: None
+        """
+        with self._pending_lock:
+            self._closed = True
+            self._pending_lock.notify()
+
+        if self._flusher:
+            self._flusher.join()
+
+        self.flush()
+
+    def _queue(self, operation: str, entity: dict):
+        with self._pending_lock:
+            rows = self._pending.setdefault(entity['PartitionKey'], {})
+            rows[entity['RowKey']] = (operation, entity)    # a row can only be in a batch once, the last one wins
+
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_forever, name=f'table-{self.table}', daemon=True)
+                self._flusher.start()
+
+            if len(rows) >= BATCH_SIZE:
+                self._pending_lock.notify()
+
+    def _flush_forever(self):
+        """background thread, wakes for a full batch or every flush_interval"""
+        while True:
+            with self._pending_lock:
+                self._pending_lock.wait_for(lambda: self._closed or self._has_full_batch(), self._flush_interval)
+
+                if self._closed:
+                    return
+
+            self.flush()
+
+    def _has_full_batch(self) -> bool:
+        """caller holds the pending lock"""
+        return any(len(rows) >= BATCH_SIZE for rows in self._pending.values())
+
+    def _take(self) -> dict:
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+
+        return pending
+
+    def _commit(self, pending: dict):
+        """sends the operations of each partition in batches of up to BATCH_SIZE. Caller holds the commit lock"""
+        for partition, rows in pending.items():
+            operations = list(rows.values())
+
+            for start in range(0, len(operations), BATCH_SIZE):
+                batch = TableBatch()
+
+                for operation, entity in operations[start:start + BATCH_SIZE]:
+                    if operation == 'upsert':
+                        batch.insert_or_replace_entity(entity)
+                    else:
+                        batch.delete_entity(entity['PartitionKey'], entity['RowKey'])
+
+                try:
+                    self._service.commit_batch(self.table, batch)
+                except Exception:  # metadata is best effort, the run carries on
+                    self.failed += len(operations[start:start + BATCH_SIZE])
+                    logging.exception(f'Could not commit batch to table {self.table} for partition {partition}')
+
+
+def _property(value):
+    """ints are sent as 64 bit, the service would otherwise take them as 32 bit"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return EntityProperty(EdmType.INT64, value)
+
+    return value
+
+
+def _odata_filter(query):
+    """builds an OData filter from a dict of property to value, strings are quoted"""
+    if query is None or isinstance(query, str):
+        return query
+
+    def literal(value):
+        if isinstance(value, str):
+            return "'" + value.replace("'", "''") + "'"
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        return str(value)
 
-    def get_data(self, query):  # TODO: need to figure out what to pass here.  Dict?
-        contents = []
-        # open blob and write to local file
-        # read open file to object
-        # return contents
-        return contents
-
-    def write_data(self, filename):  # TODO: I think this should be a dict
-        # write blob to container and folder defined in the class
-        # return status
-        pass
-
-    def delete_data(self, filename):  # TODO: again, should be dict?
-        # delete blob in container and folder defined in the class
-        # return status
-        pass
+    return ' and '.join(f'{name} eq {literal(value)}' for name, value in query.items())
@@ -0,0 +1,124 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Memory budget for the files of a run.  Drops range from a few KB
+# to several hundred MB, so a fixed number of workers either leaves
+# the instance idle on small files or runs it out of memory when two
+# large ones are parsed at once.  Each file's memory is estimated
+# from its size in the listing, batch_runner admits files while
+# their estimates fit the budget, largest first with small files
+# filling the gaps.  The peak resident memory the worker actually
+# reached is reported with the estimates so the budget can be tuned.
+# Changes:
+# Oct 18, 2026 - the peak resident memory is sampled during the run, the kernel's peak is left alone
+# ---------------------------------------------------------------
+
+import logging
+import threading
+
+# memory per byte of source, measured on UTF-16 SAP extracts: the decoded text, the
+# dataframe and a csv batch being serialised are alive at the same time
+MEMORY_FACTOR = 3
+COMPRESSED_MEMORY_FACTOR = 20   # gzip and zip drops inflate ~5-10x before that
+MEMORY_OVERHEAD = 16 * 1024 * 1024  # per file, whatever its size: buffers, sdk clients, pandas internals
+RSS_SAMPLE_SECONDS = 0.5    # how often batch_runner samples resident memory while files run
+COMPRESSED_EXTENSIONS = ('.gz', '.gzip', '.zip')
+
+
+def estimate_memory(item) -> int:
+    """Bytes a work item is expected to need while it is processed
+
+    :param item: blob properties item from the listing, or a coalesced group with its files under 'group'
+    :return: estimated bytes, for a group that of its largest file as its files are read one at a time
+    """
+    return max(_file_memory(file) for file in item.get('group', [item]))
+
+
+class MemoryBudget:
+
+    def __init__(self, budget_mb: int):
+        """Tracks the estimated memory of the files being processed against a budget
+        Resident memory is sampled as files start, finish and run, to_dict reports the peak of
+        the samples.  It is read, never reset, as the kernel's peak belongs to the whole process.
+
+        :param budget_mb: MB the files of the run may use at once
+        """
+        self.budget = int(budget_mb) * 1024 * 1024
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.files = 0
+        self.over_budget = 0    # files bigger than the whole budget, run with nothing else
+        self.peak_rss = None
+        self._lock = threading.Lock()
+
+        self.sample_rss()
+
+    def admit(self, estimate: int, alone: bool) -> bool:
+        """Takes a file's estimate out of the budget if it fits
+
+        :param estimate: bytes from estimate_memory
+        :param alone: nothing else is running, a file is then admitted even if it is bigger than the budget
+        :return: True if the file may start
+        """
+        with self._lock:
+            if self.in_use + estimate > self.budget and not alone:
+                return False
+
+            if estimate > self.budget:
+                self.over_budget += 1
+                logging.warning(f'File estimated at {estimate / 2 ** 20:.0f} MB is over the memory budget of '
+                                f'{self.budget / 2 ** 20:.0f} MB, running it on its own')
+
+            self.in_use += estimate
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.files += 1
+
+        self.sample_rss()
+
+        return True
+
+    def release(self, estimate: int):
+        """gives a finished file's estimate back to the budget"""
+        self.sample_rss()
+
+        with self._lock:
+            self.in_use -= estimate
+
+    def sample_rss(self):
+        """records the current resident memory if it is the highest seen in this run"""
+        rss = _current_rss()
+
+        if rss is not None:
+            with self._lock:
+                self.peak_rss = max(self.peak_rss or 0, rss)
+
+    def to_dict(self) -> dict:
+        """budget, peak of the estimates and the peak resident memory sampled, in MB, for the response"""
+        self.sample_rss()
+
+        return {'budget_mb': round(self.budget / 2 ** 20),
+                'peak_estimate_mb': round(self.peak_in_use / 2 ** 20),
+                'peak_rss_mb': round(self.peak_rss / 2 ** 20) if self.peak_rss else None,
+                'files': self.files,
+                'over_budget': self.over_budget}
+
+
+def _file_memory(file) -> int:
+    name = file['name'].lower()
+    factor = COMPRESSED_MEMORY_FACTOR if name.endswith(COMPRESSED_EXTENSIONS) else MEMORY_FACTOR
+
+    return MEMORY_OVERHEAD + (file.get('size') or 0) * factor
+
+
+def _current_rss():
+    """:return: resident bytes of this process now, None if the platform doesn't say (linux only)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return None
@@ -8,18 +8,45 @@
 # Changes:
 # ---------------------------------------------------------------
 
+import logging
 
 # import our own modules.
 try:    # if on azure
-    from .manager_blobs import BlobHandler
+    from .manager_blobs import BlobHandler, output_file_name, read_csv_chunks
+    from .blob_streams import strip_compression_extension
+    from .batch_runner import run_listing, run_listing_async
+    from .run_options import RunOptions
+    from . import coalesce
+    from .source_cleanup import delete_source
+    from .schema_cache import transaction_key
+    from .stage_metrics import new_timer, log_stages, NULL_TIMER
     from .. import azure_config
 except ModuleNotFoundError:  # if local
-    from sap_batchjobs_http.http_helper_files.manager_blobs import BlobHandler
+    from sap_batchjobs_http.http_helper_files.manager_blobs import BlobHandler, output_file_name, read_csv_chunks
+    from sap_batchjobs_http.http_helper_files.blob_streams import strip_compression_extension
+    from sap_batchjobs_http.http_helper_files.batch_runner import run_listing, run_listing_async
+    from sap_batchjobs_http.http_helper_files.run_options import RunOptions
+    from sap_batchjobs_http.http_helper_files import coalesce
+    from sap_batchjobs_http.http_helper_files.source_cleanup import delete_source
+    from sap_batchjobs_http.http_helper_files.schema_cache import transaction_key
+    from sap_batchjobs_http.http_helper_files.stage_metrics import new_timer, log_stages, NULL_TIMER
     from sap_batchjobs_http import azure_config
 
 
-def start(source_container: str, source_path: str, sink_container: str):
+# every drop is named PBI-<event>-<transaction>_<date>, anything else in the source path is left alone
+FILE_PATTERN = 'PBI-*-*_*'
 
+
+def start(source_container: str, source_path: str, sink_container: str, options: RunOptions = None) -> list:
+    """Processes every obiee agent file under the source path
+
+    :param source_container: container the raw files land in
+    :param source_path: path within source container
+    :param sink_container: container for in progress files
+    :param options: run options, defaults to sequential processing
+    :return: list of per-file results
+    """
+    options = options or RunOptions()
     config = azure_config.DefaultConfig()
 
     # Create source blob object
@@ -27,29 +54,184 @@ def start(source_container: str, source_path: str, sink_container: str):
                               source_container,
                               source_path)
 
-    # Create sink blob object
-    destination_blob = BlobHandler(config.PS_CONNECTION,
-                                   sink_container)      # path will change so don't pass a path
+    def process_file(file):
+        return _process_file(file, source_blob, source_path, config.PS_CONNECTION, sink_container, options)
+
+    # files directly in the source path named like a drop, a page at a time, keeping only this invocation's shard
+    if not options.coalesce:
+        return run_listing(source_blob, FILE_PATTERN, process_file, options)
+
+    # files for the same ADF path (event, transaction and date) go out as one in progress file
+    def group_files(files):
+        return coalesce.group_files(files, key=lambda file: _get_new_path_file(file, source_path)[1])
+
+    def process_group(item):
+        if len(item['group']) == 1:
+            return process_file(item['group'][0])
+
+        return coalesce.process_group(item['group'], source_blob, source_path, config.PS_CONNECTION, sink_container,
+                                      options, _get_new_path_file, _read_dataframe)
+
+    return run_listing(source_blob, FILE_PATTERN, process_group, options, group=group_files)
+
+
+async def start_async(source_container: str, source_path: str, sink_container: str,
+                      options: RunOptions = None) -> list:
+    """Async version of start, options.workers files are downloaded, parsed and uploaded at once
+
+    :param source_container: container the raw files land in
+    :param source_path: path within source container
+    :param sink_container: container for in progress files
+    :param options: run options
+    :return: list of per-file results
+    """
+    try:  # aio sdk is only loaded for async runs
+        from .manager_blobs_aio import AsyncBlobHandler
+    except ModuleNotFoundError:
+        from sap_batchjobs_http.http_helper_files.manager_blobs_aio import AsyncBlobHandler
+
+    options = options or RunOptions()
+    config = azure_config.DefaultConfig()
+
+    source_blob = AsyncBlobHandler(config.PS_CONNECTION, source_container, source_path)
+
+    async def process_file(file):
+        source_file = _get_new_path_file(file, source_path)[0]
+        folder = file['name'][:-len(source_file)]
+        members = []
+        timer = new_timer(options.metrics)
+
+        def schema_key(name):
+            return _schema_key(_get_new_path_file({'name': folder + name}, source_path)[1], options)
+
+        # the download streams into the parser thread, so its time is part of 'parse'
+        dfs = source_blob.read_blob_files_to_df(source_file, options.engine, schema_key)
+
+        async for name, df in timer.meter_async(dfs, 'parse', size=None):
+            timer.count('parse', rows=len(df))
+
+            # each member of a zip archive is routed by its own name, as in the sync path
+            adf_path, in_progress_path, in_progress_file = _get_new_path_file({'name': folder + name}, source_path)[1:]
+
+            # add filename column for ADF to use
+            with timer.stage('transform'):
+                df['filename'] = adf_path
+                df.columns = df.columns.str.strip()
+
+            # csv batches are serialised in a thread while the one before uploads, both are in 'upload'
+            destination_blob = AsyncBlobHandler(config.PS_CONNECTION, sink_container, in_progress_path)
+
+            with timer.stage('upload'):
+                await destination_blob.write_df_to_blob(df, output_file_name(in_progress_file, options.sink_format),
+                                                        options.sink_format, options.sink_compression)
+            timer.count('upload', rows=len(df))
+            members.append({'name': name})
 
-    # get files from source container and path
-    files_to_process = source_blob.get_blob_list()
+        with timer.stage('delete'):
+            await source_blob.delete_blob_file(source_file)
 
-    # for each file in files_to_process
-    for file in files_to_process:
+        # a plain file reports its details as before, archives list what was in them
+        details = {} if len(members) == 1 and members[0]['name'] == source_file else {'members': members}
 
-        source_file, adf_path, in_progress_path, in_progress_file = _get_new_path_file(file, source_path)
+        if timer.enabled:
+            details['stages'] = timer.to_dict()
+            log_stages('file_stages', details['stages'], file=file['name'])
 
-        # read into dataframe
-        df = source_blob.read_blob_csv_to_df(source_file)
+        return details or None
 
-        # add filename column for ADF to use
+    return await run_listing_async(source_blob, FILE_PATTERN, process_file, options)
+
+
+def _process_file(file, source_blob: BlobHandler, source_path: str, connection_string: str, sink_container: str,
+                  options: RunOptions):
+    """Processes one obiee agent blob, a zip archive is processed as one file per member
+
+    :param file: blob properties item from the listing
+    :param source_blob: BlobHandler for the source container and path
+    :param source_path: path passed by ADF to use for source
+    :param connection_string: azure connection string for the sink
+    :param sink_container: container for in progress files
+    :param options: run options
+    :return: dict listing the members of an archive and the stage metrics, or None
+    """
+    source_file = _get_new_path_file(file, source_path)[0]
+    folder = file['name'][:-len(source_file)]
+    members = []
+    timer = new_timer(options.metrics)
+
+    # a zip archive is downloaded while the first member is being found
+    for name, open_chunks in timer.meter(source_blob.read_blob_files(source_file), 'download', size=None):
+        # each member is routed by its own name, as if it had been dropped on its own
+        _process_logical_file({'name': folder + name}, open_chunks, source_path, connection_string,
+                              sink_container, options, timer)
+        members.append({'name': name})
+
+    # cleanup, once everything in the blob has been written
+    with timer.stage('delete'):
+        delete_source(source_blob, source_file, options.cleanup)
+
+    details = {} if len(members) == 1 and members[0]['name'] == source_file else {'members': members}
+
+    if timer.enabled:
+        details['stages'] = timer.to_dict()
+        log_stages('file_stages', details['stages'], file=file['name'])
+
+    return details or None
+
+
+def _process_logical_file(file, open_chunks, source_path: str, connection_string: str, sink_container: str,
+                          options: RunOptions, timer=NULL_TIMER):
+    """Reads one obiee agent file, adds the filename column and writes it to the in progress container
+
+    :param file: dict with the full name of the file, as in the listing
+    :param open_chunks: callable returning the uncompressed file contents as byte chunks
+    :param source_path: path passed by ADF to use for source
+    :param connection_string: azure connection string for the sink
+    :param sink_container: container for in progress files
+    :param options: run options
+    :param timer: stage_metrics timer for the blob
+    :return: None
+    """
+    source_file, adf_path, in_progress_path, in_progress_file = _get_new_path_file(file, source_path)
+
+    df = _read_dataframe(timer.meter_open(open_chunks, 'download'), source_file, adf_path, options, timer)
+
+    # write to destination blob
+    # each file gets its own sink object, the path differs per file and files can run in parallel
+    destination_blob = BlobHandler(connection_string, sink_container, in_progress_path)
+
+    with timer.stage('upload'):
+        destination_blob.write_df_to_blob(df, output_file_name(in_progress_file, options.sink_format),
+                                          options.sink_format, options.sink_compression, timer)
+    timer.count('upload', rows=len(df))
+
+
+def _read_dataframe(open_chunks, source_file: str, adf_path: str, options: RunOptions, timer=NULL_TIMER):
+    """parses one obiee agent file and adds the filename column
+
+    :param open_chunks: callable returning the uncompressed file contents as byte chunks
+    :param source_file: file name without path
+    :param adf_path: filename for ADF to use
+    :param options: run options
+    :param timer: stage_metrics timer for the blob
+    :return: dataframe
+    """
+    # read into dataframe
+    with timer.stage('parse'):
+        df = read_csv_chunks(open_chunks, source_file, options.engine, _schema_key(adf_path, options))
+    timer.count('parse', rows=len(df))
+
+    # add filename column for ADF to use
+    with timer.stage('transform'):
         df['filename'] = adf_path
         df.columns = df.columns.str.strip()
 
-        # write to destination blob and cleanup
-        destination_blob.path = in_progress_path
-        destination_blob.write_csv_to_blob(df, in_progress_file)
-        source_blob.delete_blob_file(source_file)
+    return df
+
+
+def _schema_key(adf_path: str, options: RunOptions):
+    """:return: key of the file's transaction in the schema cache, None if the run doesn't use it"""
+    return transaction_key('obiee_agent', adf_path) if options.schema_cache else None
 
 
 def _get_new_path_file(file: str, path: str):
@@ -75,10 +257,10 @@ def _get_new_path_file(file: str, path: str):
     # create all return variables
     adf_path = path + event_only + '/' + transaction_only + '/' + date_only + '.csv'
     in_progress_sink_path = path + transaction_only + '/'
-    in_progress_sink_file = file_without_path
+    in_progress_sink_file = strip_compression_extension(file_without_path)     # written uncompressed
     source_file = file_without_path
 
-    print(adf_path)
+    logging.debug(f"Routing {extracted_filename} as {adf_path}")
     return source_file, adf_path, in_progress_sink_path, in_progress_sink_file
 
 
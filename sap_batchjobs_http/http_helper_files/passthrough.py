@@ -0,0 +1,248 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Pandas-free version of the sap_batch transform.  The header is
+# replaced with column numbers 1..N and the ADF filename is added
+# to the end of every data line, one line at a time, with no
+# dataframe in memory.
+#
+# Output is byte for byte DataFrame.to_csv(index=False, sep='\t')
+# of the c engine's frame.  pandas picks each column's type from
+# all of its values, so the file is read twice: column_formats
+# works out what pandas would make of every column, e.g. int64
+# writes '007' as 7 and float64 writes 5 as 5.0, then rewrite_lines
+# formats each field to match.  sap_batch holds the file in memory
+# for the two passes, up to STREAM_MAX_BYTES, bigger files go
+# through the dataframe path.  The inference is copied from pandas
+# and could drift when pandas changes: switch a transaction to
+# 'stream' only once 'verify' has passed on its real data.
+# Changes:
+# Oct 18, 2026 - numeric and boolean columns are written the way pandas writes them
+# ---------------------------------------------------------------
+
+import os
+import re
+
+# values pandas reads as NaN and to_csv writes back as empty fields
+NA_VALUES = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+                       '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None',
+                       'n/a', 'nan', 'null'])
+
+# values the c engine reads as True or False
+TRUE_VALUES = frozenset(['True', 'TRUE', 'true'])
+FALSE_VALUES = frozenset(['False', 'FALSE', 'false'])
+
+# characters that make to_csv quote a field (QUOTE_MINIMAL with a tab delimiter)
+_QUOTE_TRIGGERS = ('"', '\t', '\r', '\n')
+
+# tokens the c engine parses as integers and floats, surrounding spaces allowed
+_INT = re.compile(r'\s*[+-]?\d+\s*')
+_FLOAT = re.compile(r'\s*[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|inf|infinity)\s*', re.IGNORECASE)
+
+INT64_RANGE = (-2 ** 63, 2 ** 63 - 1)
+UINT64_MAX = 2 ** 64 - 1
+
+
+class _ColumnType:
+    """What the c engine's type inference makes of one column, fed one field at a time.
+    It tries int64, then float64, bool and finally keeps the text.  An integer too big for
+    int64 sends it to uint64 first, which can end in text or python ints, so both scans
+    have to know where in the column they stopped."""
+
+    def __init__(self):
+        self.values = 0             # fields that are not NA
+        self.has_na = False
+        self.int64_miss = None      # first field int64 can't take: 'overflow' for a bigger integer, else 'other'
+        self.uint64_stop = None     # field uint64 stopped at: 'overflow' above UINT64_MAX, 'other' if not an integer
+        self.seen_sint = False      # negative integers, NA and integers above int64 before the uint64 stop
+        self.seen_null = False
+        self.seen_uint = False
+        self.all_int = True         # every non-NA field something python's int() takes, underscores included
+        self.all_float = True       # every non-NA field a float, integers included
+        self.all_bool = True        # every non-NA field one of TRUE_VALUES or FALSE_VALUES
+
+    def add(self, value: str):
+        is_na = value in NA_VALUES
+        number = int(value) if not is_na and _INT.fullmatch(value) else None
+
+        # NA doesn't stop int64, the column just ends up float64
+        if self.int64_miss is None and not is_na and (number is None or
+                                                      not INT64_RANGE[0] <= number <= INT64_RANGE[1]):
+            self.int64_miss = 'overflow' if number is not None else 'other'
+
+        if self.uint64_stop is None:
+            if is_na:
+                self.seen_null = True
+            elif value.lstrip().startswith('-'):
+                self.seen_sint = True   # whatever follows the sign
+            elif number is None:
+                self.uint64_stop = 'other'
+            elif number > UINT64_MAX:
+                self.uint64_stop = 'overflow'
+            elif number > INT64_RANGE[1]:
+                self.seen_uint = True
+
+        if is_na:
+            self.has_na = True
+            return
+
+        self.values += 1
+        self.all_int = self.all_int and (number is not None or _python_int(value))
+        self.all_float = self.all_float and (number is not None or bool(_FLOAT.fullmatch(value)))
+        self.all_bool = self.all_bool and (value in TRUE_VALUES or value in FALSE_VALUES)
+
+    def formatter(self):
+        """:return: callable formatting a field of the column the way to_csv writes it"""
+        if self.int64_miss is None:
+            # integers with NA are converted to float64, so -0 comes out as 0.0
+            return _format_int_as_float if self.has_na else _format_int
+
+        if self.int64_miss == 'overflow' and self.uint64_stop != 'other':
+            if self.uint64_stop is None and self.seen_uint and (self.seen_sint or self.seen_null):
+                return _format_raw      # pandas gives up on numbers and keeps every field, NA included
+
+            if self.uint64_stop is None and not self.seen_sint:
+                return _format_int      # uint64
+
+            # an object column: python ints if every field is an integer, otherwise the text as it is
+            return _format_int if self.all_int else _format_raw
+
+        if self.all_float:
+            return _format_float        # a column of nothing but NA is float64 too
+
+        if self.all_bool:
+            return _format_bool
+
+        return _format_field
+
+
+def column_formats(lines) -> list:
+    """Works out how to_csv writes each column of an extract, from all of its data lines
+
+    :param lines: iterable of text lines, with or without line endings
+    :return: list of callables formatting a raw field of each column
+    """
+    columns = None
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+
+        if not line:
+            continue
+
+        fields = line.split('\t')
+
+        if columns is None:
+            columns = [_ColumnType() for _ in fields]
+            continue
+
+        # short rows are padded with NaN
+        fields.extend([''] * (len(columns) - len(fields)))
+
+        for column, field in zip(columns, fields):
+            column.add(field)
+
+    return [column.formatter() for column in columns or []]
+
+
+def rewrite_lines(lines, adf_path: str, formats: list = None, line_terminator: str = os.linesep):
+    """Rewrites a tab delimited extract the way sap_batch's DataFrame path does
+
+    :param lines: iterable of text lines, with or without line endings
+    :param adf_path: value for the appended filename column
+    :param formats: column_formats of the same lines, None writes every field as text
+    :param line_terminator: output line ending, to_csv uses os.linesep
+    :return: generator of output lines, each ending with line_terminator
+    """
+    filename_field = _format_field(adf_path)
+    column_count = None
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+
+        if not line:    # pandas skips blank lines, including before the header
+            continue
+
+        fields = line.split('\t')
+
+        if column_count is None:
+            column_count = len(fields)
+            yield '\t'.join(str(idx) for idx in range(1, column_count + 2)) + line_terminator
+            continue
+
+        if len(fields) > column_count:
+            raise ValueError(f'Expected {column_count} fields, saw {len(fields)}: {line[:80]}')
+
+        # short rows are padded with empty fields, like the NaN pandas fills in
+        fields.extend([''] * (column_count - len(fields)))
+
+        if formats:
+            fields = [format_field(field) for format_field, field in zip(formats, fields)]
+        else:
+            fields = [_format_field(field) for field in fields]
+        fields.append(filename_field)
+
+        yield '\t'.join(fields) + line_terminator
+
+
+def _format_field(value: str) -> str:
+    """formats one field the way to_csv writes a string or missing value
+
+    :param value: raw field text
+    :return: field text for the output line
+    """
+    if value in NA_VALUES:
+        return ''
+
+    if any(char in value for char in _QUOTE_TRIGGERS):
+        return '"' + value.replace('"', '""') + '"'
+
+    return value
+
+
+def _python_int(value: str) -> bool:
+    """an object column converts its fields with int(), which takes more than the c engine does"""
+    try:
+        int(value)
+    except ValueError:
+        return False
+
+    return True
+
+
+def _format_int(value: str) -> str:
+    if value in NA_VALUES:
+        return ''
+
+    return str(int(value))
+
+
+def _format_int_as_float(value: str) -> str:
+    if value in NA_VALUES:
+        return ''
+
+    return repr(float(int(value)))
+
+
+def _format_raw(value: str) -> str:
+    """the field as it is, NA values included"""
+    if any(char in value for char in _QUOTE_TRIGGERS):
+        return '"' + value.replace('"', '""') + '"'
+
+    return value
+
+
+def _format_float(value: str) -> str:
+    """NA is empty, anything else as numpy writes a float64, which is python's shortest repr"""
+    if value in NA_VALUES:
+        return ''
+
+    return repr(float(value))
+
+
+def _format_bool(value: str) -> str:
+    if value in NA_VALUES:
+        return ''
+
+    return 'True' if value in TRUE_VALUES else 'False'
@@ -0,0 +1,98 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Name to handler lookup for things chosen per request, like the
+# datatype processors.  Handlers are registered as module paths
+# and only imported the first time they are looked up, so a cold
+# start does not pay for pandas and the blob sdk until a request
+# actually needs them.
+# Changes:
+# ---------------------------------------------------------------
+
+import importlib
+import threading
+
+
+class Registry:
+
+    def __init__(self, kind: str, package: str = None):
+        """A set of named handlers
+
+        :param kind: what is registered, used in error messages, e.g. 'datatype'
+        :param package: package that relative module paths are imported from
+        """
+        self.kind = kind
+        self._package = package
+        self._targets = {}
+        self._details = {}
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, target=None, **details):
+        """Adds a handler, registering a name again replaces it
+
+        Used directly with a module path, e.g. register('sap_batch', '.sap_batch', status='Done'),
+        or as a decorator on a function or class that should be registered as it is defined.
+
+        :param name: lookup name, case insensitive
+        :param target: the handler, or 'module' / 'module:attribute' to import on first use
+        :param details: extra settings kept with the handler, see details()
+        :return: the target, or a decorator if no target is given
+        """
+        if target is None:
+            def decorator(obj):
+                self.register(name, obj, **details)
+                return obj
+            return decorator
+
+        key = name.lower()
+
+        with self._lock:
+            self._targets[key] = target
+            self._details[key] = details
+            self._loaded.pop(key, None)
+
+        return target
+
+    def get(self, name: str):
+        """Returns the handler, importing it on first use
+
+        :param name: registered name
+        :return: the handler
+        :raises KeyError: name is not registered
+        """
+        key = name.lower()
+
+        with self._lock:
+            if key in self._loaded:
+                return self._loaded[key]
+
+            if key not in self._targets:
+                raise KeyError(f'Unknown {self.kind} {name!r}, expected one of {sorted(self._targets)}')
+
+            handler = self._loaded[key] = self._load(self._targets[key])
+
+        return handler
+
+    def details(self, name: str) -> dict:
+        """settings passed to register for a name, without importing the handler"""
+        return dict(self._details[name.lower()])
+
+    def is_loaded(self, name: str) -> bool:
+        return name.lower() in self._loaded
+
+    def names(self) -> list:
+        return sorted(self._targets)
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and name.lower() in self._targets
+
+    def _load(self, target):
+        if not isinstance(target, str):
+            return target
+
+        module_name, _, attribute = target.partition(':')
+        module = importlib.import_module(module_name, self._package)
+
+        return getattr(module, attribute) if attribute else module
@@ -0,0 +1,195 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Optional tuning parameters for a processing run.  Everything in
+# here has a default that matches the original sequential
+# behaviour, so ADF pipelines that don't pass them are unchanged.
+# Changes:
+# Oct 18, 2026 - options with a fixed set of values are checked against it
+# ---------------------------------------------------------------
+
+import hashlib
+
+# import our own modules.
+try:  # if on azure
+    from .. import azure_config
+    from .storage_backends import backend_scheme
+except ModuleNotFoundError:  # if local
+    from sap_batchjobs_http import azure_config
+    from sap_batchjobs_http.http_helper_files.storage_backends import backend_scheme
+
+# values an option can take, the first is the default
+PARSER_ENGINES = ('c', 'pyarrow', 'python')
+TRANSFORMS = ('dataframe', 'stream', 'verify')
+IO_MODES = ('threads', 'async')
+OUTPUT_FORMATS = ('csv', 'parquet')
+PARQUET_COMPRESSION = ('snappy', 'zstd', 'gzip', 'none')
+
+
+class RunOptions:
+
+    def __init__(self, workers: int = 1, engine: str = 'c', transform: str = 'dataframe',
+                 io_mode: str = 'threads', shard_index: int = 0, shard_count: int = 1,
+                 sink_format: str = 'csv', sink_compression: str = 'snappy', metrics: bool = False,
+                 page_size: int = None, coalesce: bool = False, dedup: bool = False,
+                 schema_cache: bool = False, memory_budget_mb: int = None, batch_deletes: bool = False,
+                 archive_container: str = None):
+        """Options that control how a batch of files is processed
+
+        :param workers: number of files processed at the same time, 1 is sequential
+        :param engine: csv parser engine, 'c', 'pyarrow' or 'python'
+        :param transform: sap_batch transform, 'dataframe', 'stream' (line by line, no pandas, files over
+                          sap_batch.STREAM_MAX_BYTES use the dataframe path) or 'verify' (dataframe output,
+                          checked against the stream output, run it before switching a transaction to stream)
+        :param io_mode: 'threads' runs the blocking sdk in a thread pool, 'async' uses the aio sdk
+        :param shard_index: which shard of the listing this invocation processes, 0 based
+        :param shard_count: number of invocations the listing is split across
+        :param sink_format: output file format, 'csv' (tab delimited) or 'parquet'
+        :param sink_compression: parquet compression, 'snappy', 'zstd', 'gzip' or 'none'
+        :param metrics: record time, bytes and rows per stage and return them in the response
+        :param page_size: blobs per page of the source listing, None for the service default
+        :param coalesce: write the files of a page with the same ADF path as one csv, see coalesce.py
+        :param dedup: skip files the ledger has seen with the same name and content, see manager_ledger.py
+        :param schema_cache: parse with the dtypes learned from the transaction's earlier files rather than
+                             inferring them, codes with leading zeros are kept as text, see schema_cache.py
+        :param memory_budget_mb: MB the files being processed may use at once, by estimate, None for no
+                                 budget. Files then start largest first, see memory_budget.py
+        :param batch_deletes: delete processed source files in batches after each listing page rather than
+                              one by one, see source_cleanup.py
+        :param archive_container: copy processed source files to this container before they are deleted,
+                                  implies batch_deletes
+        """
+        self.workers = int(workers)
+
+        if self.workers < 1:
+            raise ValueError(f'workers must be at least 1, not {workers}')
+
+        self.engine = _one_of('engine', engine, PARSER_ENGINES)
+        self.transform = _one_of('transform', transform, TRANSFORMS)
+        self.io_mode = _one_of('io_mode', io_mode, IO_MODES)
+        self.shard_index = int(shard_index)
+        self.shard_count = int(shard_count)
+
+        if self.shard_count < 1 or not 0 <= self.shard_index < self.shard_count:
+            raise ValueError(f'shard_index {shard_index} must be between 0 and shard_count {shard_count} - 1')
+
+        self.sink_format = _one_of('sink_format', sink_format, OUTPUT_FORMATS)
+        self.sink_compression = _one_of('sink_compression', sink_compression, PARQUET_COMPRESSION)
+
+        if self.sink_format != 'csv' and self.transform == 'stream':
+            raise ValueError(f'transform stream only writes csv, not {sink_format}')
+
+        self.metrics = bool(metrics)
+        self.page_size = int(page_size) if page_size else None
+        self.coalesce = bool(coalesce)
+        self.dedup = bool(dedup)
+        self.schema_cache = bool(schema_cache)
+
+        if self.schema_cache and self.transform != 'dataframe':
+            # the cache keeps codes such as order numbers as text, the stream transform writes what inference does
+            raise ValueError(f'schema_cache needs transform dataframe, not {transform}')
+
+        self.memory_budget_mb = int(memory_budget_mb) if memory_budget_mb else None
+
+        if self.io_mode == 'async' and self.transform != 'dataframe':
+            raise ValueError(f'transform {transform} is not supported with io_mode async')
+
+        # the aio sdk talks to azure directly, the memory:// and file:// backends have no async version
+        if self.io_mode == 'async':
+            scheme = backend_scheme(azure_config.DefaultConfig().PS_CONNECTION)
+
+            if scheme != 'azure':
+                raise ValueError(f'io_mode async needs an azure storage account, not a {scheme}:// connection string')
+
+        if self.memory_budget_mb and self.io_mode != 'threads':
+            raise ValueError(f'memory_budget_mb needs io_mode threads, not {io_mode}')
+
+        self.archive_container = archive_container or None
+        self.batch_deletes = bool(batch_deletes) or bool(self.archive_container)
+
+        if self.batch_deletes and self.io_mode != 'threads':
+            raise ValueError(f'batch_deletes and archive_container need io_mode threads, not {io_mode}')
+
+        if self.coalesce and (self.sink_format, self.transform, self.io_mode) != ('csv', 'dataframe', 'threads'):
+            raise ValueError(f'coalesce needs sink_format csv, transform dataframe and io_mode threads, '
+                             f'not {sink_format}, {transform} and {io_mode}')
+
+        # set by the caller rather than the request, e.g. job progress tracking
+        self.on_file_done = None
+        self.run_timer = None       # stage_metrics timer for run level stages such as the listing
+        self.listing_checkpoint = None      # manager_jobs.ListingCheckpoint, to resume the listing on a retry
+        self.ledger = None                  # manager_ledger.Ledger when dedup is on
+        self.memory_budget = None           # memory_budget.MemoryBudget when memory_budget_mb is set
+        self.cleanup = None                 # source_cleanup.SourceCleanup when batch_deletes is on
+
+    @classmethod
+    def from_request(cls, get_param):
+        """Builds options from http request parameters
+
+        :param get_param: callable returning a request parameter by name, or None if not passed
+        :return: RunOptions object
+        """
+        workers = get_param('workers')
+        engine = get_param('engine')
+        transform = get_param('transform')
+        io_mode = get_param('io_mode')
+        shard_index = get_param('shard_index')
+        shard_count = get_param('shard_count')
+        sink_format = get_param('sink_format')
+        sink_compression = get_param('sink_compression')
+        metrics = get_param('metrics')
+        page_size = get_param('page_size')
+        coalesce = get_param('coalesce')
+        dedup = get_param('dedup')
+        schema_cache = get_param('schema_cache')
+        memory_budget_mb = get_param('memory_budget_mb')
+        batch_deletes = get_param('batch_deletes')
+        archive_container = get_param('archive_container')
+
+        return cls(workers=int(workers) if workers else 1,
+                   engine=engine or 'c',
+                   transform=transform or 'dataframe',
+                   io_mode=io_mode or 'threads',
+                   shard_index=int(shard_index) if shard_index else 0,
+                   shard_count=int(shard_count) if shard_count else 1,
+                   sink_format=sink_format or 'csv',
+                   sink_compression=sink_compression or 'snappy',
+                   metrics=str(metrics).lower() in ('1', 'true', 'yes'),
+                   page_size=int(page_size) if page_size else None,
+                   coalesce=str(coalesce).lower() in ('1', 'true', 'yes'),
+                   dedup=str(dedup).lower() in ('1', 'true', 'yes'),
+                   schema_cache=str(schema_cache).lower() in ('1', 'true', 'yes'),
+                   memory_budget_mb=int(memory_budget_mb) if memory_budget_mb else None,
+                   batch_deletes=str(batch_deletes).lower() in ('1', 'true', 'yes'),
+                   archive_container=archive_container or None)
+
+    def owns_file(self, name: str) -> bool:
+        """Whether a blob belongs to this invocation's shard
+        Uses a stable hash of the blob name, so parallel invocations with the same
+        shard_count split a listing with no overlap and no coordination.
+
+        :param name: full blob name from the listing
+        :return: True if this shard should process the blob
+        """
+        if self.shard_count == 1:
+            return True
+
+        digest = hashlib.md5(name.encode('utf-8')).digest()
+
+        return int.from_bytes(digest[:8], 'big') % self.shard_count == self.shard_index
+
+    def to_dict(self) -> dict:
+        """options as a json serialisable dict, for logging and responses"""
+        caller_set = ('on_file_done', 'run_timer', 'listing_checkpoint', 'ledger', 'memory_budget',
+                      'cleanup')
+
+        return {name: value for name, value in vars(self).items() if name not in caller_set}
+
+
+def _one_of(name: str, value: str, allowed: tuple) -> str:
+    """:return: value if it is one of allowed, raises ValueError otherwise"""
+    if value not in allowed:
+        raise ValueError(f'{name} {value} is not one of {", ".join(allowed)}')
+
+    return value
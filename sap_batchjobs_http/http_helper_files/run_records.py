@@ -0,0 +1,149 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Run records in table storage: one entity per file and one per
+# invocation, partitioned by the ADF pipeline run id, with the
+# factory info and start time ADF passes to main.  Entities are
+# queued on the shared TableHandler as each file finishes and go
+# out in batches, the run only waits for the last batch.
+# Records are kept when PRIMARYSTORAGE_RUNS_TABLE is set.
+# Changes:
+# ---------------------------------------------------------------
+
+import uuid
+import hashlib
+import datetime
+import threading
+
+# import our own modules.
+try:  # if on azure
+    from .. import azure_config
+except ModuleNotFoundError:  # if local
+    from sap_batchjobs_http import azure_config
+
+NO_RUN_ID = 'no-pipeline-run'   # partition for calls made without a pipeline run id, e.g. by hand
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+class RunRecorder:
+
+    def __init__(self, table, pipeline_run_id: str, factory_info: str, pipeline_start_time: str,
+                 datatype: str, source_path: str, shard_index: int = 0):
+        """Records the files of one invocation
+
+        :param table: manager_tables.TableHandler
+        :param pipeline_run_id: ADF pipeline run id, the partition
+        :param factory_info: as passed to main
+        :param pipeline_start_time: as passed to main
+        :param datatype: kept with every record
+        :param source_path: kept with every record
+        :param shard_index: shard of this invocation
+        """
+        self._table = table
+        self._common = {'PartitionKey': pipeline_run_id or NO_RUN_ID,
+                        'factory_info': str(factory_info) if factory_info else None,
+                        'pipeline_start_time': pipeline_start_time,
+                        'datatype': datatype,
+                        'source_path': source_path,
+                        'shard_index': shard_index}
+        self.invocation_id = uuid.uuid4().hex
+
+    def file_done(self, result: dict):
+        """queues the record of one file, given as options.on_file_done so it is called as files finish
+
+        :param result: per-file result from batch_runner
+        :return: None
+        """
+        stages = result.get('stages', {})
+        record = dict(self._common,
+                      RowKey=hashlib.md5(result['file'].encode('utf-8')).hexdigest(),   # no '/' in row keys
+                      file=result['file'],
+                      status=result['status'],
+                      error=result.get('error'),
+                      seconds=result.get('seconds'),
+                      rows=stages.get('parse', stages.get('upload', {})).get('rows'),
+                      bytes=stages.get('download', {}).get('bytes', result.get('bytes')),
+                      invocation_id=self.invocation_id,
+                      recorded=_now())
+
+        for name, totals in stages.items():
+            record[f'{name}_seconds'] = totals['seconds']
+
+        self._table.write_data(record)
+
+    def finish(self, response: dict):
+        """queues the invocation's totals then sends everything still queued
+
+        :param response: the response of process_data
+        :return: None
+        """
+        record = dict(self._common,
+                      RowKey='invocation-' + self.invocation_id,
+                      status=response.get('status'),
+                      processed=response.get('processed'),
+                      failed=response.get('failed'),
+                      skipped=response.get('skipped'),
+                      bytes_saved=response.get('bytes_saved'),
+                      recorded=_now())
+
+        for name, totals in response.get('stages', {}).items():
+            record[f'{name}_seconds'] = totals['seconds']
+            record[f'{name}_bytes'] = totals['bytes']
+            record[f'{name}_rows'] = totals['rows']
+
+        self._table.write_data(record)
+        self._table.flush()
+
+    def chain(self, options):
+        """makes file_done part of options.on_file_done, keeping any callback already there
+
+        :param options: RunOptions
+        :return: None
+        """
+        previous = options.on_file_done
+
+        def on_file_done(result):
+            self.file_done(result)
+            if previous:
+                previous(result)
+
+        options.on_file_done = on_file_done
+
+
+def get_run_recorder(pipeline_run_id: str, factory_info: str, pipeline_start_time: str, datatype: str,
+                     source_path: str, shard_index: int = 0):
+    """Returns a recorder for an invocation when PRIMARYSTORAGE_RUNS_TABLE is set
+
+    :return: RunRecorder, or None if run records are not kept
+    """
+    config = azure_config.DefaultConfig()
+
+    if not config.PS_RUNS_TABLE:
+        return None
+
+    return RunRecorder(_get_table(config.PS_CONNECTION, config.PS_RUNS_TABLE), pipeline_run_id, factory_info,
+                       pipeline_start_time, datatype, source_path, shard_index)
+
+
+def _get_table(connection_string: str, table: str):
+    """shared TableHandler per table, so batches fill up across invocations in this worker"""
+    try:  # table sdk is only loaded when run records are kept
+        from .manager_tables import TableHandler
+    except ModuleNotFoundError:
+        from sap_batchjobs_http.http_helper_files.manager_tables import TableHandler
+
+    with _tables_lock:
+        handler = _tables.get((connection_string, table))
+
+        if handler is None:
+            handler = _tables[connection_string, table] = TableHandler(connection_string, table)
+            handler.create_table()
+
+    return handler
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
@@ -9,16 +9,53 @@
 # ---------------------------------------------------------------
 
 
+import logging
+from itertools import zip_longest
+
 # import our own modules.
 try:  # if on azure
-    from .manager_blobs import BlobHandler
+    from .manager_blobs import BlobHandler, output_file_name, read_csv_chunks
+    from .blob_streams import encode_lines, open_text_stream, strip_compression_extension, buffer_chunks, \
+        file_chunks
+    from .passthrough import rewrite_lines, column_formats
+    from .batch_runner import run_listing, run_listing_async
+    from .run_options import RunOptions
+    from . import coalesce
+    from .source_cleanup import delete_source
+    from .schema_cache import transaction_key
+    from .stage_metrics import new_timer, log_stages, NULL_TIMER
     from .. import azure_config
 except ModuleNotFoundError:  # if local
-    from sap_batchjobs_http.http_helper_files.manager_blobs import BlobHandler
+    from sap_batchjobs_http.http_helper_files.manager_blobs import BlobHandler, output_file_name, read_csv_chunks
+    from sap_batchjobs_http.http_helper_files.blob_streams import encode_lines, open_text_stream, \
+        strip_compression_extension, buffer_chunks, file_chunks
+    from sap_batchjobs_http.http_helper_files.passthrough import rewrite_lines, column_formats
+    from sap_batchjobs_http.http_helper_files.batch_runner import run_listing, run_listing_async
+    from sap_batchjobs_http.http_helper_files.run_options import RunOptions
+    from sap_batchjobs_http.http_helper_files import coalesce
+    from sap_batchjobs_http.http_helper_files.source_cleanup import delete_source
+    from sap_batchjobs_http.http_helper_files.schema_cache import transaction_key
+    from sap_batchjobs_http.http_helper_files.stage_metrics import new_timer, log_stages, NULL_TIMER
     from sap_batchjobs_http import azure_config
 
 
-def start(source_container: str, source_path: str, sink_container: str):
+# every drop is named PBI-<event>-<transaction>_<date>, anything else in the source path is left alone
+FILE_PATTERN = 'PBI-*-*_*'
+
+# the stream transform holds a file in memory for its two passes, bigger files go through the dataframe path
+STREAM_MAX_BYTES = 64 * 1024 * 1024
+
+
+def start(source_container: str, source_path: str, sink_container: str, options: RunOptions = None) -> list:
+    """Processes every sap batch file under the source path
+
+    :param source_container: container the raw files land in
+    :param source_path: path within source container
+    :param sink_container: container for in progress files
+    :param options: run options, defaults to sequential processing
+    :return: list of per-file results
+    """
+    options = options or RunOptions()
     config = azure_config.DefaultConfig()
 
     # Create source blob object
@@ -26,42 +63,281 @@ def start(source_container: str, source_path: str, sink_container: str):
                               source_container,
                               source_path)
 
-    # Create sink blob object
-    destination_blob = BlobHandler(config.PS_CONNECTION,
-                                   sink_container)  # path will change so don't pass a path
+    def process_file(file):
+        return _process_file(file, source_blob, source_path, config.PS_CONNECTION, sink_container, options)
+
+    # files directly in the source path named like a drop, a page at a time, keeping only this invocation's shard
+    if not options.coalesce:
+        return run_listing(source_blob, FILE_PATTERN, process_file, options)
+
+    # files for the same ADF path (event, transaction and date) go out as one in progress file
+    def group_files(files):
+        return coalesce.group_files(files, key=lambda file: _get_new_path_file(file, source_path)[1])
+
+    def process_group(item):
+        if len(item['group']) == 1:
+            return process_file(item['group'][0])
+
+        return coalesce.process_group(item['group'], source_blob, source_path, config.PS_CONNECTION, sink_container,
+                                      options, _get_new_path_file, _read_dataframe)
+
+    return run_listing(source_blob, FILE_PATTERN, process_group, options, group=group_files)
+
+
+async def start_async(source_container: str, source_path: str, sink_container: str,
+                      options: RunOptions = None) -> list:
+    """Async version of start, options.workers files are downloaded, parsed and uploaded at once
+
+    :param source_container: container the raw files land in
+    :param source_path: path within source container
+    :param sink_container: container for in progress files
+    :param options: run options
+    :return: list of per-file results
+    """
+    try:  # aio sdk is only loaded for async runs
+        from .manager_blobs_aio import AsyncBlobHandler
+    except ModuleNotFoundError:
+        from sap_batchjobs_http.http_helper_files.manager_blobs_aio import AsyncBlobHandler
+
+    options = options or RunOptions()
+    config = azure_config.DefaultConfig()
+
+    source_blob = AsyncBlobHandler(config.PS_CONNECTION, source_container, source_path)
+
+    async def process_file(file):
+        source_file = _get_new_path_file(file, source_path)[0]
+        folder = file['name'][:-len(source_file)]
+        members = []
+        timer = new_timer(options.metrics)
+
+        def schema_key(name):
+            return _schema_key(_get_new_path_file({'name': folder + name}, source_path)[1], options)
+
+        # the download streams into the parser thread, so its time is part of 'parse'
+        dfs = source_blob.read_blob_files_to_df(source_file, options.engine, schema_key)
+
+        async for name, df in timer.meter_async(dfs, 'parse', size=None):
+            timer.count('parse', rows=len(df))
+
+            # each member of a zip archive is routed by its own name, as in the sync path
+            adf_path, in_progress_path, in_progress_file = _get_new_path_file({'name': folder + name}, source_path)[1:]
+
+            with timer.stage('transform'):
+                df = _transform_dataframe(df, adf_path)
+
+            # csv batches are serialised in a thread while the one before uploads, both are in 'upload'
+            destination_blob = AsyncBlobHandler(config.PS_CONNECTION, sink_container, in_progress_path)
+
+            with timer.stage('upload'):
+                await destination_blob.write_df_to_blob(df, output_file_name(in_progress_file, options.sink_format),
+                                                        options.sink_format, options.sink_compression)
+            timer.count('upload', rows=len(df))
+            members.append({'name': name})
+
+        with timer.stage('delete'):
+            await source_blob.delete_blob_file(source_file)
+
+        # a plain file reports its details as before, archives list what was in them
+        details = {} if len(members) == 1 and members[0]['name'] == source_file else {'members': members}
+
+        if timer.enabled:
+            details['stages'] = timer.to_dict()
+            log_stages('file_stages', details['stages'], file=file['name'])
+
+        return details or None
+
+    return await run_listing_async(source_blob, FILE_PATTERN, process_file, options)
+
+
+def _process_file(file, source_blob: BlobHandler, source_path: str, connection_string: str, sink_container: str,
+                  options: RunOptions):
+    """Processes one sap batch blob, a zip archive is processed as one file per member
+
+    :param file: blob properties item from the listing
+    :param source_blob: BlobHandler for the source container and path
+    :param source_path: path passed by ADF to use for source
+    :param connection_string: azure connection string for the sink
+    :param sink_container: container for in progress files
+    :param options: run options
+    :return: dict of extra details for the file result, or None
+    """
+    source_file = _get_new_path_file(file, source_path)[0]
+    folder = file['name'][:-len(source_file)]
+    members = []
+    timer = new_timer(options.metrics)
+
+    # a zip archive is downloaded while the first member is being found
+    for name, open_chunks in timer.meter(source_blob.read_blob_files(source_file), 'download', size=None):
+        # each member is routed by its own name, as if it had been dropped on its own
+        details = _process_logical_file({'name': folder + name}, open_chunks, source_path,
+                                        connection_string, sink_container, options, timer)
+        members.append(dict(details or {}, name=name))
+
+    # cleanup, once everything in the blob has been written
+    with timer.stage('delete'):
+        delete_source(source_blob, source_file, options.cleanup)
+
+    # a plain file reports its details as before, archives list what was in them
+    if len(members) == 1 and members[0]['name'] == source_file:
+        del members[0]['name']
+        details = members[0]
+    else:
+        details = {'members': members}
+
+    if timer.enabled:
+        details['stages'] = timer.to_dict()
+        log_stages('file_stages', details['stages'], file=file['name'])
 
-    # get files from source container and path
-    files_to_process = source_blob.get_blob_list()
+    return details or None
 
-    # for each file in files_to_process
-    for file in files_to_process:
-        source_file, adf_path, in_progress_path, in_progress_file = _get_new_path_file(file, source_path)
 
-        # read into dataframe
-        df = source_blob.read_blob_csv_to_df(source_file)
+def _process_logical_file(file, open_chunks, source_path: str, connection_string: str, sink_container: str,
+                          options: RunOptions, timer=NULL_TIMER):
+    """Reads one sap batch file, adds the filename column and writes it to the in progress container
+
+    :param file: dict with the full name of the file, as in the listing
+    :param open_chunks: callable returning the uncompressed file contents as byte chunks
+    :param source_path: path passed by ADF to use for source
+    :param connection_string: azure connection string for the sink
+    :param sink_container: container for in progress files
+    :param options: run options
+    :param timer: stage_metrics timer for the blob
+    :return: dict of extra details for the file result, or None
+    """
+    source_file, adf_path, in_progress_path, in_progress_file = _get_new_path_file(file, source_path)
+    details = None
+
+    # each file gets its own sink object, the path differs per file and files can run in parallel
+    destination_blob = BlobHandler(connection_string, sink_container, in_progress_path)
+
+    open_chunks = timer.meter_open(open_chunks, 'download')
+    source = _buffer_source(file, open_chunks, source_file) if options.transform in ('stream', 'verify') else None
+
+    if options.transform == 'stream' and source is not None:
+        # transform and upload overlap, waiting on the upload is what is left of 'upload'
+        with timer.stage('upload'):
+            chunks = timer.meter(encode_lines(_stream_lines(source, adf_path)), 'transform')
+            destination_blob.write_stream_to_blob(chunks, in_progress_file)
+
+    else:
+        df = _read_dataframe(open_chunks, source_file, adf_path, options, timer)
+
+        if options.transform == 'verify':
+            with timer.stage('verify'):
+                details = {'stream_equivalent': _verify_stream(df, source, source_file, adf_path)}
+
+        with timer.stage('upload'):
+            destination_blob.write_df_to_blob(df, output_file_name(in_progress_file, options.sink_format),
+                                              options.sink_format, options.sink_compression, timer)
+        timer.count('upload', rows=len(df))
+
+    return details
+
+
+def _read_dataframe(open_chunks, source_file: str, adf_path: str, options: RunOptions, timer=NULL_TIMER):
+    """parses one sap batch file and transforms it for ADF
+
+    :param open_chunks: callable returning the uncompressed file contents as byte chunks
+    :param source_file: file name without path
+    :param adf_path: filename for ADF to use
+    :param options: run options
+    :param timer: stage_metrics timer for the blob
+    :return: transformed dataframe
+    """
+    with timer.stage('parse'):
+        df = read_csv_chunks(open_chunks, source_file, options.engine, _schema_key(adf_path, options))
+    timer.count('parse', rows=len(df))
+
+    with timer.stage('transform'):
+        df = _transform_dataframe(df, adf_path)
+
+    return df
+
+
+def _transform_dataframe(df, adf_path: str):
+    """adds the filename column and replaces the headers with column numbers
+
+    :param df: dataframe of the source file
+    :param adf_path: filename for ADF to use
+    :return: transformed dataframe
+    """
+    # add filename column for ADF to use
+    df['filename'] = adf_path
+    df.columns = df.columns.str.strip()
+
+    # change column names to generic so that there is consistency for azure data wrangling
+    # SAP will change column names from time to time, but we've mapped columns based on indes
+    # in data wrangling flow
+    col_count = len(df.columns)
+    col_names = list(range(1, col_count+1))
+    df.columns = col_names
+
+    return df
+
+
+def _verify_stream(df, source, source_file: str, adf_path: str):
+    """checks the streaming transform gives the same output as the dataframe path
+
+    :param df: transformed dataframe about to be written
+    :param source: the source file from _buffer_source, None if it was too big for the stream transform
+    :param source_file: file name without path
+    :param adf_path: filename for ADF to use
+    :return: True if the outputs are identical, None if the file is too big to stream
+    """
+    if source is None:
+        return None
+
+    expected = df.to_csv(index=False, sep='\t').splitlines(keepends=True)
+
+    for line_no, (want, got) in enumerate(zip_longest(expected, _stream_lines(source, adf_path)), start=1):
+        if want != got:
+            logging.warning(f'Stream transform differs for {source_file} at line {line_no}: '
+                            f'expected {want!r}, got {got!r}')
+            return False
+
+    return True
+
+
+def _buffer_source(file, open_chunks, source_file: str):
+    """Reads a file into memory for the stream transform, if it is no bigger than STREAM_MAX_BYTES
+
+    :param file: dict with the full name of the file, and its size if it came from the listing
+    :param open_chunks: callable returning the uncompressed file contents as byte chunks
+    :param source_file: file name without path, for logging
+    :return: BytesIO of the file, or None if it is too big and goes through the dataframe path
+    """
+    # a compressed drop can be small in the listing and still inflate past the limit, buffer_chunks checks that
+    source = None if (file.get('size') or 0) > STREAM_MAX_BYTES else buffer_chunks(open_chunks(), STREAM_MAX_BYTES)
+
+    if source is None:
+        logging.info(f'{source_file} is over {STREAM_MAX_BYTES // 2 ** 20} MB, using the dataframe transform')
+
+    return source
+
+
+def _stream_lines(source, adf_path: str):
+    """Output lines of the stream transform, in two passes over the file held in memory
+    column_formats reads all of it to work out the type pandas would give each column,
+    then rewrite_lines formats every field to match.
+
+    :param source: BytesIO of the uncompressed source file, from _buffer_source
+    :param adf_path: filename for ADF to use
+    :return: generator of output lines
+    """
+    source.seek(0)
+
+    with open_text_stream(file_chunks(source)) as text:
+        formats = column_formats(text)
 
-        # add filename column for ADF to use
-        df['filename'] = adf_path
-        df.columns = df.columns.str.strip() 
+    source.seek(0)
 
-        # change column names to generic so that there is consistency for azure data wrangling
-        # SAP will change column names from time to time, but we've mapped columns based on indes
-        # in data wrangling flow
-        col_count = len(df.columns)
-        col_names = list(range(1, col_count+1))
-        df.columns = col_names
+    with open_text_stream(file_chunks(source)) as text:
+        yield from rewrite_lines(text, adf_path, formats)
 
-        # change column names to generic so that there is consistency for azure data wrangling
-        # SAP will change column names from time to time, but we've mapped columns based on indes
-        # in data wrangling flow
-        col_count = len(df.columns)
-        col_names = list(range(1, col_count+1))
-        df.columns = col_names
 
-        # write to destination blob and cleanup
-        destination_blob.path = in_progress_path
-        destination_blob.write_csv_to_blob(df, in_progress_file)
-        source_blob.delete_blob_file(source_file)
+def _schema_key(adf_path: str, options: RunOptions):
+    """:return: key of the file's transaction in the schema cache, None if the run doesn't use it"""
+    return transaction_key('sap_batch', adf_path) if options.schema_cache else None
 
 
 def _get_new_path_file(file: str, path: str):
@@ -87,8 +363,8 @@ def _get_new_path_file(file: str, path: str):
     # create all return variables
     adf_path = path + event_only + '/' + transaction_only + '/' + date_only + '.csv'
     in_progress_sink_path = path + transaction_only + '/'
-    in_progress_sink_file = file_without_path
+    in_progress_sink_file = strip_compression_extension(file_without_path)     # written uncompressed
     source_file = file_without_path
 
-    print(adf_path)
+    logging.debug(f"Routing {extracted_filename} as {adf_path}")
     return source_file, adf_path, in_progress_sink_path, in_progress_sink_file
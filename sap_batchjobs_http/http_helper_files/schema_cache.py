@@ -0,0 +1,275 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Opt in cache of column dtypes per transaction.  The first file of
+# a transaction is read as text and each column's dtype is learned
+# from its values: integers as nullable Int64, so blanks don't turn
+# a column to float in one file and not the next, numbers as
+# float64, True/False as boolean.  Codes and IDs (order numbers,
+# activity types, priorities...) have leading zeros that inference
+# would drop, they stay text, as categories when they have few
+# values like the other low cardinality text columns.  Later files
+# with the same header are parsed with those dtypes, so pandas skips
+# inference.  Output differs from an inferring run in those columns,
+# which is why the cache is opt in per run.  A new header replaces
+# the entry, a file the dtypes don't fit (e.g. text, or a code with
+# leading zeros, in a column learned as Int64) drops it and the
+# entry is learned again from that file.  Numeric columns are read
+# as text and converted after that check, so no zeros are lost.
+# Kept in memory per worker.
+# Changes:
+# Oct 18, 2026 - dtypes are learned from the text, codes with leading zeros stay text
+# Oct 18, 2026 - numeric columns are read as text and checked for codes before they are converted
+# ---------------------------------------------------------------
+
+import io
+import re
+import csv
+import hashlib
+import logging
+import threading
+import pandas as pd
+
+CATEGORY_MAX_UNIQUE = 1000      # text columns with at most this many distinct values...
+CATEGORY_MAX_RATIO = 0.5        # ...and at most this share of the rows become categories
+
+_INTEGER = re.compile(r'\s*[+-]?\d+\s*')
+_CODE = re.compile(r'\s*[+-]?0\d+\s*')     # an integer with leading zeros, e.g. order 000004000000
+_FLOAT = re.compile(r'\s*[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|inf|infinity)\s*', re.IGNORECASE)
+NUMERIC_DTYPES = ('Int64', 'float64')     # learned from the values, see _value_dtype
+BOOLEAN_VALUES = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+
+_schema_cache = None
+_schema_cache_lock = threading.Lock()
+
+
+class SchemaMismatchError(ValueError):
+    """a file did not fit the cached dtypes of its transaction, the entry has been dropped"""
+
+
+class SchemaCache:
+
+    def __init__(self):
+        """dtypes per transaction, with the fingerprint of the header they were learned from"""
+        self._entries = {}      # transaction: {'fingerprint': md5 of the header line, 'dtypes': {column: dtype}}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'learned': 0, 'header_changes': 0, 'mismatches': 0}
+
+    def get(self, transaction: str, fingerprint: str):
+        """Returns the dtypes learned for a transaction, dropping them if the header has changed
+
+        :param transaction: key of the transaction, see transaction_key
+        :param fingerprint: header_fingerprint of the file about to be parsed
+        :return: dict of column to dtype, or None if there is nothing to use
+        """
+        with self._lock:
+            entry = self._entries.get(transaction)
+
+            if entry is None:
+                return None
+
+            if entry['fingerprint'] != fingerprint:
+                logging.info(f'Header of {transaction} changed, learning its dtypes again')
+                del self._entries[transaction]
+                self.stats['header_changes'] += 1
+                return None
+
+            self.stats['hits'] += 1
+            return entry['dtypes']
+
+    def learn(self, transaction: str, fingerprint: str, df: pd.DataFrame) -> pd.DataFrame:
+        """Learns the dtypes of a frame read as text, keeps them and converts the frame to them
+
+        :param transaction: key of the transaction, see transaction_key
+        :param fingerprint: header_fingerprint of the file the frame came from
+        :param df: dataframe read with dtype str
+        :return: the dataframe with the learned dtypes
+        """
+        dtypes = learn_dtypes(df)
+        df = pd.DataFrame({column: _convert(df[column], dtype) for column, dtype in dtypes.items()}, index=df.index)
+
+        with self._lock:
+            self._entries[transaction] = {'fingerprint': fingerprint, 'dtypes': dtypes}
+            self.stats['learned'] += 1
+
+        return df
+
+    def invalidate(self, transaction: str):
+        """drops the entry of a transaction, its next file is parsed with inference"""
+        with self._lock:
+            if self._entries.pop(transaction, None) is not None:
+                self.stats['mismatches'] += 1
+
+    def read(self, text, transaction: str, read_options: dict) -> pd.DataFrame:
+        """Parses a tab delimited file with the cached dtypes of its transaction, learning them if there are none
+
+        :param text: text stream of the file, positioned at the header line
+        :param transaction: key of the transaction, see transaction_key
+        :param read_options: pd.read_csv keyword arguments of the parser engine
+        :return: dataframe of the file contents
+        """
+        header = text.readline()
+        fingerprint = header_fingerprint(header)
+
+        # the header on its own gives the same column names, blanks and duplicates included, as a full read
+        columns = list(pd.read_csv(io.StringIO(header), delimiter='\t', quoting=csv.QUOTE_NONE, nrows=0,
+                                   **read_options).columns)
+        dtypes = self.get(transaction, fingerprint)
+
+        try:
+            df = pd.read_csv(text, delimiter='\t', quoting=csv.QUOTE_NONE, header=None, names=columns,
+                             dtype=_read_dtypes(dtypes), **read_options)
+
+            if dtypes is not None:
+                df = _convert_numbers(df, dtypes)
+
+        except pd.errors.ParserError:
+            raise
+
+        except (ValueError, TypeError, OverflowError) as e:
+            if dtypes is None:
+                raise
+
+            self.invalidate(transaction)
+            raise SchemaMismatchError(f'File does not fit the cached dtypes of {transaction}: {e}') from e
+
+        if dtypes is None:
+            df = self.learn(transaction, fingerprint, df)
+
+        return df
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def learn_dtypes(df: pd.DataFrame) -> dict:
+    """dtypes to parse later files with, from the values of a frame read as text
+
+    :param df: dataframe read with dtype str
+    :return: dict of column to dtype name
+    """
+    dtypes = {}
+    max_unique = min(CATEGORY_MAX_UNIQUE, len(df) * CATEGORY_MAX_RATIO)
+
+    for column in df.columns:
+        values = df[column].dropna()
+        dtype = _value_dtype(values) if len(values) else None
+
+        if dtype is not None:
+            try:
+                _convert(values, dtype)
+            except (ValueError, TypeError, OverflowError):  # e.g. an integer too big for Int64
+                dtype = None
+
+        if dtype is None:
+            dtype = 'category' if 0 < values.nunique() <= max_unique else 'string'
+
+        dtypes[column] = dtype
+
+    return dtypes
+
+
+def _read_dtypes(dtypes: dict):
+    """dtypes to give read_csv: numeric columns are read as text, so codes can be caught before they are converted
+
+    :param dtypes: cached dtypes, None when they are still to be learned
+    :return: dtype argument of pd.read_csv
+    """
+    if dtypes is None:
+        return str
+
+    return {column: str if dtype in NUMERIC_DTYPES else dtype for column, dtype in dtypes.items()}
+
+
+def _convert_numbers(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """Converts the numeric columns of a frame read with _read_dtypes to their cached dtypes
+
+    :param df: dataframe with its numeric columns as text
+    :param dtypes: cached dtypes
+    :return: the dataframe with the cached dtypes
+    :raises ValueError: a numeric column has a code with leading zeros, or a value that isn't a number
+    """
+    for column, dtype in dtypes.items():
+        if dtype not in NUMERIC_DTYPES:
+            continue
+
+        values = df[column].dropna()
+        codes = values[values.str.fullmatch(_CODE)]
+
+        if len(codes):
+            raise ValueError(f'{column} has codes with leading zeros, e.g. {codes.iloc[0]}')
+
+        df[column] = _convert(df[column], dtype)
+
+    return df
+
+
+def _value_dtype(values: pd.Series):
+    """:return: numeric or boolean dtype of a column's non-NA text values, None if they are text"""
+    if values.str.fullmatch(_CODE).any():
+        return None
+
+    if values.str.fullmatch(_INTEGER).all():
+        return 'Int64'
+
+    if values.str.fullmatch(_FLOAT).all():
+        return 'float64'
+
+    if values.isin(BOOLEAN_VALUES).all():
+        return 'boolean'
+
+    return None
+
+
+def _convert(series: pd.Series, dtype: str) -> pd.Series:
+    """converts a column read as text to a learned dtype, as read_csv would have parsed it"""
+    if dtype == 'Int64':
+        return pd.to_numeric(series, dtype_backend='numpy_nullable').astype('Int64')
+
+    if dtype == 'float64':
+        return pd.to_numeric(series).astype('float64')
+
+    if dtype == 'boolean':
+        return series.map(BOOLEAN_VALUES).astype('boolean')
+
+    return series.astype(dtype)
+
+
+def header_fingerprint(header: str) -> str:
+    """:return: md5 hex of a header line, line ending excluded"""
+    return hashlib.md5(header.rstrip('\r\n').encode('utf-8')).hexdigest()
+
+
+def transaction_key(datatype: str, adf_path: str) -> str:
+    """Key of the transaction of a file, ADF paths end in event/transaction/date.csv
+
+    :param datatype: datatype of the processor
+    :param adf_path: filename for ADF to use
+    :return: 'datatype:transaction'
+    """
+    return datatype + ':' + adf_path.split('/')[-2]
+
+
+def get_schema_cache() -> SchemaCache:
+    """Returns the schema cache of this worker, created on first use"""
+    global _schema_cache
+
+    with _schema_cache_lock:
+        if _schema_cache is None:
+            _schema_cache = SchemaCache()
+
+    return _schema_cache
+
+
+def set_schema_cache(cache: SchemaCache):
+    """Replaces the schema cache, e.g. with an empty one for a benchmark
+
+    :param cache: SchemaCache to use from now on
+    :return: None
+    """
+    global _schema_cache
+
+    with _schema_cache_lock:
+        _schema_cache = cache
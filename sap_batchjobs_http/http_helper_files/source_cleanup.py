@@ -0,0 +1,107 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Opt in deferred cleanup of processed source files.  Rather than
+# one delete per file as it finishes, the processors queue their
+# source files here and batch_runner commits the queue after each
+# listing page: up to 256 deletes go in one blob batch request.
+# With an archive container, each file is first copied there
+# server side, under the same name, and only deleted once its copy
+# is done, so the raw files are kept at no client bandwidth.  A file
+# that can't be archived or deleted stays in the source and is
+# reported, the next run picks it up again (or skips it with dedup).
+# Changes:
+# ---------------------------------------------------------------
+
+import logging
+import threading
+
+
+class SourceCleanup:
+
+    def __init__(self, archive_container: str = None):
+        """Queue of processed source files, deleted or archived together by commit
+
+        :param archive_container: container to copy files to before they are deleted, None to only delete
+        """
+        self.archive_container = archive_container
+        self.deleted = 0
+        self.archived = 0
+        self.failed = []    # full names of files left in the source
+        self._pending = []  # (source BlobHandler, filename under its path)
+        self._lock = threading.Lock()
+
+    def add(self, source_blob, filename: str):
+        """queues a processed file, called from the worker threads
+
+        :param source_blob: BlobHandler the file was read with
+        :param filename: name under the handler's path
+        :return: None
+        """
+        with self._lock:
+            self._pending.append((source_blob, filename))
+
+    def commit(self):
+        """archives, if asked to, then deletes every queued file
+
+        :return: None
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        # a run reads its sources through one handler, but keep them apart in case
+        handlers = {}
+        for source_blob, filename in pending:
+            handlers.setdefault(id(source_blob), (source_blob, []))[1].append(filename)
+
+        for source_blob, filenames in handlers.values():
+            left = []
+
+            if self.archive_container:
+                left = self._try(source_blob.archive_blob_files, filenames, self.archive_container)
+                not_archived = set(left)
+                filenames = [filename for filename in filenames if filename not in not_archived]
+                self.archived += len(filenames)
+
+            failed = self._try(source_blob.delete_blob_files, filenames)
+            self.deleted += len(filenames) - len(failed)
+
+            for filename in left + failed:
+                self.failed.append(source_blob.path + filename)
+
+        if self.failed:
+            logging.warning(f'{len(self.failed)} processed files are still in the source: {self.failed[:10]}')
+
+    def to_dict(self) -> dict:
+        """counts for the response"""
+        return {'archive_container': self.archive_container,
+                'archived': self.archived,
+                'deleted': self.deleted,
+                'failed': self.failed}
+
+    @staticmethod
+    def _try(action, filenames: list, *args) -> list:
+        """:return: filenames action could not handle, all of them if it raised"""
+        if not filenames:
+            return []
+
+        try:
+            return action(filenames, *args)
+        except Exception:
+            logging.exception(f'Could not clean up {len(filenames)} source files')
+            return list(filenames)
+
+
+def delete_source(source_blob, filename: str, cleanup: SourceCleanup = None):
+    """Deletes a processed source file now, or queues it when the run has a cleanup
+
+    :param source_blob: BlobHandler the file was read with
+    :param filename: name under the handler's path
+    :param cleanup: the run's SourceCleanup, None to delete now
+    :return: None
+    """
+    if cleanup:
+        cleanup.add(source_blob, filename)
+    else:
+        source_blob.delete_blob_file(filename)
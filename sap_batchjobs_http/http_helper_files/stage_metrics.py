@@ -0,0 +1,224 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Wall time, bytes and rows per pipeline stage (list, download,
+# parse, transform, verify, serialise, upload, delete) per file and
+# for the run.  Stages nest, the time of an inner stage is taken
+# out of the stage around it, so the stages of a file add up to
+# its wall time.  When metrics are off NULL_TIMER is used, which
+# does nothing and hands iterables back untouched.
+# Changes:
+# Oct 18, 2026 - meter_async, for the listing of async runs
+# ---------------------------------------------------------------
+
+import time
+import logging
+from contextlib import contextmanager
+
+
+class StageTimer:
+
+    enabled = True
+
+    def __init__(self):
+        """Collects seconds, bytes and rows per stage name, for use from one thread"""
+        self.stages = {}
+        self._nested = []     # seconds spent in inner stages, one entry per open stage
+
+    @contextmanager
+    def stage(self, name: str):
+        """times the block as stage name, excluding any stages opened inside it
+
+        :param name: stage name
+        :return: context manager
+        """
+        started = time.perf_counter()
+        self._nested.append(0.0)
+
+        try:
+            yield
+
+        finally:
+            elapsed = time.perf_counter() - started
+            inner = self._nested.pop()
+            self._get(name)['seconds'] += elapsed - inner
+
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def count(self, name: str, bytes: int = 0, rows: int = 0):
+        """adds bytes and rows to a stage
+
+        :param name: stage name
+        :param bytes: bytes handled
+        :param rows: rows handled
+        :return: None
+        """
+        totals = self._get(name)
+        totals['bytes'] += bytes
+        totals['rows'] += rows
+
+    def meter(self, items, name: str, size=len):
+        """times each step of an iterable as stage name, e.g. waiting for download chunks
+
+        :param items: iterable, e.g. byte chunks
+        :param name: stage name
+        :param size: callable giving the bytes of an item, None to not count bytes
+        :return: generator of the same items
+        """
+        items = iter(items)
+
+        while True:
+            with self.stage(name):
+                item = next(items, None)
+
+            if item is None:
+                return
+
+            if size:
+                self.count(name, bytes=size(item))
+
+            yield item
+
+    def meter_open(self, open_chunks, name: str):
+        """wraps an open_chunks callable so that every stream it opens is metered"""
+        return lambda: self.meter(open_chunks(), name)
+
+    async def meter_async(self, items, name: str, size=len):
+        """meter for an async iterable, e.g. the pages of an aio listing
+
+        :param items: async iterable
+        :param name: stage name
+        :param size: callable giving the bytes of an item, None to not count bytes
+        :return: async generator of the same items
+        """
+        items = items.__aiter__()
+
+        while True:
+            with self.stage(name):
+                try:
+                    item = await items.__anext__()
+                except StopAsyncIteration:
+                    return
+
+            if size:
+                self.count(name, bytes=size(item))
+
+            yield item
+
+    def to_dict(self) -> dict:
+        """stage totals, seconds rounded to the millisecond"""
+        return {name: dict(totals, seconds=round(totals['seconds'], 3)) for name, totals in self.stages.items()}
+
+    def _get(self, name: str) -> dict:
+        totals = self.stages.get(name)
+
+        if totals is None:
+            totals = self.stages[name] = {'seconds': 0.0, 'bytes': 0, 'rows': 0}
+
+        return totals
+
+
+class _NullTimer:
+    """StageTimer that records nothing"""
+
+    enabled = False
+    stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+    def count(self, name: str, bytes: int = 0, rows: int = 0):
+        pass
+
+    def meter(self, items, name: str, size=len):
+        return items
+
+    def meter_open(self, open_chunks, name: str):
+        return open_chunks
+
+    def meter_async(self, items, name: str, size=len):
+        return items
+
+    def to_dict(self) -> dict:
+        return {}
+
+
+NULL_TIMER = _NullTimer()
+
+
+def new_timer(enabled: bool):
+    """:return: a StageTimer, or NULL_TIMER when metrics are off"""
+    return StageTimer() if enabled else NULL_TIMER
+
+
+def summarise_stages(run_timer, results: list) -> dict:
+    """Totals and per-file percentiles for each stage of a run
+
+    :param run_timer: timer with the run level stages, e.g. list
+    :param results: per-file results, timed files have a 'stages' entry
+    :return: dict of stage name to seconds, bytes, rows, files, p50/p95/max seconds per file and throughput
+    """
+    per_file = {}
+
+    for result in results:
+        for name, totals in result.get('stages', {}).items():
+            per_file.setdefault(name, []).append(totals)
+
+    for name, totals in run_timer.to_dict().items():
+        per_file.setdefault(name, []).append(totals)
+
+    summary = {}
+
+    for name, entries in per_file.items():
+        seconds = sorted(entry['seconds'] for entry in entries)
+        total_seconds = sum(seconds)
+        total_bytes = sum(entry['bytes'] for entry in entries)
+        total_rows = sum(entry['rows'] for entry in entries)
+
+        summary[name] = {'seconds': round(total_seconds, 3),
+                         'bytes': total_bytes,
+                         'rows': total_rows,
+                         'files': len(entries),
+                         'p50': _percentile(seconds, 50),
+                         'p95': _percentile(seconds, 95),
+                         'max': round(seconds[-1], 3),
+                         'mb_per_second': _rate(total_bytes / 1e6, total_seconds, 2),
+                         'rows_per_second': _rate(total_rows, total_seconds, 0)}
+
+    return summary
+
+
+def log_stages(event: str, stages: dict, **dimensions):
+    """Writes stage metrics as one structured log event, one custom dimension per stage value
+    e.g. parse_seconds, so application insights can chart and query them
+
+    :param event: event name, e.g. 'file_stages'
+    :param stages: stage name to totals dict
+    :param dimensions: extra dimensions, e.g. the file name
+    :return: None
+    """
+    custom_dimensions = dict(dimensions, event=event)
+
+    for name, totals in stages.items():
+        for key, value in totals.items():
+            custom_dimensions[f'{name}_{key}'] = value
+
+    logging.info(f'{event} {custom_dimensions}', extra={'custom_dimensions': custom_dimensions})
+
+
+def _rate(amount: float, seconds: float, digits: int):
+    """amount per second, None if there was nothing to count or no measurable time"""
+    if not amount or not seconds:
+        return None
+
+    return round(amount / seconds, digits) if digits else round(amount / seconds)
+
+
+def _percentile(sorted_values: list, percent: float) -> float:
+    """nearest rank percentile of an already sorted list"""
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+
+    return round(sorted_values[int(rank) - 1], 3)
@@ -10,27 +10,155 @@
 
 # TODO update for new file format!!
 
-import importlib
+import asyncio
 import logging
-import datetime
-import pytz
 
-# import our own modules.
+# import our own modules.  Only light ones here, the processors pull in pandas and the
+# blob sdk and are imported by the registry when a request first needs them.
 try:    # if on azure
-    from .manager_blobs import BlobHandler
-    from ..http_helper_files import sap_batch
+    from .batch_runner import summarise
+    from .run_options import RunOptions
+    from .registry import Registry
+    from .stage_metrics import new_timer, summarise_stages, log_stages
+    from .manager_jobs import ListingCheckpoint, get_checkpoint_store
+    from .manager_ledger import Ledger, get_ledger_store
+    from .run_records import get_run_recorder
+    from .memory_budget import MemoryBudget
+    from .source_cleanup import SourceCleanup
 except ModuleNotFoundError:  # if local
-    from sap_batchjobs_http.http_helper_files.manager_blobs import BlobHandler
-    from sap_batchjobs_http.http_helper_files import sap_batch
+    from sap_batchjobs_http.http_helper_files.batch_runner import summarise
+    from sap_batchjobs_http.http_helper_files.run_options import RunOptions
+    from sap_batchjobs_http.http_helper_files.registry import Registry
+    from sap_batchjobs_http.http_helper_files.stage_metrics import new_timer, summarise_stages, log_stages
+    from sap_batchjobs_http.http_helper_files.manager_jobs import ListingCheckpoint, get_checkpoint_store
+    from sap_batchjobs_http.http_helper_files.manager_ledger import Ledger, get_ledger_store
+    from sap_batchjobs_http.http_helper_files.run_records import get_run_recorder
+    from sap_batchjobs_http.http_helper_files.memory_budget import MemoryBudget
+    from sap_batchjobs_http.http_helper_files.source_cleanup import SourceCleanup
+
+# datatype processors, each module has start() and start_async() taking
+# (source_container, source_path, sink_container, options)
+#   status: overall message for the response
+DATATYPES = Registry('datatype', package=__package__)
+DATATYPES.register('sap_batch', '.sap_batch', status='SAP_Batch Done')
+DATATYPES.register('obiee_agent', '.obiee_agent', status='OBIEE_Agent Done')
 
 
 def process_data(source_container: str, source_path: str,
                  sink_container: str, datatype: str,
-                 factory_info: str, pipeline_run_id: str, pipeline_start_time: str):
+                 factory_info: str, pipeline_run_id: str, pipeline_start_time: str,
+                 options: RunOptions = None):
     """ First entry point after http call
     This function calls everything needed to load, parse, and save
     the in-process csv blob
 
+    :param source_container:
+    :param source_path:
+    :param sink_container:
+    :param datatype: name of a processor registered in DATATYPES
+    :param factory_info:
+    :param pipeline_run_id:
+    :param pipeline_start_time:
+    :param options: run options such as the number of parallel workers
+    :return: dict with overall status and per-file results
+    """
+
+    options = options or RunOptions()
+
+    if datatype not in DATATYPES:
+        return summarise('No Processor Found', [])
+
+    recorder = _record_run(options, pipeline_run_id, factory_info, pipeline_start_time, datatype, source_path)
+    options.run_timer = new_timer(options.metrics)
+    _resume_listing(options, pipeline_run_id, datatype, source_container, source_path)
+    _use_ledger(options, pipeline_run_id, datatype, source_container)
+
+    if options.memory_budget_mb and options.memory_budget is None:
+        options.memory_budget = MemoryBudget(options.memory_budget_mb)
+
+    if options.batch_deletes and options.cleanup is None:
+        options.cleanup = SourceCleanup(options.archive_container)
+
+    results = DATATYPES.get(datatype).start(source_container, source_path, sink_container, options)
+
+    response = dict(summarise(DATATYPES.details(datatype)['status'], results), shard=_shard_summary(options, results),
+                    connection_pool=_pool_stats())
+
+    if options.listing_checkpoint:
+        response['listing'] = options.listing_checkpoint.to_dict()
+
+    if options.memory_budget:
+        response['memory'] = options.memory_budget.to_dict()
+
+    if options.cleanup:
+        response['cleanup'] = options.cleanup.to_dict()
+
+    if options.metrics:
+        response['stages'] = _run_stages(options, results, datatype, pipeline_run_id, source_path)
+
+    if recorder:
+        recorder.finish(response)
+
+    return response
+
+
+async def process_data_async(source_container: str, source_path: str,
+                             sink_container: str, datatype: str,
+                             factory_info: str, pipeline_run_id: str, pipeline_start_time: str,
+                             options: RunOptions = None):
+    """ Async version of process_data, used when options.io_mode is 'async'
+
+    :param source_container:
+    :param source_path:
+    :param sink_container:
+    :param datatype: name of a processor registered in DATATYPES
+    :param factory_info:
+    :param pipeline_run_id:
+    :param pipeline_start_time:
+    :param options: run options such as the number of files in flight
+    :return: dict with overall status and per-file results
+    """
+
+    options = options or RunOptions()
+
+    if datatype not in DATATYPES:
+        return summarise('No Processor Found', [])
+
+    recorder = _record_run(options, pipeline_run_id, factory_info, pipeline_start_time, datatype, source_path)
+    options.run_timer = new_timer(options.metrics)
+    _resume_listing(options, pipeline_run_id, datatype, source_container, source_path)
+    _use_ledger(options, pipeline_run_id, datatype, source_container)
+
+    try:
+        results = await DATATYPES.get(datatype).start_async(source_container, source_path, sink_container, options)
+    finally:
+        await _close_async_clients()
+
+    response = dict(summarise(DATATYPES.details(datatype)['status'], results), shard=_shard_summary(options, results))
+
+    if options.listing_checkpoint:
+        response['listing'] = options.listing_checkpoint.to_dict()
+
+    if options.metrics:
+        response['stages'] = _run_stages(options, results, datatype, pipeline_run_id, source_path)
+
+    if recorder:
+        # the last batch of records is sent on a blocking call
+        await asyncio.get_running_loop().run_in_executor(None, recorder.finish, response)
+
+    return response
+
+
+def run_job(tracker, source_container: str, source_path: str,
+            sink_container: str, datatype: str,
+            factory_info: str, pipeline_run_id: str, pipeline_start_time: str,
+            options: RunOptions = None):
+    """ Runs process_data for a background job, recording progress with the job tracker
+    Called on its own thread, so async runs get their own event loop.  The thread is best
+    effort: the function host may recycle or scale in the worker mid-run, and the job is then
+    left 'running' in the job store.  A retry of the same pipeline run continues the listing.
+
+    :param tracker: manager_jobs.JobTracker for the job
     :param source_container:
     :param source_path:
     :param sink_container:
@@ -38,31 +166,130 @@ def process_data(source_container: str, source_path: str,
     :param factory_info:
     :param pipeline_run_id:
     :param pipeline_start_time:
-    :return:
+    :param options: run options
+    :return: None, the outcome is saved to the job store
     """
 
-    if datatype == 'sap_batch':
-        try:
-            from ..http_helper_files import sap_batch
-        except ModuleNotFoundError:
-            from sap_batchjobs_http.http_helper_files import sap_batch
+    options = options or RunOptions()
+    options.on_file_done = tracker.file_done
+    tracker.start()
+
+    try:
+        if options.io_mode == 'async':
+            results = asyncio.run(process_data_async(source_container, source_path, sink_container, datatype,
+                                                     factory_info, pipeline_run_id, pipeline_start_time, options))
+        else:
+            results = process_data(source_container, source_path, sink_container, datatype,
+                                   factory_info, pipeline_run_id, pipeline_start_time, options)
+
+    except Exception as e:
+        logging.exception(f'Job {tracker.job_id} failed')
+        tracker.fail(e)
+
+    else:
+        tracker.finish(results)
+
 
-        sap_batch.start(source_container, source_path, sink_container)
+def _resume_listing(options: RunOptions, pipeline_run_id: str, datatype: str, source_container: str,
+                    source_path: str):
+    """Gives the run a listing checkpoint, so a retry of the same pipeline run continues the listing
+    Without a pipeline run id there is nothing to tie a retry to, and the listing starts from the top.
 
-        return 'SAP_Batch Done'
+    :param options: run options, the checkpoint is set on them
+    :param pipeline_run_id: ADF pipeline run id
+    :param datatype: the rest identify the listing within the run
+    :param source_container:
+    :param source_path:
+    :return: None
+    """
+    if pipeline_run_id and options.listing_checkpoint is None:
+        options.listing_checkpoint = ListingCheckpoint(get_checkpoint_store(), pipeline_run_id, datatype,
+                                                       source_container, source_path, options.shard_index,
+                                                       options.shard_count)
+
+
+def _record_run(options: RunOptions, pipeline_run_id: str, factory_info: str, pipeline_start_time: str,
+                datatype: str, source_path: str):
+    """Records each file of the run in table storage when PRIMARYSTORAGE_RUNS_TABLE is set
+    The records carry the stage timings, so metrics are turned on with them.
+
+    :param options: run options, the recorder is added to on_file_done
+    :param pipeline_run_id: partition of the records
+    :param factory_info: as passed to main
+    :param pipeline_start_time: as passed to main
+    :param datatype:
+    :param source_path:
+    :return: run_records.RunRecorder, or None
+    """
+    recorder = get_run_recorder(pipeline_run_id, factory_info, pipeline_start_time, datatype, source_path,
+                                options.shard_index)
+
+    if recorder:
+        options.metrics = True
+        recorder.chain(options)
+
+    return recorder
+
+
+def _use_ledger(options: RunOptions, pipeline_run_id: str, datatype: str, source_container: str):
+    """Gives the run the processed file ledger when dedup is on
+
+    :param options: run options, the ledger is set on them
+    :param pipeline_run_id: kept with the files this run processes
+    :param datatype: with the container, which ledger entries apply to this run
+    :param source_container:
+    :return: None
+    """
+    if options.dedup and options.ledger is None:
+        options.ledger = Ledger(get_ledger_store(), pipeline_run_id, datatype, source_container)
+
+
+def _run_stages(options: RunOptions, results: list, datatype: str, pipeline_run_id: str, source_path: str) -> dict:
+    """stage totals of the run for the response, also logged as one event
+
+    :param options: run options with the run timer
+    :param results: per-file results, with their stages
+    :param datatype: the rest are dimensions of the log event
+    :param pipeline_run_id:
+    :param source_path:
+    :return: dict from summarise_stages
+    """
+    stages = summarise_stages(options.run_timer, results)
+    log_stages('run_stages', {name: {key: totals[key] for key in ('seconds', 'bytes', 'rows', 'p95')}
+                              for name, totals in stages.items()},
+               datatype=datatype, pipeline_run_id=pipeline_run_id, source_path=source_path)
+
+    return stages
+
+
+def _shard_summary(options: RunOptions, results: list) -> dict:
+    """which shard this invocation ran and how many files it handled
+
+    :param options: run options with the shard settings
+    :param results: per-file results
+    :return: dict for the json response
+    """
+    return {'index': options.shard_index,
+            'count': options.shard_count,
+            'files': len(results),
+            'processed': sum(1 for result in results if result['status'] == 'success')}
 
-    elif datatype == 'obiee_agent':
-        try:
-            from ..http_helper_files import obiee_agent
-        except ModuleNotFoundError:
-            from sap_batchjobs_http.http_helper_files import obiee_agent
 
-        obiee_agent.start(source_container, source_path, sink_container)
+async def _close_async_clients():
+    """closes the aio clients of this run's event loop, the processors have loaded manager_blobs_aio by now"""
+    try:
+        from .manager_blobs_aio import close_service_clients
+    except ModuleNotFoundError:
+        from sap_batchjobs_http.http_helper_files.manager_blobs_aio import close_service_clients
 
-        return 'OBIEE_Agent Done'
+    await close_service_clients()
 
-        pass
 
-    # TODO: Dynamically determine while handler to run based on data type
+def _pool_stats() -> dict:
+    """connection pool counters, the processors have loaded manager_blobs by now"""
+    try:
+        from .manager_blobs import pool_stats
+    except ModuleNotFoundError:
+        from sap_batchjobs_http.http_helper_files.manager_blobs import pool_stats
 
-    return 'No Processor Found'
\ No newline at end of file
+    return pool_stats()
@@ -0,0 +1,420 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Storage backends under BlobHandler.  BlobHandler only talks to a
+# backend, which is picked from the connection string: azure
+# connection strings go to the pooled blob service client, and
+# 'memory://<name>' keeps blobs in a dict so the pipelines can be
+# run and timed without a storage account.  Backends are shared
+# per connection string, so every handler and thread of a run sees
+# the same memory store.
+# Changes:
+# Oct 18, 2026 - 'file://<root>' reads local or NFS drop folders in place, each
+#                container is a folder under root, blob names are paths in it
+# Oct 18, 2026 - walk_pages lists one folder level a page at a time, resumable by token
+# Oct 18, 2026 - delete_many and copy_many for batched source cleanup and archiving
+# Oct 18, 2026 - backend_scheme, so options can check which backend a connection string needs
+# ---------------------------------------------------------------
+
+import re
+import os
+import mmap
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
+
+# import our own modules.
+try:  # if on azure
+    from .registry import Registry
+except ModuleNotFoundError:  # if local
+    from sap_batchjobs_http.http_helper_files.registry import Registry
+
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024     # same as the azure sdk
+LIST_PAGE_SIZE = 5000                     # azure's default and maximum
+DELETE_BATCH_SIZE = 256                   # max sub-requests in one azure blob batch
+
+# url scheme of the connection string to backend class, anything else is azure
+BACKENDS = Registry('storage backend', package=__package__)
+BACKENDS.register('azure', '.manager_blobs:AzureBackend')
+
+_SCHEME = re.compile(r'^([a-z][a-z0-9+.-]*)://', re.IGNORECASE)
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+class BlobNotFoundError(KeyError):
+    """The blob does not exist, raised by every backend"""
+
+
+class StorageBackend:
+    """What BlobHandler needs from a store, blobs are addressed by container and full blob name"""
+
+    def download_chunks(self, container: str, blob: str):
+        """:return: iterable of byte chunks of the blob, raises BlobNotFoundError"""
+        raise NotImplementedError
+
+    def read_bytes(self, container: str, blob: str) -> bytes:
+        return b''.join(self.download_chunks(container, blob))
+
+    def write_bytes(self, container: str, blob: str, data: bytes):
+        """writes a whole blob in one go, replacing any existing blob"""
+        raise NotImplementedError
+
+    def stage_block(self, container: str, blob: str, block_id: str, data: bytes):
+        """uploads one block, it is not part of the blob until commit_blocks"""
+        raise NotImplementedError
+
+    def commit_blocks(self, container: str, blob: str, block_ids: list):
+        """replaces the blob with the staged blocks, in the order given"""
+        raise NotImplementedError
+
+    def delete(self, container: str, blob: str):
+        """deletes a blob, raises BlobNotFoundError"""
+        raise NotImplementedError
+
+    def delete_many(self, container: str, blobs: list) -> list:
+        """Deletes blobs, ones already gone count as deleted
+
+        :param container: container of the blobs
+        :param blobs: full blob names
+        :return: names that could not be deleted
+        """
+        failed = []
+
+        for blob in blobs:
+            try:
+                self.delete(container, blob)
+            except BlobNotFoundError:
+                pass
+            except Exception:
+                logging.exception(f'Could not delete {container}/{blob}')
+                failed.append(blob)
+
+        return failed
+
+    def copy_many(self, container: str, blobs: list, to_container: str) -> list:
+        """Copies blobs to the same names in another container, replacing what is there
+
+        :param container: container of the blobs
+        :param blobs: full blob names
+        :param to_container: container to copy them to
+        :return: names that could not be copied
+        """
+        failed = []
+
+        for blob in blobs:
+            try:
+                self.write_bytes(to_container, blob, self.read_bytes(container, blob))
+            except Exception:
+                logging.exception(f'Could not copy {container}/{blob} to {to_container}')
+                failed.append(blob)
+
+        return failed
+
+    def list_blobs(self, container: str, prefix: str = ''):
+        """:return: iterable of dict-like blob properties with at least name, size and etag"""
+        raise NotImplementedError
+
+    def walk_pages(self, container: str, prefix: str = '', page_size: int = None, continuation_token: str = None):
+        """Lists the blobs directly under the folder of prefix, not in folders below it, a page at a time
+
+        :param container: container to list
+        :param prefix: e.g. 'SAPBatchReports/PBI-', everything up to the last '/' is the folder
+        :param page_size: max blobs per page, defaults to LIST_PAGE_SIZE
+        :param continuation_token: token of a page from an earlier walk, to start at that page
+        :return: generator of (list of blob properties, token of the next page or None after the last page)
+        """
+        blobs = [blob for blob in self.list_blobs(container, prefix) if '/' not in blob['name'][len(prefix):]]
+
+        return _pages(blobs, page_size, continuation_token)
+
+
+class MemoryBackend(StorageBackend):
+
+    def __init__(self, connection_string: str = 'memory://'):
+        """Keeps blobs in a dict, for benchmarks and local runs
+
+        :param connection_string: 'memory://<name>', the name only tells stores apart
+        """
+        self.connection_string = connection_string
+        self._blobs = {}
+        self._staged = {}
+        self._lock = threading.Lock()
+
+    def download_chunks(self, container: str, blob: str):
+        data = self.read_bytes(container, blob)
+        view = memoryview(data)
+
+        return (view[offset:offset + DOWNLOAD_CHUNK_SIZE] for offset in range(0, len(data), DOWNLOAD_CHUNK_SIZE))
+
+    def read_bytes(self, container: str, blob: str) -> bytes:
+        with self._lock:
+            try:
+                return self._blobs[container, blob]
+            except KeyError:
+                raise BlobNotFoundError(f'{container}/{blob}') from None
+
+    def write_bytes(self, container: str, blob: str, data: bytes):
+        with self._lock:
+            self._blobs[container, blob] = bytes(data)
+
+    def stage_block(self, container: str, blob: str, block_id: str, data: bytes):
+        with self._lock:
+            self._staged.setdefault((container, blob), {})[block_id] = bytes(data)
+
+    def commit_blocks(self, container: str, blob: str, block_ids: list):
+        with self._lock:
+            staged = self._staged.pop((container, blob), {})
+            self._blobs[container, blob] = b''.join(staged[block_id] for block_id in block_ids)
+
+    def delete(self, container: str, blob: str):
+        with self._lock:
+            if self._blobs.pop((container, blob), None) is None:
+                raise BlobNotFoundError(f'{container}/{blob}')
+
+    def list_blobs(self, container: str, prefix: str = ''):
+        with self._lock:
+            names = sorted(name for (blob_container, name) in self._blobs
+                           if blob_container == container and name.startswith(prefix))
+            blobs = [(name, self._blobs[container, name]) for name in names]
+
+        # the md5 of the contents stands in for the etag azure would return
+        return [{'name': name, 'size': len(data), 'etag': hashlib.md5(data).hexdigest()} for name, data in blobs]
+
+    def clear(self):
+        """removes every blob, e.g. between benchmark runs"""
+        with self._lock:
+            self._blobs.clear()
+            self._staged.clear()
+
+
+BACKENDS.register('memory', MemoryBackend)
+
+
+class FileBackend(StorageBackend):
+
+    def __init__(self, connection_string: str):
+        """Blobs as files under a root folder, e.g. an on-prem drop share
+
+        :param connection_string: 'file:///mnt/sapdrops', containers are folders under the root
+        """
+        parts = urlsplit(connection_string)
+        self.root = os.path.abspath(url2pathname(parts.netloc + parts.path))
+
+    def download_chunks(self, container: str, blob: str):
+        """opens the file first, so a missing blob raises here and not on the first chunk"""
+        path = self._path(container, blob)
+
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            raise BlobNotFoundError(f'{container}/{blob}') from None
+
+        return self._mapped_chunks(f)
+
+    def read_bytes(self, container: str, blob: str) -> bytes:
+        try:
+            with open(self._path(container, blob), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise BlobNotFoundError(f'{container}/{blob}') from None
+
+    def write_bytes(self, container: str, blob: str, data: bytes):
+        self._replace(container, blob, lambda f: f.write(data))
+
+    def stage_block(self, container: str, blob: str, block_id: str, data: bytes):
+        path = self._block_path(container, blob, block_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def commit_blocks(self, container: str, blob: str, block_ids: list):
+        block_paths = [self._block_path(container, blob, block_id) for block_id in block_ids]
+
+        def write_blocks(f):
+            for block_path in block_paths:
+                with open(block_path, 'rb') as block:
+                    shutil.copyfileobj(block, f)
+
+        self._replace(container, blob, write_blocks)
+
+        for block_path in block_paths:
+            os.remove(block_path)
+
+        # the blob's block folder then .blocks itself, either may still be used by another writer
+        block_folder = os.path.dirname(self._block_path(container, blob, ''))
+        for folder in (block_folder, os.path.dirname(block_folder)):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break
+
+    def delete(self, container: str, blob: str):
+        try:
+            os.remove(self._path(container, blob))
+        except FileNotFoundError:
+            raise BlobNotFoundError(f'{container}/{blob}') from None
+
+    def copy_many(self, container: str, blobs: list, to_container: str) -> list:
+        """file to file copies, nothing is read into memory"""
+        failed = []
+
+        for blob in blobs:
+            def copy_file(f, source_path=self._path(container, blob)):
+                with open(source_path, 'rb') as source:
+                    shutil.copyfileobj(source, f)
+
+            try:
+                self._replace(to_container, blob, copy_file)
+            except Exception:
+                logging.exception(f'Could not copy {container}/{blob} to {to_container}')
+                failed.append(blob)
+
+        return failed
+
+    def list_blobs(self, container: str, prefix: str = ''):
+        container_path = self._path(container, '')
+        # only walk the deepest folder the prefix names
+        start = self._path(container, prefix.rpartition('/')[0])
+        blobs = []
+
+        for folder, folders, files in os.walk(start):
+            folders[:] = [name for name in folders if not name.startswith('.')]     # temp and staged blocks
+            relative = os.path.relpath(folder, container_path).replace(os.sep, '/')
+
+            for name in files:
+                blob = name if relative == '.' else f'{relative}/{name}'
+
+                if name.startswith('.') or not blob.startswith(prefix):
+                    continue
+
+                blobs.append(_file_properties(blob, os.stat(os.path.join(folder, name))))
+
+        return sorted(blobs, key=lambda blob: blob['name'])
+
+    def walk_pages(self, container: str, prefix: str = '', page_size: int = None, continuation_token: str = None):
+        """only reads the one folder, see StorageBackend.walk_pages"""
+        folder, _, name_prefix = prefix.rpartition('/')
+        blobs = []
+
+        try:
+            entries = list(os.scandir(self._path(container, folder)))
+        except FileNotFoundError:
+            entries = []
+
+        for entry in entries:
+            if entry.name.startswith(name_prefix) and not entry.name.startswith('.') and entry.is_file():
+                blobs.append(_file_properties(f'{folder}/{entry.name}' if folder else entry.name, entry.stat()))
+
+        return _pages(sorted(blobs, key=lambda blob: blob['name']), page_size, continuation_token)
+
+    def _path(self, container: str, blob: str) -> str:
+        """local path of a blob, refusing names that would leave the root"""
+        path = os.path.abspath(os.path.join(self.root, container, *blob.split('/')))
+
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f'{container}/{blob} is outside of {self.root}')
+
+        return path
+
+    def _block_path(self, container: str, blob: str, block_id: str) -> str:
+        """staged blocks sit in a hidden folder beside the blob, block ids are base64 so they are hashed"""
+        folder, _, name = self._path(container, blob).rpartition(os.sep)
+
+        return os.path.join(folder, '.blocks', name, hashlib.md5(block_id.encode()).hexdigest())
+
+    def _replace(self, container: str, blob: str, write):
+        """writes a temp file beside the blob then renames it over the blob, readers never see half a file
+
+        :param write: callable given the open temp file
+        :return: None
+        """
+        path = self._path(container, blob)
+        folder, _, name = path.rpartition(os.sep)
+        os.makedirs(folder, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=folder, prefix=f'.{name}.', suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, path)
+
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def _mapped_chunks(f):
+        """memory maps the file and hands out views of it, the bytes are only copied by the parser"""
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:   # empty files can't be mapped
+                return
+
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+
+            try:
+                for offset in range(0, len(view), DOWNLOAD_CHUNK_SIZE):
+                    yield view[offset:offset + DOWNLOAD_CHUNK_SIZE]
+
+            finally:
+                view.release()
+
+                try:
+                    mapped.close()
+                except BufferError:     # a reader still holds a view, the map closes when it lets go
+                    pass
+
+
+BACKENDS.register('file', FileBackend)
+
+
+def get_backend(connection_string: str) -> StorageBackend:
+    """Returns the shared backend for a connection string, creating it on first use
+
+    :param connection_string: azure connection string, or '<scheme>://...' for a registered backend
+    :return: StorageBackend
+    """
+    with _backends_lock:
+        backend = _backends.get(connection_string)
+
+        if backend is None:
+            backend = _backends[connection_string] = BACKENDS.get(backend_scheme(connection_string))(connection_string)
+
+    return backend
+
+
+def backend_scheme(connection_string: str) -> str:
+    """:return: name of the backend a connection string goes to, 'azure' unless it has a registered scheme"""
+    match = _SCHEME.match(connection_string or '')
+
+    return match.group(1) if match and match.group(1) in BACKENDS else 'azure'
+
+
+def _file_properties(name: str, stat: os.stat_result) -> dict:
+    """listing entry of a file, the etag changes whenever the file is rewritten without reading it"""
+    return {'name': name, 'size': stat.st_size, 'etag': f'{stat.st_mtime_ns:x}-{stat.st_size:x}'}
+
+
+def _pages(blobs: list, page_size: int, continuation_token: str):
+    """splits a sorted listing into pages, the token of a page is the name of the last blob before it
+
+    :return: generator of (list of blobs, token of the next page or None)
+    """
+    if continuation_token:
+        blobs = [blob for blob in blobs if blob['name'] > continuation_token]
+
+    page_size = page_size or LIST_PAGE_SIZE
+
+    for offset in range(0, len(blobs), page_size):
+        page = blobs[offset:offset + page_size]
+
+        yield page, page[-1]['name'] if offset + page_size < len(blobs) else None
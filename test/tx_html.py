@@ -0,0 +1,326 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# One parser for all SAP list transactions exported as .htm
+# (IW38, ZI53, ZI73).  The layouts only differ in how many
+# 'list' tables come before the data, which is configured per
+# transaction version, which each tx_ module registers with
+# register_version.  Rows are collected into
+# column lists and the dataframe is built once at the end.
+# iter_batch_file streams large exports through a pull parser
+# instead, yielding dataframes of batch_rows rows with flat memory.
+# Changes:
+# ---------------------------------------------------------------
+
+import io
+import re
+import importlib
+from itertools import islice
+from lxml import etree
+import pandas as pd
+
+BATCH_ROWS = 50000
+READ_SIZE = 1024 * 1024
+
+# per transaction version settings, filled in by register_version
+#   start_table: index of the first 'list' table with data, earlier ones are selection screens
+TX_CONFIG = {}
+
+# module that registers the versions of each transaction, imported on first lookup
+TX_MODULES = {
+    'iw38': 'tx_IW38',
+    'zi53': 'tx_ZI53',
+    'zi73': 'tx_ZI73',
+}
+
+_LIST_TABLES = '//table[contains(concat(" ", normalize-space(@class), " "), " list ")]'
+
+# opening or closing table tag, group 1 is set for a closing tag
+_TABLE_TAG = re.compile(rb'<table[\s>/]|(</table\s*>)', re.IGNORECASE)
+_TAG_TAIL = 64
+
+
+def parse_batch_file(contents, function: str) -> pd.DataFrame:
+    """
+    :param contents: blob data
+    :param function: what version of the transaction, e.g. 'IW38_01'
+    :return: dataframe
+    """
+    headers, columns = parse_columns(contents, **get_version(function))
+
+    return to_dataframe(headers, columns)
+
+
+def iter_batch_file(source, function: str, batch_rows: int = BATCH_ROWS):
+    """ Incremental version of parse_batch_file for exports too big to hold as a tree
+
+    :param source: .htm file contents as bytes, or a binary file object to stream from
+    :param function: what version of the transaction, e.g. 'IW38_01'
+    :param batch_rows: max rows per dataframe
+    :return: generator of dataframes, at least one (with headers only if there are no rows)
+    """
+    headers = None
+    columns = []
+    yielded = False
+
+    for is_header, values in _iter_rows(source, **get_version(function)):
+        if is_header:
+            headers = values
+            columns = [[] for _ in headers]
+            continue
+
+        _add_row(values, columns)
+
+        if len(columns[0]) >= batch_rows:
+            yield to_dataframe(headers, columns)
+            columns = [[] for _ in headers]
+            yielded = True
+
+    if headers is not None and (columns[0] or not yielded):
+        yield to_dataframe(headers, columns)
+
+
+def register_version(function: str, **settings):
+    """ Adds a transaction version, called by the tx_ modules when they are imported
+
+    :param function: transaction version, e.g. 'IW38_01'
+    :param settings: layout settings, see TX_CONFIG
+    :return: None
+    """
+    TX_CONFIG[function.lower()] = settings
+
+
+def get_version(function: str) -> dict:
+    """ Settings of a transaction version, importing the module that registers it on first use
+
+    :param function: transaction version, e.g. 'IW38_01'
+    :return: settings dict
+    :raises KeyError: unknown transaction or version
+    """
+    key = function.lower()
+
+    if key not in TX_CONFIG:
+        module = TX_MODULES.get(key.split('_')[0])
+        if module:
+            importlib.import_module('.' + module, __package__) if __package__ else importlib.import_module(module)
+
+    if key not in TX_CONFIG:
+        raise KeyError(f'Unknown transaction version {function!r}, registered: {sorted(TX_CONFIG)}')
+
+    return TX_CONFIG[key]
+
+
+def parse_columns(contents, start_table: int = 0):
+    """ Parses a SAP list export into column lists
+
+    The first tbody of the first data table holds the headers, every later table
+    repeats them in its first tbody, the rows are in the following tbodies.
+
+    :param contents: source blob contents .htm file, bytes or str
+    :param start_table: index of the first 'list' table with data
+    :return: headers, list of one list of values per header
+    """
+    tree = etree.HTML(contents)     # plain elements, the lxml.html classes are slower to walk
+    headers = []
+    columns = []
+
+    for idx_lst, lst in enumerate(tree.xpath(_LIST_TABLES)):
+
+        if idx_lst < start_table:
+            continue
+
+        for idx_body, body in enumerate(lst.iter('tbody')):
+
+            # if first list and body, get header rows
+            if idx_lst == start_table and idx_body == 0:
+                hdr_row = next(body.iter('tr'))
+                headers = [_cell_text(column, 0) for column in hdr_row.iter('td')]
+                columns = [[] for _ in headers]
+
+            # if not first list, skip body 0 which is the header again
+            elif idx_body > 0:
+                for row in body.iter('tr'):
+                    _add_row(_row_values(row), columns)
+
+    return headers, columns
+
+
+def to_dataframe(headers: list, columns: list) -> pd.DataFrame:
+    """builds the dataframe once, duplicate header names are kept
+
+    :param headers: column names
+    :param columns: list of values per column
+    :return: dataframe
+    """
+    df = pd.DataFrame(dict(enumerate(columns)), columns=range(len(headers)))
+    df.columns = headers
+
+    return df
+
+
+def _iter_rows(source, start_table: int = 0):
+    """ Streams header and data rows out of a SAP list export with a pull parser
+    Same table/tbody rules as parse_columns. Each <tr> is cleared once read and
+    finished siblings are dropped, so the partial tree stays small.
+
+    :param source: bytes, or a binary file object
+    :param start_table: index of the first 'list' table with data
+    :return: generator of (is_header, values)
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    idx_lst = -1
+    idx_body = -1
+    current_list = None
+    header_done = False
+    parser = None
+
+    for data, ends_segment in _iter_segments(source):
+
+        # libxml2 keeps everything fed to an html parser until it is closed,
+        # so each top level table gets a fresh one
+        if parser is None:
+            parser = etree.HTMLPullParser(events=('start', 'end'), tag=('table', 'tbody', 'tr'))
+
+        parser.feed(data)
+        if ends_segment:
+            parser.close()
+
+        for event, element in parser.read_events():
+
+            if event == 'start':
+                if element.tag == 'table' and current_list is None and _is_list(element):
+                    current_list = element
+                    idx_lst += 1
+                    idx_body = -1
+                elif element.tag == 'tbody' and current_list is not None:
+                    idx_body += 1
+                continue
+
+            if element.tag == 'tr':
+                if current_list is not None and idx_lst >= start_table:
+
+                    # if first list and body, get header row
+                    if idx_lst == start_table and idx_body == 0:
+                        if not header_done:
+                            header_done = True
+                            yield True, [_cell_text(column, 0) for column in element.iter('td')]
+
+                    # if not first list, skip body 0 which is the header again
+                    elif idx_body > 0:
+                        yield False, _row_values(element)
+
+                _drop(element)
+
+            elif element.tag == 'table':
+                if element is current_list:
+                    current_list = None
+                _drop(element)
+
+        if ends_segment:
+            parser = None
+
+
+def _iter_segments(source, read_size: int = READ_SIZE):
+    """ Reads an html byte stream and marks where each top level table ends
+
+    Only '<table' and '</table>' tags are looked at, nesting is tracked so a segment
+    never ends inside a table. Tags inside comments or scripts are not recognised.
+
+    :param source: binary file object
+    :param read_size: bytes per read
+    :return: generator of (data, ends_segment), the last piece always ends a segment
+    """
+    pending = b''
+    depth = 0
+
+    while True:
+        chunk = source.read(read_size)
+
+        if not chunk:
+            yield pending, True
+            return
+
+        data = pending + chunk
+
+        # a tag can be split across reads, tags starting in the tail wait for the next read
+        limit = len(data) - _TAG_TAIL
+        start = 0
+
+        for match in _TABLE_TAG.finditer(data):
+            if match.start() >= limit:
+                break
+
+            if match.group(1):
+                depth = max(depth - 1, 0)
+                if depth == 0:
+                    yield data[start:match.end()], True
+                    start = match.end()
+            else:
+                depth += 1
+
+        split = max(limit, start)
+        if split > start:
+            yield data[start:split], False
+
+        pending = data[split:]
+
+
+def _is_list(table) -> bool:
+    return 'list' in (table.get('class') or '').split()
+
+
+def _drop(element):
+    """frees a finished element and the siblings before it"""
+    element.clear(keep_tail=True)
+
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def _row_values(row) -> list:
+    """values of one <tr>, the first column has the row icons in front of the value
+
+    :param row: lxml <tr> element
+    :return: list of cleaned cell text
+    """
+    return [_cell_text(column, 2 if column_idx == 0 else 0) for column_idx, column in enumerate(row.iter('td'))]
+
+
+def _add_row(values: list, columns: list):
+    """appends one row to the column lists, missing cells are filled with None
+
+    :param values: cell values of the row
+    :param columns: list of values per column, all the same length
+    :return: None
+    """
+    row_count = len(columns[0]) + 1 if columns else 0
+
+    for column_idx, value in enumerate(values):
+        columns[column_idx].append(value)
+
+    for column_values in columns:
+        if len(column_values) < row_count:
+            column_values.append(None)
+
+
+def _cell_text(column, idx: int) -> str:
+    """text of the idx'th <nobr> in a cell
+
+    :param column: lxml <td> element
+    :param idx: which <nobr> holds the value
+    :return: cleaned text
+    """
+    value = next(islice(column.iter('nobr'), idx, None), None)
+
+    if value is None:
+        raise IndexError(f'cell has no <nobr> number {idx}')
+
+    # most cells are plain text, only walk the subtree when there is markup inside
+    text = (value.text or '') if len(value) == 0 else ''.join(value.itertext())
+
+    return text.strip().replace('\xa0', ' ')
@@ -0,0 +1,82 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Parses many SAP list exports at once in worker processes.  The
+# html parse is CPU bound and holds the GIL, so threads do not
+# help.  Only the file contents go to a worker and only the
+# header and column lists come back, the dataframe is built in
+# the main process, which also does all of the blob I/O.
+# Changes:
+# ---------------------------------------------------------------
+
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+try:  # if imported as part of a package
+    from . import tx_html
+except ImportError:  # if run from this folder
+    import tx_html
+
+
+def default_workers() -> int:
+    """number of cores this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on windows or mac
+        return os.cpu_count() or 1
+
+
+def parse_files(jobs, workers: int = None, max_pending: int = None):
+    """Parses exports in a process pool, reading the next one while the workers are busy
+
+    :param jobs: iterable of (key, contents, function), it is only advanced as workers free up,
+                 so a generator can download each file just in time
+    :param workers: number of worker processes, defaults to the available cores
+    :param max_pending: max jobs submitted but not finished, defaults to twice the workers
+    :return: generator of (key, dataframe, error) in the order jobs finish, error is None on success
+    """
+    workers = workers or default_workers()
+    max_pending = max_pending or workers * 2
+    jobs = iter(jobs)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        exhausted = False
+
+        while pending or not exhausted:
+
+            # keep the pool fed, contents are only read when there is room for them
+            while not exhausted and len(pending) < max_pending:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+
+                key, contents, function = job
+                pending[executor.submit(parse_columns, contents, function)] = key
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                key = pending.pop(future)
+
+                try:
+                    headers, columns = future.result()
+                except Exception as e:  # one bad export does not stop the rest
+                    yield key, None, e
+                else:
+                    yield key, tx_html.to_dataframe(headers, columns), None
+
+
+def parse_columns(contents, function: str):
+    """Runs in the worker: parses one export into plain lists, which pickle much smaller than a dataframe
+
+    :param contents: .htm file contents
+    :param function: what version of the transaction, e.g. 'IW38_01'
+    :return: headers, list of one list of values per header
+    """
+    return tx_html.parse_columns(contents, **tx_html.get_version(function))
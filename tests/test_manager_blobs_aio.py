@@ -0,0 +1,70 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Async handler: zip drops are read one member at a time, as the
+# sync handler's read_blob_files does, and an empty path is the
+# container root.
+# Changes:
+# ---------------------------------------------------------------
+
+import asyncio
+import io
+import zipfile
+
+from sap_batchjobs_http.http_helper_files.manager_blobs_aio import AsyncBlobHandler, close_service_clients
+
+
+class _Downloader:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def chunks(self):
+        for start in range(0, len(self.data), 7):
+            yield self.data[start:start + 7]
+
+
+class _Client:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def download_blob(self):
+        return _Downloader(self.data)
+
+
+def _read(filename: str, data: bytes) -> dict:
+    handler = AsyncBlobHandler.__new__(AsyncBlobHandler)
+    handler._create_client = lambda name: _Client(data)
+
+    async def read():
+        return {name: df.to_dict('list') async for name, df in handler.read_blob_files_to_df(filename)}
+
+    return asyncio.run(read())
+
+
+def test_plain_file_is_one_file():
+    assert _read('IW38.csv', b'A\tB\n1\tx\n') == {'IW38.csv': {'A': [1], 'B': ['x']}}
+
+
+def test_zip_is_read_per_member():
+    archive = io.BytesIO()
+
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('IW38_1.csv', 'A\tB\n1\tx\n')
+        zf.writestr('folder/', '')
+        zf.writestr('folder/IW39_1.csv', 'C\n2\n')
+
+    assert _read('drop.zip', archive.getvalue()) == {'IW38_1.csv': {'A': [1], 'B': ['x']},
+                                                     'IW39_1.csv': {'C': [2]}}
+
+
+def test_client_for_container_root():
+    connection = 'DefaultEndpointsProtocol=https;AccountName=devstore;AccountKey=a2V5;EndpointSuffix=core.windows.net'
+
+    async def blob_names():
+        names = [AsyncBlobHandler(connection, 'landing', path)._create_client('IW38.csv').blob_name
+                 for path in ('', 'sap', 'sap/')]
+        await close_service_clients()
+        return names
+
+    assert asyncio.run(blob_names()) == ['IW38.csv', 'sap/IW38.csv', 'sap/IW38.csv']
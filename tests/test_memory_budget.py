@@ -0,0 +1,36 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Memory budget: files are admitted by estimate with any number
+# of workers, and the peak is measured without touching the
+# process' own counters.
+# Changes:
+# ---------------------------------------------------------------
+
+from sap_batchjobs_http.http_helper_files.batch_runner import run_files
+from sap_batchjobs_http.http_helper_files.memory_budget import MemoryBudget
+
+FILES = [{'name': 'IW38_small.csv', 'size': 1024}, {'name': 'IW38_large.csv', 'size': 8 * 1024 * 1024}]
+
+
+def test_budget_applies_with_one_worker():
+    budget = MemoryBudget(100)
+    started = []
+
+    results = run_files(FILES, lambda file: started.append(file['name']), 1, budget=budget)
+
+    assert [result['file'] for result in results] == ['IW38_small.csv', 'IW38_large.csv']
+    assert started == ['IW38_large.csv', 'IW38_small.csv']  # largest first
+    assert budget.files == 2
+    assert budget.in_use == 0
+
+
+def test_budget_reports_sampled_peak():
+    budget = MemoryBudget(100)
+
+    run_files(FILES, lambda file: None, 2, budget=budget)
+
+    details = budget.to_dict()
+    assert details['files'] == 2
+    assert details['peak_rss_mb'] is None or details['peak_rss_mb'] > 0
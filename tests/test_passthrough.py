@@ -0,0 +1,73 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# The stream transform copies pandas' c engine type inference to
+# write what the dataframe path writes.  These cases pin it down,
+# so a pandas upgrade that changes inference fails here rather
+# than in a pipeline.
+# Changes:
+# ---------------------------------------------------------------
+
+import io
+
+import pytest
+
+from sap_batchjobs_http.http_helper_files.manager_blobs import read_tab_delimited
+from sap_batchjobs_http.http_helper_files.sap_batch import _stream_lines, _transform_dataframe
+
+ADF_PATH = 'IW38/PBI-E-IW38/20261018.csv'
+
+COLUMNS = {
+    'order': ['000004000000', '000004000001', '000004000002', '000004000003'],
+    'int': ['5', '-3', '+7', ' 12 '],
+    'int with blanks': ['1', '', '-0', '4'],
+    'float': ['13664860', '1.50', '1e5', '.5'],
+    'float specials': ['inf', '-Infinity', 'NaN', '2'],
+    'bool': ['TRUE', 'false', 'True', ''],
+    'not bool': ['TRUE', 'yes', 'false', 'no'],
+    'text': ['pump', 'NA', 'say "hi"', 'N/A'],
+    'uint64': ['9223372036854775808', '1', '2', '3'],
+    'uint64 and negative': ['9223372036854775808', '-1', '2', '3'],
+    'uint64 and blank': ['9223372036854775808', '', '2', '3'],
+    'over uint64': ['18446744073709551616', '1', '2', '3'],
+    'over uint64 and text': ['18446744073709551616', 'NA', 'x', '3'],
+    'over uint64 and underscore': ['18446744073709551616', '1_0', '2', ''],
+    'int64 then underscore': ['1', '1_0', '2', '3'],
+    'blank': ['', '', '', ''],
+}
+
+
+def _dataframe_output(data: bytes) -> str:
+    df = _transform_dataframe(read_tab_delimited([data]), ADF_PATH)
+
+    return df.to_csv(index=False, sep='\t')
+
+
+def _stream_output(data: bytes) -> str:
+    return ''.join(_stream_lines(io.BytesIO(data), ADF_PATH))
+
+
+def _file(columns: dict) -> bytes:
+    rows = ['\t'.join(columns)] + ['\t'.join(row) for row in zip(*columns.values())]
+
+    return ('\n'.join(rows) + '\n').encode('utf-8')
+
+
+@pytest.mark.parametrize('name', list(COLUMNS))
+def test_column_matches_dataframe(name):
+    data = _file({name: COLUMNS[name], 'key': ['a', 'b', 'c', 'd']})
+
+    assert _stream_output(data) == _dataframe_output(data)
+
+
+def test_file_matches_dataframe():
+    data = _file(COLUMNS)
+
+    assert _stream_output(data) == _dataframe_output(data)
+
+
+def test_utf16_file_matches_dataframe():
+    data = b'\xff\xfe' + _file(COLUMNS).decode('utf-8').replace('\n', '\r\n').encode('utf-16-le')
+
+    assert _stream_output(data) == _dataframe_output(data)
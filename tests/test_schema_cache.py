@@ -0,0 +1,58 @@
+# ---------------------------------------------------------------
+# author: Chris McKay
+# version: 1.0
+# date: October 18, 2026
+# Schema cache: dtypes learned from a transaction's first file must
+# never cost a later file its leading zeros.
+# Changes:
+# ---------------------------------------------------------------
+
+import pytest
+
+from sap_batchjobs_http.http_helper_files.manager_blobs import read_csv_chunks
+from sap_batchjobs_http.http_helper_files.schema_cache import SchemaCache, set_schema_cache
+
+HEADER = 'Order\tPriority\tCost\tText\n'
+SCHEMA_KEY = 'sap_batch:IW38'
+
+
+@pytest.fixture
+def cache():
+    cache = SchemaCache()
+    set_schema_cache(cache)
+    yield cache
+    set_schema_cache(SchemaCache())
+
+
+def _read(text: str):
+    return read_csv_chunks(lambda: [text.encode('utf-8')], 'test.csv', 'c', SCHEMA_KEY)
+
+
+def test_codes_in_first_file_stay_text(cache):
+    df = _read(HEADER + '000004000000\t1\t13664860\tpump\n000004000001\t\t1.5\tvalve\n')
+
+    assert list(df['Order']) == ['000004000000', '000004000001']
+    assert str(df['Priority'].dtype) == 'Int64'
+    assert df.to_csv(index=False, sep='\t').splitlines()[1] == '000004000000\t1\t13664860.0\tpump'
+
+
+def test_leading_zeros_in_a_later_file_are_kept(cache):
+    _read(HEADER + '123\t1\t2.5\tpump\n456\t2\t3\tvalve\n')
+    df = _read(HEADER + '0000789\t3\t4\tpump\n')
+
+    assert list(df['Order']) == ['0000789']
+    assert cache.stats['mismatches'] == 1
+
+    # the entry was learned again from the second file, the order stays text from now on
+    df = _read(HEADER + '0000790\t4\t5\tvalve\n')
+
+    assert list(df['Order']) == ['0000790']
+    assert str(df['Priority'].dtype) == 'Int64'
+
+
+def test_text_in_a_numeric_column_relearns(cache):
+    _read(HEADER + '123\t1\t2.5\tpump\n')
+    df = _read(HEADER + '124\thigh\t2.5\tpump\n')
+
+    assert list(df['Priority']) == ['high']
+    assert cache.stats['mismatches'] == 1